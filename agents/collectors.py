@@ -0,0 +1,219 @@
+"""Pluggable metric collectors sampled in the background."""
+import os
+import time
+import heapq
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence
+import psutil
+
+logger = logging.getLogger(__name__)
+
+class Collector(ABC):
+    """Base class for a source of metrics sampled every ``interval`` seconds.
+
+    ``collect`` returns a partial metrics dict that is merged into the
+    sampler snapshot under its top-level keys.
+    """
+
+    name = 'collector'
+    interval = 1.0
+
+    def __init__(self, interval: Optional[float] = None) -> None:
+        if interval is not None:
+            self.interval = interval
+
+    def prime(self) -> None:
+        """Prepare stateful psutil calls before the first real sample."""
+
+    @abstractmethod
+    def collect(self) -> Dict[str, Any]:
+        """Sample the collector's metrics."""
+
+class CPUCollector(Collector):
+    """Overall CPU usage since the previous sample, without blocking."""
+
+    name = 'cpu'
+
+    def prime(self) -> None:
+        psutil.cpu_percent(interval=None)
+
+    def collect(self) -> Dict[str, Any]:
+        return {'cpu': psutil.cpu_percent(interval=None)}
+
+class MemoryCollector(Collector):
+    """Virtual memory usage."""
+
+    name = 'memory'
+
+    def collect(self) -> Dict[str, Any]:
+        return {'memory': psutil.virtual_memory().percent}
+
+class DiskCollector(Collector):
+    """Usage of the root filesystem."""
+
+    name = 'disk'
+    interval = 10.0
+
+    def __init__(self, interval: Optional[float] = None, path: str = '/') -> None:
+        super().__init__(interval)
+        self.path = path
+
+    def collect(self) -> Dict[str, Any]:
+        return {'disk': psutil.disk_usage(self.path).percent}
+
+class NetworkCollector(Collector):
+    """Cumulative network counters from a single syscall."""
+
+    name = 'network'
+
+    def collect(self) -> Dict[str, Any]:
+        counters = psutil.net_io_counters()
+        return {
+            'network': {
+                'bytes_sent': counters.bytes_sent,
+                'bytes_recv': counters.bytes_recv
+            }
+        }
+
+class PerCoreCPUCollector(Collector):
+    """CPU usage of every logical core."""
+
+    name = 'cpu_per_core'
+
+    def prime(self) -> None:
+        psutil.cpu_percent(interval=None, percpu=True)
+
+    def collect(self) -> Dict[str, Any]:
+        return {'cpu_per_core': psutil.cpu_percent(interval=None, percpu=True)}
+
+class PerDiskCollector(Collector):
+    """Usage of every mounted physical partition."""
+
+    name = 'disks'
+    interval = 30.0
+
+    def collect(self) -> Dict[str, Any]:
+        disks = {}
+        for partition in psutil.disk_partitions(all=False):
+            try:
+                disks[partition.mountpoint] = psutil.disk_usage(partition.mountpoint).percent
+            except OSError:
+                continue
+        return {'disks': disks}
+
+class PerNICCollector(Collector):
+    """Cumulative counters of every network interface."""
+
+    name = 'nics'
+
+    def collect(self) -> Dict[str, Any]:
+        return {
+            'nics': {
+                nic: {'bytes_sent': counters.bytes_sent, 'bytes_recv': counters.bytes_recv}
+                for nic, counters in psutil.net_io_counters(pernic=True).items()
+            }
+        }
+
+# Available collectors by name
+COLLECTORS = {
+    collector.name: collector
+    for collector in (
+        CPUCollector,
+        MemoryCollector,
+        DiskCollector,
+        NetworkCollector,
+        PerCoreCPUCollector,
+        PerDiskCollector,
+        PerNICCollector
+    )
+}
+
+# Collectors enabled unless AGENT_COLLECTORS says otherwise
+DEFAULT_COLLECTORS = ('cpu', 'memory', 'disk', 'network')
+
+def build_collectors(names: Optional[Sequence[str]] = None) -> List[Collector]:
+    """Instantiate collectors by name, honouring AGENT_<NAME>_INTERVAL overrides."""
+    if names is None:
+        configured = os.getenv('AGENT_COLLECTORS')
+        names = configured.split(',') if configured else DEFAULT_COLLECTORS
+    collectors = []
+    for name in (n.strip() for n in names):
+        if name not in COLLECTORS:
+            raise ValueError(f"Unknown collector: {name}")
+        interval = os.getenv(f'AGENT_{name.upper()}_INTERVAL')
+        collectors.append(COLLECTORS[name](float(interval) if interval else None))
+    return collectors
+
+class MetricsSampler:
+    """Run collectors on their own intervals and publish a shared snapshot.
+
+    The snapshot is replaced as a whole on every update, so readers get a
+    consistent dict without locking or making any syscalls themselves.
+    """
+
+    def __init__(self, collectors: Sequence[Collector]) -> None:
+        self.collectors = list(collectors)
+        self.updated_at = 0.0
+        self._snapshot: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the latest merged metrics."""
+        return self._snapshot
+
+    def _run_collector(self, collector: Collector) -> None:
+        try:
+            values = collector.collect()
+        except Exception as e:
+            logger.error(f"Collector {collector.name} failed: {str(e)}")
+            return
+        with self._lock:
+            self._snapshot = {**self._snapshot, **values}
+            self.updated_at = time.time()
+
+    def start(self) -> None:
+        """Take a first sample from every collector and start the background thread."""
+        if self._thread is not None:
+            return
+        for collector in self.collectors:
+            collector.prime()
+            self._run_collector(collector)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='metrics-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        now = time.monotonic()
+        schedule = [(now + c.interval, i, c) for i, c in enumerate(self.collectors)]
+        heapq.heapify(schedule)
+        while schedule:
+            due, i, collector = schedule[0]
+            if self._stop.wait(max(0.0, due - time.monotonic())):
+                return
+            self._run_collector(collector)
+            # Schedule from the due time so intervals do not drift
+            next_due = max(due + collector.interval, time.monotonic())
+            heapq.heapreplace(schedule, (next_due, i, collector))
+
+_sampler: Optional[MetricsSampler] = None
+_sampler_lock = threading.Lock()
+
+def get_sampler() -> MetricsSampler:
+    """Return the process-wide sampler, starting it on first use."""
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = MetricsSampler(build_collectors())
+            _sampler.start()
+        return _sampler
@@ -1,13 +1,12 @@
 """Metrics handler for agent servers."""
 from flask import Blueprint, Response, current_app
 from prometheus_client import (
-    generate_latest,
-    CONTENT_TYPE_LATEST,
     Gauge,
     CollectorRegistry
 )
-import psutil
 import logging
+from agents.collectors import get_sampler
+from metrics.exposition import ExpositionCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -23,37 +22,36 @@ disk_usage = Gauge('disk_usage_percent', 'Disk Usage in percent', registry=regis
 network_bytes_sent = Gauge('network_bytes_sent', 'Network bytes sent', registry=registry)
 network_bytes_recv = Gauge('network_bytes_recv', 'Network bytes received', registry=registry)
 
+def update_gauges():
+    """Set the gauges from the latest sampler snapshot."""
+    logger.info("Collecting metrics...")
+
+    # Read the sampler snapshot instead of calling psutil on every scrape
+    snapshot = get_sampler().snapshot()
+
+    # Update usage metrics
+    for name, gauge in (('cpu', cpu_usage), ('memory', memory_usage), ('disk', disk_usage)):
+        if name in snapshot:
+            gauge.set(snapshot[name])
+            logger.debug(f"{name.capitalize()} Usage: {snapshot[name]}%")
+
+    # Update network metrics
+    network = snapshot.get('network')
+    if network:
+        network_bytes_sent.set(network['bytes_sent'])
+        network_bytes_recv.set(network['bytes_recv'])
+        logger.debug(f"Network - Sent: {network['bytes_sent']}, Received: {network['bytes_recv']}")
+
+# Gauges are refreshed only when the cached exposition is rendered again
+exposition_cache = ExpositionCache(registry, prepare=update_gauges)
+
 metrics_bp = Blueprint('metrics', __name__)
 
 @metrics_bp.route('/metrics', methods=['GET'])
 def metrics():
     """Collect and return current system metrics."""
     try:
-        logger.info("Collecting metrics...")
-        
-        # Update CPU metrics
-        cpu_percent = psutil.cpu_percent(interval=None)  # Don't wait for interval
-        cpu_usage.set(cpu_percent)
-        logger.debug(f"CPU Usage: {cpu_percent}%")
-        
-        # Update memory metrics
-        memory = psutil.virtual_memory()
-        memory_usage.set(memory.percent)
-        logger.debug(f"Memory Usage: {memory.percent}%")
-        
-        # Update disk metrics
-        disk = psutil.disk_usage('/')
-        disk_usage.set(disk.percent)
-        logger.debug(f"Disk Usage: {disk.percent}%")
-        
-        # Update network metrics
-        network = psutil.net_io_counters()
-        network_bytes_sent.set(network.bytes_sent)
-        network_bytes_recv.set(network.bytes_recv)
-        logger.debug(f"Network - Sent: {network.bytes_sent}, Received: {network.bytes_recv}")
-        
-        # Generate and return metrics
-        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+        return exposition_cache.response()
     except Exception as e:
         logger.error(f"Error collecting metrics: {str(e)}")
-        return Response(f"Error collecting metrics: {str(e)}", status=500) 
\ No newline at end of file
+        return Response(f"Error collecting metrics: {str(e)}", status=500) 
@@ -0,0 +1,91 @@
+"""Bounded on-disk spool for metric batches that could not be delivered."""
+import os
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+class MetricsSpool:
+    """Append-only JSON-lines file of unsent batches, oldest first.
+
+    When the file would grow past ``max_bytes`` the oldest batches are
+    discarded, so a long outage costs bounded disk space and loses the
+    oldest data first.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 10 * 1024 * 1024) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._read())
+
+    def _read(self) -> List[str]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return [line for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def _write(self, lines: List[str]) -> None:
+        if not lines:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        os.replace(tmp_path, self.path)
+
+    def append(self, batch: Dict[str, Any]) -> None:
+        """Spool a batch, dropping the oldest ones if the file is full."""
+        line = json.dumps(batch, separators=(',', ':')) + '\n'
+        size = len(line.encode('utf-8'))
+        if size > self.max_bytes:
+            logger.warning("Batch of %d bytes exceeds spool size, dropping it", size)
+            return
+        with self._lock:
+            current = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            if current + size <= self.max_bytes:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+                return
+
+            # Trim the oldest batches to make room
+            lines = self._read()
+            dropped = 0
+            while lines and current + size > self.max_bytes:
+                current -= len(lines.pop(0).encode('utf-8'))
+                dropped += 1
+            logger.warning("Metrics spool full, dropped %d oldest batches", dropped)
+            self._write(lines + [line])
+
+    def replay(self, send: Callable[[Dict[str, Any]], bool]) -> bool:
+        """Send spooled batches in order until one fails.
+
+        Delivered batches are removed from the spool. Returns True when the
+        spool is empty afterwards.
+        """
+        with self._lock:
+            lines = self._read()
+            if not lines:
+                return True
+            sent = 0
+            for line in lines:
+                try:
+                    batch = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.error("Discarding corrupt spooled batch")
+                    sent += 1
+                    continue
+                if not send(batch):
+                    break
+                sent += 1
+            if sent:
+                logger.info("Replayed %d spooled batches", sent)
+            self._write(lines[sent:])
+            return sent == len(lines)
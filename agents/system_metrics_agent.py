@@ -1,12 +1,16 @@
-import psutil
 import time
 import requests
 import socket
 import platform
 import uuid
 import os
+import gzip
+import json
 import logging
 from dotenv import load_dotenv
+from agents.spool import MetricsSpool
+from agents.collectors import get_sampler
+from metrics import wire_format
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -15,6 +19,9 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Samples per batch, 1 sends every sample on its own
+AGENT_BATCH_SIZE = int(os.getenv('AGENT_BATCH_SIZE', 12))
+
 # Get server identification
 def get_server_info():
     try:
@@ -36,16 +43,9 @@ def get_server_info():
         raise
 
 def get_system_metrics():
+    """Return the latest snapshot from the background sampler without blocking."""
     try:
-        metrics = {
-            'cpu': psutil.cpu_percent(interval=1),
-            'memory': psutil.virtual_memory().percent,
-            'disk': psutil.disk_usage('/').percent,
-            'network': {
-                'bytes_sent': psutil.net_io_counters().bytes_sent,
-                'bytes_recv': psutil.net_io_counters().bytes_recv
-            }
-        }
+        metrics = dict(get_sampler().snapshot())
         logger.debug(f"Collected metrics: {metrics}")
         return metrics
     except Exception as e:
@@ -85,9 +85,88 @@ def collect_and_send_metrics():
         
         time.sleep(5)  # Send metrics every 5 seconds
 
+def encode_batch(batch, wire='json'):
+    """Serialize a batch as JSON or in the compact binary format, returning (body, content type)."""
+    if wire == 'binary':
+        samples = [
+            (time.mktime(time.strptime(sample['timestamp'], '%Y-%m-%d %H:%M:%S')), sample['metrics'])
+            for sample in batch['samples']
+        ]
+        return wire_format.encode_batch(batch['server_info'], samples), wire_format.CONTENT_TYPE
+    return json.dumps(batch, separators=(',', ':')).encode('utf-8'), 'application/json'
+
+def send_batch(session, endpoint, batch, wire='json'):
+    """POST a gzip-compressed batch. Returns False if it should be retried later."""
+    body, content_type = encode_batch(batch, wire)
+    try:
+        response = session.post(
+            endpoint,
+            data=gzip.compress(body),
+            headers={'Content-Type': content_type},
+            timeout=10
+        )
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Failed to send batch to {endpoint}: {str(e)}")
+        return False
+
+    if response.status_code == 200:
+        logger.info(f"Sent batch of {len(batch['samples'])} samples")
+        return True
+    if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+        # The dashboard will never accept this batch, do not spool it
+        logger.error(f"Batch rejected. Status code: {response.status_code}")
+        logger.error(f"Response: {response.text}")
+        return True
+    logger.error(f"Failed to send batch. Status code: {response.status_code}")
+    return False
+
+def collect_and_send_batches():
+    """Sample on a fixed interval and send compressed batches, spooling them while the dashboard is down."""
+    server_info = get_server_info()
+    interval = float(os.getenv('METRICS_COLLECTION_INTERVAL', 5))
+    wire = os.getenv('AGENT_WIRE_FORMAT', 'json')
+    spool = MetricsSpool(
+        os.getenv('AGENT_SPOOL_PATH', 'metrics_spool.jsonl'),
+        max_bytes=int(os.getenv('AGENT_SPOOL_MAX_BYTES', 10 * 1024 * 1024))
+    )
+
+    dashboard_url = os.getenv('DASHBOARD_URL', 'http://localhost:5000')
+    metrics_endpoint = f"{dashboard_url}/metrics"
+    logger.info(f"Sending batches of {AGENT_BATCH_SIZE} samples "
+                f"every {interval * AGENT_BATCH_SIZE:g}s to {metrics_endpoint}")
+
+    session = requests.Session()
+    session.headers.update({'Content-Encoding': 'gzip'})
+
+    def send(batch):
+        return send_batch(session, metrics_endpoint, batch, wire)
+
+    samples = []
+    while True:
+        started = time.monotonic()
+        try:
+            samples.append({
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'metrics': get_system_metrics()
+            })
+        except Exception as e:
+            logger.error(f"Error collecting metrics: {str(e)}", exc_info=True)
+
+        if len(samples) >= AGENT_BATCH_SIZE:
+            batch = {'server_info': server_info, 'samples': samples}
+            samples = []
+            # Replay the backlog first so the dashboard receives data in order
+            if not (spool.replay(send) and send(batch)):
+                spool.append(batch)
+
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
 if __name__ == "__main__":
     try:
-        collect_and_send_metrics()
+        if AGENT_BATCH_SIZE > 1:
+            collect_and_send_batches()
+        else:
+            collect_and_send_metrics()
     except KeyboardInterrupt:
         logger.info("Stopping metrics collection...")
     except Exception as e:
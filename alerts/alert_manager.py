@@ -2,6 +2,7 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
+from datetime import datetime
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -29,18 +30,75 @@ Anomalies Detected:
     
     return message
 
+def format_time(value):
+    """Render an epoch timestamp like agent timestamps; strings pass through."""
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value).strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+def format_digest_message(digest):
+    events = digest['events']
+    fired = sum(1 for event in events if event['status'] == 'firing')
+
+    message = f"""
+ALERT DIGEST: {fired} fired, {len(events) - fired} resolved, {digest['active']} active
+
+"""
+    for event in events:
+        server_info = event['server_info']
+        message += (
+            f"- [{event['status'].upper()}] {server_info.get('hostname')} ({server_info.get('ip')}) "
+            f"{event['metric'].upper()}: {event['value']} "
+            f"since {format_time(event['since'])}, at {format_time(event['timestamp'])}\n"
+        )
+
+    return message
+
+def get_smtp_settings():
+    return {
+        'server': os.getenv('SMTP_SERVER', 'smtp.gmail.com'),
+        'port': int(os.getenv('SMTP_PORT', '587')),
+        'user': os.getenv('EMAIL_USER'),
+        'password': os.getenv('EMAIL_PASSWORD')
+    }
+
+def build_alert_email(alert_data, email_user):
+    msg = MIMEMultipart()
+    msg['Subject'] = f"System Alert: Anomalies on {alert_data['server_info']['hostname']}"
+    msg['From'] = email_user
+    msg['To'] = email_user
+
+    body = format_alert_message(alert_data)
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+def build_digest_email(digest, email_user):
+    msg = MIMEMultipart()
+    msg['Subject'] = f"System Alert Digest: {len(digest['events'])} changes, {digest['active']} active"
+    msg['From'] = email_user
+    msg['To'] = email_user
+
+    body = format_digest_message(digest)
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+def alert_label(alert_data):
+    """Short description of an alert or digest for logs."""
+    if 'events' in alert_data:
+        return f"digest of {len(alert_data['events'])} alerts"
+    return f"server {alert_data['server_info'].get('hostname')}"
+
 def send_alert(alert_data):
-    smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-    smtp_port = int(os.getenv('SMTP_PORT', '587'))
-    email_user = os.getenv('EMAIL_USER')
-    email_password = os.getenv('EMAIL_PASSWORD')
+    settings = get_smtp_settings()
+    email_user = settings['user']
+    email_password = settings['password']
 
     if not all([email_user, email_password]):
         print("Warning: Email credentials not configured. Skipping alert.")
         return
 
     try:
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
+        with smtplib.SMTP(settings['server'], settings['port']) as server:
             server.starttls()
             try:
                 server.login(email_user, email_password)
@@ -53,15 +111,7 @@ def send_alert(alert_data):
                 print("4. Update the EMAIL_PASSWORD in your .env file")
                 return
             
-            msg = MIMEMultipart()
-            msg['Subject'] = f"System Alert: Anomalies on {alert_data['server_info']['hostname']}"
-            msg['From'] = email_user
-            msg['To'] = email_user
-            
-            body = format_alert_message(alert_data)
-            msg.attach(MIMEText(body, 'plain'))
-            
-            server.send_message(msg)
+            server.send_message(build_alert_email(alert_data, email_user))
             print(f"Alert sent successfully for server {alert_data['server_info']['hostname']}")
     except Exception as e:
-        print(f"Failed to send alert: {str(e)}") 
\ No newline at end of file
+        print(f"Failed to send alert: {str(e)}")
\ No newline at end of file
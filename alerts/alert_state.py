@@ -0,0 +1,181 @@
+"""Alert lifecycle per server and metric, batched into periodic digests.
+
+A metric must breach its threshold on ``ALERT_FIRE_AFTER`` consecutive
+samples before its alert fires, and stay clear for ``ALERT_RESOLVE_AFTER``
+consecutive samples before it resolves. Repeated breaches of a firing alert
+send nothing. Firing and resolved transitions are collected and handed over
+as one digest every ``ALERT_DIGEST_INTERVAL`` seconds.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from metrics.prometheus_metrics import alerts_active, alert_transitions_total
+
+logger = logging.getLogger(__name__)
+
+# Consecutive breaching samples before an alert fires
+ALERT_FIRE_AFTER = int(os.getenv('ALERT_FIRE_AFTER', 3))
+# Consecutive clear samples before a firing alert resolves
+ALERT_RESOLVE_AFTER = int(os.getenv('ALERT_RESOLVE_AFTER', 3))
+# Seconds between digests, 0 sends every transition right away
+ALERT_DIGEST_INTERVAL = float(os.getenv('ALERT_DIGEST_INTERVAL', 60))
+
+PENDING = 'pending'
+FIRING = 'firing'
+RESOLVED = 'resolved'
+
+class AlertState:
+    """Progress of one server metric through the alert lifecycle."""
+
+    __slots__ = ('status', 'breaches', 'clears', 'value', 'since')
+
+    def __init__(self, since: Any) -> None:
+        self.status = PENDING
+        self.breaches = 0
+        self.clears = 0
+        self.value: Any = None
+        self.since = since
+
+class AlertStateManager:
+    """Track alert state per server and metric and emit digests of the transitions.
+
+    ``submit`` receives each digest, a dict with the ``events`` of the
+    interval and the number of alerts still ``active``. ``source`` labels
+    the exported metrics of managers fed by different detectors.
+    """
+
+    def __init__(self, submit: Callable[[Dict[str, Any]], Any],
+                 fire_after: int = ALERT_FIRE_AFTER, resolve_after: int = ALERT_RESOLVE_AFTER,
+                 digest_interval: float = ALERT_DIGEST_INTERVAL, source: str = 'threshold') -> None:
+        self.submit = submit
+        self.source = source
+        self.fire_after = fire_after
+        self.resolve_after = resolve_after
+        self.digest_interval = digest_interval
+        self._states: Dict[Tuple[str, str], AlertState] = {}
+        # Metrics of each server that have a state, so clear samples only visit those
+        self._tracked: Dict[str, Set[str]] = {}
+        self._events: List[Dict[str, Any]] = []
+        # Firing alerts, kept under the lock so scrapes never iterate the states
+        self._firing = 0
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        alerts_active.labels(source=source).set_function(self.active_count)
+
+    def active_count(self) -> int:
+        """Number of firing alerts."""
+        return self._firing
+
+    def active(self) -> List[Dict[str, Any]]:
+        """Firing alerts, as ``{server_id, metric, value, since}``."""
+        with self._lock:
+            return [
+                {'server_id': server_id, 'metric': metric, 'value': state.value, 'since': state.since}
+                for (server_id, metric), state in self._states.items() if state.status == FIRING
+            ]
+
+    def _event(self, server_info: Dict[str, Any], metric: str, status: str,
+               state: AlertState, timestamp: Any) -> Dict[str, Any]:
+        alert_transitions_total.labels(source=self.source, status=status).inc()
+        return {
+            'server_info': server_info,
+            'metric': metric,
+            'status': status,
+            'value': state.value,
+            'since': state.since,
+            'timestamp': timestamp
+        }
+
+    def observe(self, server_info: Dict[str, Any], timestamp: Any,
+                anomalies: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Advance the alerts of a server by one sample and return the transitions it caused.
+
+        ``anomalies`` maps the metrics breaching in this sample to their
+        values; tracked metrics missing from it count as clear.
+        """
+        server_id = server_info['server_id']
+        events = []
+        with self._lock:
+            tracked = self._tracked.setdefault(server_id, set())
+            for metric, value in anomalies.items():
+                key = (server_id, metric)
+                state = self._states.get(key)
+                if state is None:
+                    state = self._states[key] = AlertState(timestamp)
+                    tracked.add(metric)
+                state.breaches += 1
+                state.clears = 0
+                state.value = value
+                if state.status == PENDING and state.breaches >= self.fire_after:
+                    state.status = FIRING
+                    self._firing += 1
+                    events.append(self._event(server_info, metric, FIRING, state, timestamp))
+
+            for metric in [m for m in tracked if m not in anomalies]:
+                key = (server_id, metric)
+                state = self._states[key]
+                state.clears += 1
+                if state.status == PENDING or state.clears >= self.resolve_after:
+                    del self._states[key]
+                    tracked.discard(metric)
+                    if state.status == FIRING:
+                        self._firing -= 1
+                        events.append(self._event(server_info, metric, RESOLVED, state, timestamp))
+            if not tracked:
+                del self._tracked[server_id]
+            self._events.extend(events)
+        return events
+
+    def forget(self, server_id: str) -> None:
+        """Drop every alert of a server without reporting it resolved."""
+        with self._lock:
+            for metric in self._tracked.pop(server_id, set()):
+                if self._states.pop((server_id, metric)).status == FIRING:
+                    self._firing -= 1
+
+    def flush(self) -> Optional[Dict[str, Any]]:
+        """Submit the transitions collected since the last digest, if any."""
+        with self._lock:
+            self._flushed_at = time.monotonic()
+            events, self._events = self._events, []
+        if not events:
+            return None
+        digest = {'events': events, 'active': self.active_count(), 'timestamp': time.time()}
+        self.submit(digest)
+        return digest
+
+    def flush_if_due(self) -> Optional[Dict[str, Any]]:
+        """Submit a digest when the digest interval has passed."""
+        if time.monotonic() - self._flushed_at < self.digest_interval:
+            return None
+        return self.flush()
+
+    def start(self) -> None:
+        """Submit a digest every digest interval from a background thread, even without samples.
+
+        Without an interval, digests are sent by ``flush_if_due`` as transitions happen.
+        """
+        if self._thread is not None or self.digest_interval <= 0:
+            return
+
+        def run() -> None:
+            while not self._stop.wait(self.digest_interval):
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"Alert digest failed: {str(e)}", exc_info=True)
+
+        self._thread = threading.Thread(target=run, name=f'alert-digests-{self.source}', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background digests and submit the pending transitions."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
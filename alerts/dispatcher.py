@@ -0,0 +1,173 @@
+"""Asynchronous alert delivery over long-lived SMTP connections."""
+import os
+import queue
+import smtplib
+import threading
+import time
+import logging
+from typing import Any, Dict, List, Optional
+from alerts.alert_manager import get_smtp_settings, build_alert_email, build_digest_email, alert_label
+from metrics.prometheus_metrics import (
+    alert_queue_depth,
+    alert_delivery_duration_seconds,
+    alerts_total
+)
+
+logger = logging.getLogger(__name__)
+
+# Dispatcher configuration
+ALERT_WORKERS = int(os.getenv('ALERT_WORKERS', 2))
+ALERT_QUEUE_SIZE = int(os.getenv('ALERT_QUEUE_SIZE', 1000))
+# Close an SMTP connection after this many idle seconds
+SMTP_IDLE_TIMEOUT = float(os.getenv('SMTP_IDLE_TIMEOUT', 60))
+
+class SMTPConnection:
+    """A reusable SMTP session that reconnects on demand."""
+
+    def __init__(self, settings: Dict[str, Any]) -> None:
+        self.settings = settings
+        self._smtp: Optional[smtplib.SMTP] = None
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.settings['server'], self.settings['port'], timeout=30)
+        try:
+            smtp.starttls()
+            smtp.login(self.settings['user'], self.settings['password'])
+        except Exception:
+            smtp.close()
+            raise
+        return smtp
+
+    def send(self, message: Any) -> None:
+        """Send a message, reconnecting once if the session was dropped."""
+        if self._smtp is None:
+            self._smtp = self._connect()
+        try:
+            self._smtp.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            self._smtp = self._connect()
+            self._smtp.send_message(message)
+
+    def close(self) -> None:
+        """Close the session if one is open."""
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except smtplib.SMTPException:
+            self._smtp.close()
+        except OSError:
+            pass
+        self._smtp = None
+
+class AlertDispatcher:
+    """Queue alerts and deliver them from background worker threads.
+
+    Items are single alerts or digests from ``AlertStateManager``, which
+    carry their transitions under ``events``.
+
+    Producers only pay for a non-blocking queue put. When the queue is full
+    the alert is dropped and counted rather than stalling ingest.
+    """
+
+    def __init__(self, workers: int = ALERT_WORKERS, maxsize: int = ALERT_QUEUE_SIZE,
+                 idle_timeout: float = SMTP_IDLE_TIMEOUT) -> None:
+        self.workers = workers
+        self.idle_timeout = idle_timeout
+        self.queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        # Set on stop; workers then exit as soon as the queue is empty
+        self._stop = threading.Event()
+        alert_queue_depth.set_function(self.queue.qsize)
+
+    def start(self) -> None:
+        """Start the worker threads if they are not running yet."""
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run,
+                    name=f'alert-dispatcher-{i}',
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, alert_data: Dict[str, Any]) -> bool:
+        """Enqueue an alert for delivery. Returns False if it was dropped."""
+        if not self._threads:
+            self.start()
+        try:
+            self.queue.put_nowait((time.monotonic(), alert_data))
+        except queue.Full:
+            alerts_total.labels(status='dropped').inc()
+            logger.warning("Alert queue full, dropping alert for %s", alert_label(alert_data))
+            return False
+        return True
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Deliver what is already queued, then stop the workers.
+
+        Waits at most ``timeout`` seconds; alerts still queued then are lost
+        with the daemon workers.
+        """
+        with self._lock:
+            self._stop.set()
+            deadline = time.monotonic() + timeout
+            for _ in self._threads:
+                try:
+                    self.queue.put_nowait(None)
+                except queue.Full:
+                    # No room for more wake-ups, workers see the stop event once they drain the queue
+                    break
+            for thread in self._threads:
+                thread.join(max(deadline - time.monotonic(), 0))
+            self._threads = []
+
+    def _run(self) -> None:
+        settings = get_smtp_settings()
+        connection = SMTPConnection(settings)
+        try:
+            while True:
+                try:
+                    if self._stop.is_set():
+                        item = self.queue.get_nowait()
+                    else:
+                        item = self.queue.get(timeout=self.idle_timeout)
+                except queue.Empty:
+                    if self._stop.is_set():
+                        return
+                    connection.close()
+                    continue
+                if item is None:
+                    self.queue.task_done()
+                    return
+                enqueued_at, alert_data = item
+                try:
+                    self._deliver(connection, settings, alert_data)
+                finally:
+                    alert_delivery_duration_seconds.observe(time.monotonic() - enqueued_at)
+                    self.queue.task_done()
+        finally:
+            connection.close()
+
+    def _deliver(self, connection: SMTPConnection, settings: Dict[str, Any],
+                 alert_data: Dict[str, Any]) -> None:
+        label = alert_label(alert_data)
+        if not all([settings['user'], settings['password']]):
+            alerts_total.labels(status='skipped').inc()
+            logger.warning("Email credentials not configured. Skipping alert for %s", label)
+            return
+        build = build_digest_email if 'events' in alert_data else build_alert_email
+        try:
+            connection.send(build(alert_data, settings['user']))
+        except Exception as e:
+            connection.close()
+            alerts_total.labels(status='failed').inc()
+            logger.error("Failed to send alert for %s: %s", label, e)
+            return
+        alerts_total.labels(status='sent').inc()
+        logger.info("Alert sent successfully for %s", label)
@@ -0,0 +1,204 @@
+"""Alert rules compiled once and evaluated over the in-memory history on a tick.
+
+A rule compares a field, or the per-second rate of a counter, with a
+threshold, optionally requiring the condition on every sample of a trailing
+duration::
+
+    cpu > 80 for 2m
+    rate(bytes_recv) > 1000000
+    disk >= 95
+
+On every tick the recent samples of all servers are gathered once into a
+``(servers, fields, samples)`` block, and each rule is a handful of NumPy
+operations over it, so a tick costs rules x servers whatever the ingest rate.
+"""
+import os
+import re
+import json
+import math
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+from metrics.history import HistoryStore
+from metrics.prometheus_metrics import alert_rule_evaluation_seconds
+
+logger = logging.getLogger(__name__)
+
+# Optional JSON list of {"name": ..., "expr": ...} rules
+ALERT_RULES_FILE = os.getenv('ALERT_RULES_FILE')
+# Seconds between evaluations
+ALERT_RULES_INTERVAL = float(os.getenv('ALERT_RULES_INTERVAL', 10))
+# Servers without a sample for this many seconds are not evaluated
+ALERT_RULES_STALE_AFTER = float(os.getenv('ALERT_RULES_STALE_AFTER', 60))
+# Expected spacing of samples, to size the window gathered for "for" durations
+RULES_SAMPLE_INTERVAL = float(os.getenv('METRICS_COLLECTION_INTERVAL', 5))
+
+OPERATORS = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '==': np.equal,
+    '!=': np.not_equal
+}
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600}
+
+RULE_PATTERN = re.compile(
+    r'^\s*(?:rate\(\s*(?P<counter>\w+)\s*\)|(?P<field>\w+))'
+    r'\s*(?P<op>>=|<=|==|!=|>|<)'
+    r'\s*(?P<threshold>[-+]?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)'
+    r'(?:\s+for\s+(?P<duration>\d+(?:\.\d*)?)(?P<unit>[smh]))?\s*$'
+)
+
+class Tick(NamedTuple):
+    """Recent samples of every server, right-aligned and padded with NaN."""
+    server_ids: List[str]
+    timestamps: np.ndarray  # (servers, samples)
+    values: np.ndarray  # (servers, fields, samples)
+    rows: Dict[str, int]  # field name -> row of values
+    stale: List[str]  # servers without a recent sample, not evaluated
+
+class Rule:
+    """A parsed rule, evaluated for all servers of a tick at once."""
+
+    def __init__(self, name: str, expr: str, field: str, rate: bool, op: str,
+                 threshold: float, duration: float = 0.0) -> None:
+        self.name = name
+        self.expr = expr
+        self.field = field
+        self.rate = rate
+        self.op = op
+        self.threshold = threshold
+        self.duration = duration
+        self._compare = OPERATORS[op]
+
+    def series(self, tick: Tick) -> np.ndarray:
+        """Per-sample values of the rule's expression, ``(servers, samples)``."""
+        values = tick.values[:, tick.rows[self.field]]
+        if not self.rate:
+            return values
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rates = np.diff(values, axis=1) / np.diff(tick.timestamps, axis=1)
+        # Counter resets give negative rates, which mean nothing
+        rates[rates < 0] = np.nan
+        return np.concatenate([np.full((len(values), 1), np.nan), rates], axis=1)
+
+    def evaluate(self, tick: Tick) -> Tuple[np.ndarray, np.ndarray]:
+        """Latest value of the expression and whether the rule breaches, per server."""
+        series = self.series(tick)
+        with np.errstate(invalid='ignore'):
+            holds = self._compare(series, self.threshold)
+        latest = series[:, -1]
+        if not self.duration:
+            return latest, holds[:, -1]
+        last = tick.timestamps[:, -1:]
+        within = tick.timestamps >= last - self.duration
+        # The history must reach back the whole duration
+        covered = np.nanmin(tick.timestamps, axis=1) <= last[:, 0] - self.duration
+        return latest, covered & np.all(holds | ~within, axis=1)
+
+def parse_duration(value: str, unit: str) -> float:
+    """Seconds of a duration such as ``2`` and ``m``."""
+    return float(value) * DURATION_UNITS[unit]
+
+def compile_rule(name: str, expr: str, fields: Sequence[str]) -> Rule:
+    """Parse a rule expression, checking its field exists."""
+    match = RULE_PATTERN.match(expr)
+    if not match:
+        raise ValueError(f"Invalid rule {name}: {expr!r}")
+    field = match.group('counter') or match.group('field')
+    if field not in fields:
+        raise ValueError(f"Unknown field {field} in rule {name}")
+    duration = parse_duration(match.group('duration'), match.group('unit')) if match.group('duration') else 0.0
+    return Rule(name, expr, field, bool(match.group('counter')), match.group('op'),
+                float(match.group('threshold')), duration)
+
+def load_rules(path: Optional[str] = ALERT_RULES_FILE, fields: Sequence[str] = ()) -> List[Rule]:
+    """Compile the rules of a JSON file, or none without one."""
+    if not path:
+        return []
+    with open(path) as f:
+        definitions = json.load(f)
+    return [compile_rule(rule['name'], rule['expr'], fields) for rule in definitions]
+
+class RuleEngine:
+    """Evaluate compiled rules over the history of every server."""
+
+    def __init__(self, store: HistoryStore, rules: Sequence[Rule],
+                 stale_after: float = ALERT_RULES_STALE_AFTER,
+                 sample_interval: float = RULES_SAMPLE_INTERVAL) -> None:
+        self.store = store
+        self.rules = list(rules)
+        self.stale_after = stale_after
+        self._fields = sorted({rule.field for rule in self.rules})
+        longest = max([rule.duration for rule in self.rules], default=0.0)
+        # Room for twice the expected samples, so jittery agents still cover the duration
+        self.window = min(store.capacity, math.ceil(2 * longest / sample_interval) + 2)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def gather(self, now: Optional[float] = None) -> Tick:
+        """Copy the recent samples of every live server into one block."""
+        now = time.time() if now is None else now
+        server_ids, columns, stale = [], [], []
+        rows = [0] + [self.store.fields.index(name) + 1 for name in self._fields]
+        for server_id in self.store:
+            history = self.store.get(server_id)
+            if history is None or not len(history):
+                continue
+            window = history.window(self.window)
+            if window[0, -1] < now - self.stale_after:
+                stale.append(server_id)
+                continue
+            server_ids.append(server_id)
+            columns.append(window[rows])
+
+        block = np.full((len(server_ids), len(rows), self.window), np.nan)
+        for i, window in enumerate(columns):
+            block[i, :, self.window - window.shape[1]:] = window
+        rows_by_field = {name: i for i, name in enumerate(self._fields)}
+        return Tick(server_ids, block[:, 0], block[:, 1:], rows_by_field, stale)
+
+    def evaluate(self, now: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        """Breaching rules of every live server, as ``{server_id: {rule: value}}``.
+
+        Live servers without breaches and stale servers map to an empty dict,
+        so callers can clear their alerts.
+        """
+        tick = self.gather(now)
+        results: Dict[str, Dict[str, float]] = {server_id: {} for server_id in tick.server_ids + tick.stale}
+        if not tick.server_ids:
+            return results
+        for rule in self.rules:
+            started = time.perf_counter()
+            values, breaches = rule.evaluate(tick)
+            alert_rule_evaluation_seconds.labels(rule=rule.name).observe(time.perf_counter() - started)
+            for i in np.flatnonzero(breaches):
+                results[tick.server_ids[i]][rule.name] = float(values[i])
+        return results
+
+    def start(self, on_tick: Callable[[Dict[str, Dict[str, float]]], Any],
+              interval: float = ALERT_RULES_INTERVAL) -> None:
+        """Evaluate every ``interval`` seconds in a background thread, passing results to ``on_tick``."""
+        if self._thread is not None or not self.rules:
+            return
+
+        def run() -> None:
+            while not self._stop.wait(interval):
+                try:
+                    on_tick(self.evaluate())
+                except Exception as e:
+                    logger.error(f"Rule evaluation failed: {str(e)}", exc_info=True)
+
+        self._thread = threading.Thread(target=run, name='alert-rules', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background evaluation."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
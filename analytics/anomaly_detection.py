@@ -1,17 +1,18 @@
 import numpy as np
 
-def detect_anomaly(data):
-    # Thresholds for different metrics
-    thresholds = {
-        'cpu': 80,      # CPU usage above 80%
-        'memory': 90,   # Memory usage above 90%
-        'disk': 85,     # Disk usage above 85%
-        'network': {
-            'bytes_sent': 1000000,  # 1MB/s
-            'bytes_recv': 1000000   # 1MB/s
-        }
+# Thresholds for different metrics, also the defaults of the fleet detector
+THRESHOLDS = {
+    'cpu': 80,      # CPU usage above 80%
+    'memory': 90,   # Memory usage above 90%
+    'disk': 85,     # Disk usage above 85%
+    'network': {
+        # Rates derived at ingest, the raw counters are cumulative totals
+        'bytes_sent_rate': 1000000,  # 1MB/s
+        'bytes_recv_rate': 1000000   # 1MB/s
     }
-    
+}
+
+def detect_anomaly(data, thresholds=THRESHOLDS):
     anomalies = {}
     
     for metric, value in data.items():
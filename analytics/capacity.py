@@ -0,0 +1,148 @@
+"""Time until disk and memory of every server reach their capacity thresholds.
+
+Trends come from a ``TrendForecaster`` fed at ingest. Each sample re-solves
+only its own server's trend, in O(1), and refreshes that server's estimate,
+so reports over thousands of hosts are just a sort. The planner is also a
+Prometheus collector exporting the estimates of recently seen servers at
+scrape time.
+"""
+import os
+import time
+import threading
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+from metrics.prometheus_metrics import SYSTEM_METRICS_MAX_AGE
+from .predictive_analytics import TrendForecaster
+
+# Resources whose exhaustion is forecast
+CAPACITY_METRICS = ('disk', 'memory')
+
+# Usage (in percent) considered exhausted
+CAPACITY_THRESHOLDS = {
+    'disk': float(os.getenv('CAPACITY_DISK_THRESHOLD', 95)),
+    'memory': float(os.getenv('CAPACITY_MEMORY_THRESHOLD', 95)),
+}
+
+# Samples the trends are fitted on; longer windows smooth out daily cycles
+CAPACITY_WINDOW = int(os.getenv('CAPACITY_WINDOW', 2880))
+
+def seconds_to_threshold(current: np.ndarray, slope: np.ndarray, threshold: np.ndarray) -> np.ndarray:
+    """Seconds until values reach their thresholds at a constant slope.
+
+    0 once a threshold is reached, inf when the value is not growing, NaN
+    when there is no trend yet.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        remaining = (threshold - current) / slope
+    seconds = np.where(slope > 0, remaining, np.inf)
+    seconds = np.where(current >= threshold, 0.0, seconds)
+    return np.where(np.isnan(slope) | np.isnan(current), np.nan, seconds)
+
+class CapacityPlanner(Collector):
+    """Incrementally maintained time-to-threshold of every server.
+
+    Registered on a registry, it exports the estimates of servers seen in
+    the last ``max_age`` seconds.
+    """
+
+    def __init__(self, thresholds: Mapping[str, float] = CAPACITY_THRESHOLDS,
+                 window: int = CAPACITY_WINDOW, metrics: Sequence[str] = CAPACITY_METRICS,
+                 max_age: float = SYSTEM_METRICS_MAX_AGE) -> None:
+        self.metrics = tuple(metrics)
+        self.max_age = max_age
+        self.thresholds = np.array([thresholds[name] for name in self.metrics], dtype=float)
+        self.forecaster = TrendForecaster(window=window, metrics=self.metrics)
+        # server id -> estimate as of its latest sample
+        self._estimates: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._estimates)
+
+    def observe(self, server_id: str, timestamp: float, metrics: Dict[str, Any]) -> Dict[str, Any]:
+        """Fold a sample into the server's trends and refresh its estimate."""
+        self.forecaster.observe(server_id, timestamp, metrics)
+        slope, current = self.forecaster.trend(server_id)
+        seconds = seconds_to_threshold(current, slope, self.thresholds)
+        estimate = {
+            'server_id': server_id,
+            'timestamp': timestamp,
+            'current': current,
+            'slope': slope,
+            'seconds': seconds,
+            'seen': time.monotonic()
+        }
+        with self._lock:
+            self._estimates[server_id] = estimate
+        return estimate
+
+    def forget(self, server_id: str) -> None:
+        """Drop a server's trends and estimate."""
+        self.forecaster.forget(server_id)
+        with self._lock:
+            self._estimates.pop(server_id, None)
+
+    def families(self) -> Tuple[GaugeMetricFamily, GaugeMetricFamily]:
+        """Empty metric families, filled by ``collect``."""
+        return (
+            GaugeMetricFamily('capacity_seconds_to_threshold',
+                              'Seconds until usage reaches its capacity threshold at the current trend, '
+                              '+Inf when not growing',
+                              labels=['server_id', 'metric']),
+            GaugeMetricFamily('capacity_growth_rate', 'Trend of usage in percentage points per second',
+                              labels=['server_id', 'metric'])
+        )
+
+    def describe(self) -> Iterable[GaugeMetricFamily]:
+        return self.families()
+
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        seconds_family, rate_family = self.families()
+        cutoff = time.monotonic() - self.max_age
+        with self._lock:
+            estimates = [estimate for estimate in self._estimates.values() if estimate['seen'] >= cutoff]
+        for estimate in estimates:
+            for i, name in enumerate(self.metrics):
+                if not np.isnan(estimate['seconds'][i]):
+                    seconds_family.add_metric([estimate['server_id'], name], estimate['seconds'][i])
+                    rate_family.add_metric([estimate['server_id'], name], estimate['slope'][i])
+        return seconds_family, rate_family
+
+    def _describe(self, estimate: Dict[str, Any]) -> Dict[str, Any]:
+        report = {'server_id': estimate['server_id']}
+        for i, name in enumerate(self.metrics):
+            seconds = estimate['seconds'][i]
+            finite = np.isfinite(seconds)
+            report[name] = {
+                'current': None if np.isnan(estimate['current'][i]) else round(float(estimate['current'][i]), 2),
+                'rate_per_hour': None if np.isnan(estimate['slope'][i]) else float(estimate['slope'][i] * 3600),
+                'threshold': float(self.thresholds[i]),
+                'seconds_to_threshold': float(seconds) if finite else None,
+                'exhausted_at': estimate['timestamp'] + float(seconds) if finite else None
+            }
+        return report
+
+    def report(self, sort: Optional[str] = None, descending: bool = False,
+               limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Estimates of every server, by default soonest exhaustion of any resource first.
+
+        ``sort`` names one resource to order by. Servers that are not
+        heading for a threshold come last either way.
+        """
+        if sort is not None and sort not in self.metrics:
+            raise ValueError(f"Cannot sort by {sort}")
+        with self._lock:
+            estimates = list(self._estimates.values())
+        if not estimates:
+            return []
+        seconds = np.array([estimate['seconds'] for estimate in estimates])
+        # Unknown and never sort as infinitely far away
+        keys = np.where(np.isfinite(seconds), seconds, np.inf)
+        keys = keys.min(axis=1) if sort is None else keys[:, self.metrics.index(sort)]
+        finite = np.isfinite(keys)
+        order = np.lexsort((-keys if descending else keys, ~finite))
+        if limit is not None:
+            order = order[:limit]
+        return [self._describe(estimates[i]) for i in order]
@@ -0,0 +1,320 @@
+"""Vectorized threshold detection across the whole fleet.
+
+Samples are rows of a ``(samples, metrics)`` array and thresholds a matrix of
+the same shape, so one comparison flags every metric of every server.
+Thresholds default to ``anomaly_detection.THRESHOLDS`` and can be overridden
+per group of servers and per server.
+"""
+import os
+import sys
+import json
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from metrics.history import HistoryStore, flatten_metrics
+from models.metric import Metric
+from .anomaly_detection import THRESHOLDS
+
+# Metrics compared against thresholds, in column order
+DETECTION_METRICS: Tuple[str, ...] = ('cpu', 'memory', 'disk', 'bytes_sent_rate', 'bytes_recv_rate')
+
+# Optional JSON file with "defaults", "groups", "servers" and "membership"
+ANOMALY_THRESHOLDS_FILE = os.getenv('ANOMALY_THRESHOLDS_FILE')
+
+# Samples compared per chunk when re-scanning history
+SCAN_CHUNK_SIZE = int(os.getenv('ANOMALY_SCAN_CHUNK_SIZE', 10000))
+
+# A sample chunk: server id, epoch timestamp and metric values per sample
+Chunk = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+def flat_thresholds(thresholds: Mapping[str, Any] = THRESHOLDS) -> Dict[str, Optional[float]]:
+    """Flatten nested thresholds such as ``network`` into one level; None disables a check."""
+    flat: Dict[str, Optional[float]] = {}
+    for name, value in thresholds.items():
+        if isinstance(value, Mapping):
+            flat.update(flat_thresholds(value))
+        else:
+            flat[name] = None if value is None else float(value)
+    return flat
+
+def detect(values: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """Return the mask of values above their thresholds.
+
+    Missing values and NaN thresholds, which disable a check, never match.
+    """
+    return np.greater(values, thresholds)
+
+class ThresholdConfig:
+    """Threshold matrix builder with group and server overrides.
+
+    A server's thresholds are the defaults, updated by its group's overrides
+    and then by its own.
+    """
+
+    def __init__(self, defaults: Optional[Mapping[str, float]] = None,
+                 groups: Optional[Mapping[str, Mapping[str, float]]] = None,
+                 servers: Optional[Mapping[str, Mapping[str, float]]] = None,
+                 membership: Optional[Mapping[str, str]] = None,
+                 metrics: Sequence[str] = DETECTION_METRICS) -> None:
+        self.metrics = tuple(metrics)
+        self._columns = {name: i for i, name in enumerate(self.metrics)}
+        base = flat_thresholds()
+        base.update(flat_thresholds(defaults or {}))
+        self._defaults = self._vector({name: base.get(name, np.nan) for name in self.metrics})
+        self._groups = {group: self._overrides(values) for group, values in (groups or {}).items()}
+        self._servers = {server: self._overrides(values) for server, values in (servers or {}).items()}
+        self._membership = dict(membership or {})
+        # Bumped on every change so cached matrices know to rebuild
+        self.version = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> 'ThresholdConfig':
+        """Build a config from its JSON form."""
+        return cls(
+            defaults=data.get('defaults'),
+            groups=data.get('groups'),
+            servers=data.get('servers'),
+            membership=data.get('membership')
+        )
+
+    def _vector(self, values: Mapping[str, float]) -> np.ndarray:
+        vector = np.full(len(self.metrics), np.nan)
+        for name, value in values.items():
+            if name not in self._columns:
+                raise ValueError(f"Unknown metric {name}")
+            vector[self._columns[name]] = np.nan if value is None else float(value)
+        return vector
+
+    def _overrides(self, values: Mapping[str, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Columns an override set touches and their values."""
+        values = flat_thresholds(values)
+        vector = self._vector(values)
+        columns = np.array([self._columns[name] for name in values], dtype=int)
+        return columns, vector[columns]
+
+    def set_group(self, group: str, values: Mapping[str, float]) -> None:
+        """Replace the overrides of a group."""
+        overrides = self._overrides(values)
+        with self._lock:
+            self._groups[group] = overrides
+            self.version += 1
+
+    def set_server(self, server_id: str, values: Mapping[str, float]) -> None:
+        """Replace the overrides of a server."""
+        overrides = self._overrides(values)
+        with self._lock:
+            self._servers[server_id] = overrides
+            self.version += 1
+
+    def assign(self, server_id: str, group: Optional[str]) -> None:
+        """Put a server in a group, or in none."""
+        with self._lock:
+            if group is None:
+                self._membership.pop(server_id, None)
+            else:
+                self._membership[server_id] = group
+            self.version += 1
+
+    def row(self, server_id: str) -> np.ndarray:
+        """Thresholds of one server."""
+        row = self._defaults.copy()
+        group = self._membership.get(server_id)
+        for overrides in (self._groups.get(group), self._servers.get(server_id)):
+            if overrides is not None:
+                columns, values = overrides
+                row[columns] = values
+        return row
+
+    def matrix(self, server_ids: Sequence[str]) -> np.ndarray:
+        """Thresholds of many servers as a ``(servers, metrics)`` matrix."""
+        matrix = np.empty((len(server_ids), len(self.metrics)))
+        for i, server_id in enumerate(server_ids):
+            matrix[i] = self.row(server_id)
+        return matrix
+
+def load_thresholds(path: Optional[str] = ANOMALY_THRESHOLDS_FILE) -> ThresholdConfig:
+    """Load thresholds from a JSON file, or use the defaults without one."""
+    if not path:
+        return ThresholdConfig()
+    with open(path) as f:
+        return ThresholdConfig.from_dict(json.load(f))
+
+class FleetDetector:
+    """Latest sample of every server, kept in one array for whole-fleet checks.
+
+    ``update`` writes a server's row in O(1) at ingest, ``evaluate`` compares
+    the whole fleet with its cached threshold matrix in one NumPy call.
+    """
+
+    def __init__(self, config: Optional[ThresholdConfig] = None, capacity: int = 64) -> None:
+        self.config = config or ThresholdConfig()
+        width = len(self.config.metrics)
+        self._values = np.full((capacity, width), np.nan)
+        self._thresholds = np.full((capacity, width), np.nan)
+        self._server_ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._version = self.config.version
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._server_ids)
+
+    def _row(self, server_id: str) -> int:
+        row = self._rows.get(server_id)
+        if row is not None:
+            return row
+        row = len(self._server_ids)
+        if row == len(self._values):
+            # Grow geometrically so adding servers stays amortized O(1)
+            self._values = np.vstack([self._values, np.full_like(self._values, np.nan)])
+            self._thresholds = np.vstack([self._thresholds, np.full_like(self._thresholds, np.nan)])
+        self._server_ids.append(server_id)
+        self._rows[server_id] = row
+        self._thresholds[row] = self.config.row(server_id)
+        return row
+
+    def update(self, server_id: str, metrics: Dict[str, Any]) -> None:
+        """Record the latest agent-shaped sample of a server."""
+        values = flatten_metrics(metrics, self.config.metrics)
+        with self._lock:
+            row = self._row(server_id)
+            self._values[row] = values
+
+    def remove(self, server_id: str) -> None:
+        """Forget a server, moving the last row into its place."""
+        with self._lock:
+            row = self._rows.pop(server_id, None)
+            if row is None:
+                return
+            last = len(self._server_ids) - 1
+            if row != last:
+                moved = self._server_ids[last]
+                self._server_ids[row] = moved
+                self._rows[moved] = row
+                self._values[row] = self._values[last]
+                self._thresholds[row] = self._thresholds[last]
+            self._server_ids.pop()
+            self._values[last] = np.nan
+
+    def evaluate(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Return server ids, their latest values and the anomaly mask of the whole fleet."""
+        with self._lock:
+            count = len(self._server_ids)
+            if self._version != self.config.version:
+                self._version = self.config.version
+                self._thresholds[:count] = self.config.matrix(self._server_ids)
+            values = self._values[:count].copy()
+            mask = detect(values, self._thresholds[:count])
+            return list(self._server_ids), values, mask
+
+    def anomalies(self) -> Dict[str, Dict[str, float]]:
+        """Metrics above their thresholds, per anomalous server."""
+        server_ids, values, mask = self.evaluate()
+        return {
+            server_ids[row]: {
+                self.config.metrics[col]: float(values[row, col])
+                for col in np.flatnonzero(mask[row])
+            }
+            for row in np.flatnonzero(mask.any(axis=1))
+        }
+
+def scan(chunks: Iterable[Chunk],
+         config: ThresholdConfig) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    """Detect anomalies chunk by chunk, yielding only the anomalous samples.
+
+    Each chunk is compared in one pass against thresholds gathered from the
+    distinct servers it contains. Yields server ids, timestamps, values and
+    the anomaly mask of the samples that have at least one anomaly.
+    """
+    for server_ids, timestamps, values in chunks:
+        if not len(server_ids):
+            continue
+        unique, inverse = np.unique(server_ids, return_inverse=True)
+        mask = detect(values, config.matrix(unique)[inverse])
+        hit = mask.any(axis=1)
+        if hit.any():
+            yield server_ids[hit], timestamps[hit], values[hit], mask[hit]
+
+def history_chunks(store: HistoryStore, metrics: Sequence[str] = DETECTION_METRICS,
+                   chunk_size: int = SCAN_CHUNK_SIZE) -> Iterator[Chunk]:
+    """Chunks of the samples held in the in-memory history."""
+    for server_id in store:
+        history = store.get(server_id)
+        if history is None:
+            continue
+        window = history.window()
+        rows = [0] + [history.fields.index(name) + 1 for name in metrics]
+        data = window[rows].T.copy()
+        for start in range(0, len(data), chunk_size):
+            part = data[start:start + chunk_size]
+            yield np.full(len(part), server_id, dtype=object), part[:, 0], part[:, 1:]
+
+# Metric table columns of the agent-named detection metrics
+METRIC_COLUMNS = {'cpu': 'cpu_usage', 'memory': 'memory_usage', 'disk': 'disk_usage'}
+
+def metric_chunks(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  metrics: Sequence[str] = DETECTION_METRICS,
+                  chunk_size: int = SCAN_CHUNK_SIZE) -> Iterator[Chunk]:
+    """Chunks of the stored metrics in ``[start, end)``, read ``chunk_size`` rows at a time."""
+    query = db.query(Metric.server_id, Metric.created_at, Metric.cpu_usage, Metric.memory_usage,
+                     Metric.disk_usage, Metric.network_stats)
+    if start is not None:
+        query = query.filter(Metric.created_at >= start)
+    if end is not None:
+        query = query.filter(Metric.created_at < end)
+    rows = query.order_by(Metric.created_at, Metric.id).yield_per(chunk_size)
+
+    def build(batch: List[Any]) -> Chunk:
+        server_ids = np.array([row.server_id for row in batch], dtype=object)
+        timestamps = np.array([row.created_at.replace(tzinfo=timezone.utc).timestamp() for row in batch])
+        values = np.array([
+            [
+                getattr(row, METRIC_COLUMNS[name]) if name in METRIC_COLUMNS
+                else (row.network_stats or {}).get(name)
+                for name in metrics
+            ]
+            for row in batch
+        ], dtype=float)
+        return server_ids, timestamps, values
+
+    batch: List[Any] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == chunk_size:
+            yield build(batch)
+            batch = []
+    if batch:
+        yield build(batch)
+
+def backfill(db: Session, config: ThresholdConfig, start: Optional[datetime] = None,
+             end: Optional[datetime] = None, chunk_size: int = SCAN_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Re-run detection over stored metrics, for example after thresholds changed."""
+    chunks = metric_chunks(db, start, end, config.metrics, chunk_size)
+    for server_ids, timestamps, values, mask in scan(chunks, config):
+        for i in range(len(server_ids)):
+            yield {
+                'server_id': server_ids[i],
+                'timestamp': float(timestamps[i]),
+                'anomalies': {
+                    config.metrics[col]: float(values[i, col]) for col in np.flatnonzero(mask[i])
+                }
+            }
+
+def run_backfill(start: Optional[datetime] = None, end: Optional[datetime] = None, out: Any = sys.stdout) -> int:
+    """Backfill the stored metrics against the current thresholds file, one JSON line per anomalous sample."""
+    from database import get_db
+    config = load_thresholds()
+    count = 0
+    with get_db() as db:
+        for item in backfill(db, config, start, end):
+            out.write(json.dumps(item) + '\n')
+            count += 1
+    return count
+
+if __name__ == '__main__':
+    # python -m analytics.fleet_detection [from] [to], ISO times in UTC
+    bounds = [datetime.fromisoformat(arg) for arg in sys.argv[1:3]]
+    run_backfill(*bounds)
@@ -0,0 +1,282 @@
+"""Streaming anomaly detectors with O(1) state per server and metric.
+
+Each detector learns a baseline of every metric of every server from the
+samples it sees and scores new samples against it, without looking back at
+history. State is a few floats per metric, kept as one small array per
+server, and can be snapshotted to disk so restarts keep the baselines.
+"""
+import os
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Sequence, Tuple
+import numpy as np
+from metrics.history import flatten_metrics
+from .fleet_detection import DETECTION_METRICS
+
+logger = logging.getLogger(__name__)
+
+# Detector used at ingest: ewma, zscore or mad
+ONLINE_DETECTOR = os.getenv('ONLINE_DETECTOR', 'ewma')
+# Scores above this many deviations from the baseline are reported
+ONLINE_DETECTOR_THRESHOLD = float(os.getenv('ONLINE_DETECTOR_THRESHOLD', 3.0))
+# Samples a metric needs before it is scored
+ONLINE_DETECTOR_WARMUP = int(os.getenv('ONLINE_DETECTOR_WARMUP', 30))
+# Where baselines are snapshotted, and how often (seconds)
+ONLINE_DETECTOR_STATE_PATH = os.getenv('ONLINE_DETECTOR_STATE_PATH', 'online_detector_state.json')
+ONLINE_DETECTOR_SNAPSHOT_INTERVAL = int(os.getenv('ONLINE_DETECTOR_SNAPSHOT_INTERVAL', 300))
+
+# Scale factor making the MAD a consistent estimator of the standard deviation
+MAD_SCALE = 1.4826
+
+# Least spread scores divide by, relative to the baseline level
+SPREAD_FLOOR = 1e-3
+
+def floor_spread(spread: np.ndarray, center: np.ndarray) -> np.ndarray:
+    """Spread of a baseline, floored so flat metrics do not score infinite on any change."""
+    return np.maximum(spread, SPREAD_FLOOR * np.maximum(np.abs(center), 1.0))
+
+class OnlineDetector(ABC):
+    """Base class for per-server, per-metric streaming detectors.
+
+    Subclasses name their state rows in ``STATE_FIELDS`` and implement
+    ``_score`` and ``_step`` on ``(fields, metrics)`` arrays.
+    """
+
+    KIND = ''
+    STATE_FIELDS: Tuple[str, ...] = ('count',)
+
+    def __init__(self, threshold: float = ONLINE_DETECTOR_THRESHOLD,
+                 warmup: int = ONLINE_DETECTOR_WARMUP,
+                 metrics: Sequence[str] = DETECTION_METRICS) -> None:
+        self.threshold = threshold
+        self.warmup = warmup
+        self.metrics = tuple(metrics)
+        self._states: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        # Saves share one temporary file, so they run one at a time
+        self._save_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __contains__(self, server_id: str) -> bool:
+        return server_id in self._states
+
+    def params(self) -> Dict[str, Any]:
+        """Parameters stored with snapshots."""
+        return {'threshold': self.threshold, 'warmup': self.warmup}
+
+    def _new_state(self) -> np.ndarray:
+        return np.zeros((len(self.STATE_FIELDS), len(self.metrics)))
+
+    def update(self, server_id: str, values: Sequence[float]) -> np.ndarray:
+        """Score one sample against the baseline, then fold it in.
+
+        Returns one score per metric, in deviations from the baseline. Metrics
+        that are missing or still warming up score NaN.
+        """
+        values = np.asarray(values, dtype=float)
+        valid = ~np.isnan(values)
+        with self._lock:
+            state = self._states.get(server_id)
+            if state is None:
+                state = self._states[server_id] = self._new_state()
+            count = state[0]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                scores = self._score(state, values)
+            scores = np.where(valid & (count >= self.warmup) & np.isfinite(scores), scores, np.nan)
+            updated = self._step(state, values)
+            updated[0] = count + 1
+            state[:, valid] = updated[:, valid]
+        return scores
+
+    def observe(self, server_id: str, metrics: Dict[str, Any]) -> Dict[str, float]:
+        """Feed an agent-shaped sample and return the metrics that deviate, with their scores."""
+        scores = self.update(server_id, flatten_metrics(metrics, self.metrics))
+        return {
+            self.metrics[i]: round(float(scores[i]), 2)
+            for i in np.flatnonzero(np.abs(scores) > self.threshold)
+        }
+
+    def forget(self, server_id: str) -> None:
+        """Drop the baseline of a server."""
+        with self._lock:
+            self._states.pop(server_id, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-serializable copy of every baseline."""
+        with self._lock:
+            servers = {server_id: state.tolist() for server_id, state in self._states.items()}
+        return {
+            'kind': self.KIND,
+            'params': self.params(),
+            'metrics': list(self.metrics),
+            'fields': list(self.STATE_FIELDS),
+            'servers': servers
+        }
+
+    def restore(self, snapshot: Dict[str, Any]) -> None:
+        """Load baselines from ``snapshot``, which must come from the same kind of detector."""
+        if snapshot.get('kind') != self.KIND or snapshot.get('fields') != list(self.STATE_FIELDS):
+            raise ValueError(f"Snapshot of {snapshot.get('kind')} cannot restore a {self.KIND} detector")
+        columns = [snapshot['metrics'].index(name) if name in snapshot['metrics'] else None
+                   for name in self.metrics]
+        states = {}
+        for server_id, stored in snapshot['servers'].items():
+            stored = np.asarray(stored, dtype=float)
+            state = self._new_state()
+            for i, column in enumerate(columns):
+                if column is not None:
+                    state[:, i] = stored[:, column]
+            states[server_id] = state
+        with self._lock:
+            self._states = states
+
+    def save(self, path: str) -> None:
+        """Write a snapshot atomically, replacing any previous one."""
+        tmp_path = f'{path}.tmp'
+        with self._save_lock:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, path)
+
+    def start(self, path: str, interval: float = ONLINE_DETECTOR_SNAPSHOT_INTERVAL) -> None:
+        """Snapshot to ``path`` every ``interval`` seconds in a background thread."""
+        if self._thread is not None:
+            return
+
+        def run() -> None:
+            while not self._stop.wait(interval):
+                try:
+                    self.save(path)
+                except OSError as e:
+                    logger.warning(f"Failed to snapshot baselines: {str(e)}")
+
+        self._thread = threading.Thread(target=run, name='online-detector-snapshots', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background snapshots."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def load(self, path: str) -> bool:
+        """Restore from a snapshot file if there is one."""
+        if not os.path.exists(path):
+            return False
+        with open(path) as f:
+            self.restore(json.load(f))
+        return True
+
+    @abstractmethod
+    def _score(self, state: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """Scores of ``values`` against the baseline in ``state``."""
+
+    @abstractmethod
+    def _step(self, state: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """State after learning ``values``."""
+
+class EWMADetector(OnlineDetector):
+    """Exponentially weighted mean and variance; recent samples weigh most."""
+
+    KIND = 'ewma'
+    STATE_FIELDS = ('count', 'mean', 'var')
+
+    def __init__(self, alpha: float = 0.05, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.alpha = alpha
+
+    def params(self) -> Dict[str, Any]:
+        return {**super().params(), 'alpha': self.alpha}
+
+    def _score(self, state: np.ndarray, values: np.ndarray) -> np.ndarray:
+        _, mean, var = state
+        return (values - mean) / floor_spread(np.sqrt(var), mean)
+
+    def _step(self, state: np.ndarray, values: np.ndarray) -> np.ndarray:
+        count, mean, var = state
+        delta = values - mean
+        first = count == 0
+        new_mean = np.where(first, values, mean + self.alpha * delta)
+        new_var = np.where(first, 0.0, (1 - self.alpha) * (var + self.alpha * delta ** 2))
+        return np.array([count, new_mean, new_var])
+
+class ZScoreDetector(OnlineDetector):
+    """Mean and variance by Welford's algorithm over roughly the last ``window`` samples.
+
+    The count stops growing at ``window``, after which every new sample
+    replaces an average one's share of the running sums.
+    """
+
+    KIND = 'zscore'
+    STATE_FIELDS = ('count', 'mean', 'm2')
+
+    def __init__(self, window: int = 720, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.window = window
+
+    def params(self) -> Dict[str, Any]:
+        return {**super().params(), 'window': self.window}
+
+    def _score(self, state: np.ndarray, values: np.ndarray) -> np.ndarray:
+        count, mean, m2 = state
+        n = np.minimum(count, self.window)
+        return (values - mean) / floor_spread(np.sqrt(m2 / (n - 1)), mean)
+
+    def _step(self, state: np.ndarray, values: np.ndarray) -> np.ndarray:
+        count, mean, m2 = state
+        n = np.minimum(count + 1, self.window)
+        # At the cap, first forget an average sample's share of the squared deviations
+        m2 = np.where(count + 1 > self.window, m2 * (n - 1) / n, m2)
+        delta = values - mean
+        new_mean = mean + delta / n
+        new_m2 = m2 + delta * (values - new_mean)
+        return np.array([count, new_mean, new_m2])
+
+class MADDetector(OnlineDetector):
+    """Streaming median and median absolute deviation, robust to outliers.
+
+    Both are tracked by stochastic approximation: each sample moves the
+    estimate a step of ``rate`` times the current spread towards itself,
+    so single spikes barely shift the baseline.
+    """
+
+    KIND = 'mad'
+    STATE_FIELDS = ('count', 'median', 'mad')
+
+    def __init__(self, rate: float = 0.05, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.rate = rate
+
+    def params(self) -> Dict[str, Any]:
+        return {**super().params(), 'rate': self.rate}
+
+    def _score(self, state: np.ndarray, values: np.ndarray) -> np.ndarray:
+        _, median, mad = state
+        return (values - median) / floor_spread(MAD_SCALE * mad, median)
+
+    def _step(self, state: np.ndarray, values: np.ndarray) -> np.ndarray:
+        count, median, mad = state
+        first = count == 0
+        # Step size follows the spread, with a floor so a flat series can still move
+        step = self.rate * floor_spread(mad, median)
+        new_median = np.where(first, values, median + step * np.sign(values - median))
+        deviation = np.abs(values - new_median)
+        new_mad = np.where(first, 0.0, np.maximum(mad + step * np.sign(deviation - mad), 0.0))
+        return np.array([count, new_median, new_mad])
+
+DETECTORS = {
+    EWMADetector.KIND: EWMADetector,
+    ZScoreDetector.KIND: ZScoreDetector,
+    MADDetector.KIND: MADDetector
+}
+
+def build_detector(kind: str = ONLINE_DETECTOR, **kwargs) -> OnlineDetector:
+    """Create a detector by kind."""
+    try:
+        return DETECTORS[kind](**kwargs)
+    except KeyError:
+        raise ValueError(f"Unknown online detector {kind}") from None
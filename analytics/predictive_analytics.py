@@ -1,10 +1,193 @@
-from sklearn.linear_model import LinearRegression
+"""Linear trend forecasts by incremental least squares.
+
+A least-squares line only needs the sums n, Σx, Σy, Σx² and Σxy, so each
+series keeps those five numbers per metric, updated in O(1) per sample, and
+forecasts are solved in closed form. x is time in seconds relative to the
+series' latest sample, which keeps the sums small for long-running series.
+"""
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 import numpy as np
+from metrics.history import flatten_metrics
+from .fleet_detection import DETECTION_METRICS
+
+# Samples a trend is fitted on, 0 fits everything seen
+FORECAST_WINDOW = int(os.getenv('FORECAST_WINDOW', 720))
+
+# Rows of the running sums
+N, SX, SY, SXX, SXY = range(5)
+
+def solve_trend(sums: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Slope and intercept of least-squares lines from their running sums.
+
+    ``sums`` has the five sums on its second to last axis, so any batch of
+    series is solved at once. Series with fewer than two samples, or whose
+    samples share one timestamp, get NaN.
+    """
+    n, sx, sy, sxx, sxy = np.moveaxis(sums, -2, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        denominator = n * sxx - sx * sx
+        slope = np.where(denominator > 0, (n * sxy - sx * sy) / denominator, np.nan)
+        intercept = (sy - slope * sx) / n
+    return slope, intercept
+
+def predict_future_metrics(metrics: Sequence[float]) -> float:
+    """Extrapolate evenly spaced values two steps past the last one."""
+    y = np.asarray(metrics, dtype=float)
+    x = np.arange(len(y), dtype=float)
+    if len(y) == 1:
+        return float(y[0])
+    sums = np.array([[len(y)], [x.sum()], [y.sum()], [x @ x], [x @ y]])
+    slope, intercept = solve_trend(sums)
+    return float(intercept[0] + slope[0] * (len(y) + 1))
+
+class TrendForecaster:
+    """Running least-squares trend of every metric of every server.
+
+    All servers share one ``(servers, sums, metrics)`` array, so
+    ``forecast_all`` extrapolates the whole fleet in one NumPy expression.
+    With a window, the last ``window`` samples of each server are kept so
+    the oldest one can be subtracted from the sums when a new one arrives.
+    """
+
+    def __init__(self, window: int = FORECAST_WINDOW, metrics: Sequence[str] = DETECTION_METRICS,
+                 capacity: int = 64) -> None:
+        self.window = window
+        self.metrics = tuple(metrics)
+        width = len(self.metrics)
+        self._sums = np.zeros((capacity, 5, width))
+        # Timestamp of each server's latest sample, where its x is 0
+        self._origins = np.full(capacity, np.nan)
+        if window:
+            self._times = np.full((capacity, window), np.nan)
+            self._values = np.full((capacity, window, width), np.nan)
+            self._counts = np.zeros(capacity, dtype=int)
+        self._server_ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._server_ids)
+
+    def __contains__(self, server_id: str) -> bool:
+        return server_id in self._rows
+
+    def _grow(self, array: np.ndarray, fill: Any) -> np.ndarray:
+        return np.concatenate([array, np.full_like(array, fill)])
+
+    def _row(self, server_id: str) -> int:
+        row = self._rows.get(server_id)
+        if row is not None:
+            return row
+        row = len(self._server_ids)
+        if row == len(self._sums):
+            # Grow geometrically so adding servers stays amortized O(1)
+            self._sums = self._grow(self._sums, 0.0)
+            self._origins = self._grow(self._origins, np.nan)
+            if self.window:
+                self._times = self._grow(self._times, np.nan)
+                self._values = self._grow(self._values, np.nan)
+                self._counts = self._grow(self._counts, 0)
+        self._server_ids.append(server_id)
+        self._rows[server_id] = row
+        return row
+
+    def update(self, server_id: str, timestamp: float, values: Sequence[float]) -> None:
+        """Fold one sample into the sums of a server; NaN values are skipped."""
+        values = np.asarray(values, dtype=float)
+        valid = ~np.isnan(values)
+        y = np.where(valid, values, 0.0)
+        with self._lock:
+            row = self._row(server_id)
+            sums = self._sums[row]
+            origin = self._origins[row]
+            if not np.isnan(origin):
+                # Move x = 0 to the new sample: x' = x - shift
+                shift = timestamp - origin
+                sums[SXX] += shift * (shift * sums[N] - 2 * sums[SX])
+                sums[SXY] -= shift * sums[SY]
+                sums[SX] -= shift * sums[N]
+            self._origins[row] = timestamp
+
+            if self.window:
+                slot = self._counts[row] % self.window
+                if self._counts[row] >= self.window:
+                    self._evict(sums, self._times[row, slot] - timestamp, self._values[row, slot])
+                self._times[row, slot] = timestamp
+                self._values[row, slot] = values
+                self._counts[row] += 1
+
+            # The new sample sits at x = 0, adding nothing to Σx, Σx² and Σxy
+            sums[N] += valid
+            sums[SY] += y
+
+    def _evict(self, sums: np.ndarray, x: float, values: np.ndarray) -> None:
+        """Subtract a sample at ``x`` from the sums."""
+        valid = ~np.isnan(values)
+        y = np.where(valid, values, 0.0)
+        sums[N] -= valid
+        sums[SX] -= x * valid
+        sums[SY] -= y
+        sums[SXX] -= x * x * valid
+        sums[SXY] -= x * y
+
+    def observe(self, server_id: str, timestamp: float, metrics: Dict[str, Any]) -> None:
+        """Fold an agent-shaped sample into the sums of a server."""
+        self.update(server_id, timestamp, flatten_metrics(metrics, self.metrics))
+
+    def forget(self, server_id: str) -> None:
+        """Drop the trend of a server, moving the last row into its place."""
+        with self._lock:
+            row = self._rows.pop(server_id, None)
+            if row is None:
+                return
+            last = len(self._server_ids) - 1
+            arrays = [self._sums, self._origins]
+            if self.window:
+                arrays += [self._times, self._values, self._counts]
+            if row != last:
+                moved = self._server_ids[last]
+                self._server_ids[row] = moved
+                self._rows[moved] = row
+                for array in arrays:
+                    array[row] = array[last]
+            self._server_ids.pop()
+            self._sums[last] = 0.0
+            self._origins[last] = np.nan
+            if self.window:
+                self._times[last] = np.nan
+                self._values[last] = np.nan
+                self._counts[last] = 0
+
+    def trends(self) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+        """Server ids, slopes per second, current fitted values and latest timestamps of the whole fleet."""
+        with self._lock:
+            count = len(self._server_ids)
+            slope, intercept = solve_trend(self._sums[:count])
+            return list(self._server_ids), slope, intercept, self._origins[:count].copy()
+
+    def forecast_all(self, horizon: float) -> Tuple[List[str], np.ndarray]:
+        """Values of every metric of every server ``horizon`` seconds after its latest sample."""
+        server_ids, slope, intercept, _ = self.trends()
+        return server_ids, intercept + slope * horizon
+
+    def trend(self, server_id: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Slopes per second and current fitted values of one server, solved in O(1)."""
+        with self._lock:
+            row = self._rows.get(server_id)
+            if row is None:
+                return None
+            return solve_trend(self._sums[row])
+
+    def forecast(self, server_id: str, horizon: float) -> Optional[Dict[str, Optional[float]]]:
+        """Values of a server's metrics ``horizon`` seconds after its latest sample."""
+        trend = self.trend(server_id)
+        if trend is None:
+            return None
+        slope, intercept = trend
+        return forecast_dict(self.metrics, intercept + slope * horizon)
 
-def predict_future_metrics(metrics):
-    model = LinearRegression()
-    X = np.array(range(len(metrics))).reshape(-1, 1)
-    y = np.array(metrics).reshape(-1, 1)
-    model.fit(X, y)
-    prediction = model.predict([[len(metrics) + 1]])
-    return prediction[0][0] 
\ No newline at end of file
+def forecast_dict(metrics: Sequence[str], values: np.ndarray) -> Dict[str, Optional[float]]:
+    """Name forecast values, with None where there is no trend yet."""
+    return {name: None if np.isnan(value) else float(value) for name, value in zip(metrics, values)}
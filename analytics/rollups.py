@@ -0,0 +1,239 @@
+"""Incremental multi-resolution rollups and resolution selection for queries."""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from models.metric import Metric
+from models.rollup import MetricRollup
+
+# Rollup bucket widths in seconds
+RESOLUTIONS: Tuple[int, ...] = (60, 300, 3600)
+
+# Resolution value used for raw metric rows
+RAW_RESOLUTION = 0
+
+# Expected spacing of raw samples, used to estimate raw point counts
+RAW_INTERVAL = float(os.getenv('METRICS_COLLECTION_INTERVAL', 5))
+
+# Days each rollup resolution is kept
+ROLLUP_RETENTION_DAYS = {60: 7, 300: 30, 3600: 365}
+
+# Metric columns and network_stats keys that are rolled up
+COLUMN_METRICS = ('cpu_usage', 'memory_usage', 'disk_usage')
+NETWORK_METRICS = ('bytes_sent_rate', 'bytes_recv_rate')
+ROLLUP_METRICS = COLUMN_METRICS + NETWORK_METRICS
+
+EPOCH = datetime(1970, 1, 1)
+
+def bucket_start(timestamp: datetime, resolution: int) -> datetime:
+    """Start of the bucket of width ``resolution`` seconds containing ``timestamp``.
+
+    Naive timestamps are taken as UTC, like the ``created_at`` columns.
+    """
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    seconds = int((timestamp - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=seconds - seconds % resolution)
+
+def row_values(row: Dict[str, Any]) -> Iterable[Tuple[str, float]]:
+    """Rollup metric values of a metric row, skipping missing ones."""
+    for name in COLUMN_METRICS:
+        value = row.get(name)
+        if value is not None:
+            yield name, float(value)
+    network = row.get('network_stats') or {}
+    for name in NETWORK_METRICS:
+        value = network.get(name)
+        if value is not None:
+            yield name, float(value)
+
+def aggregate_rows(rows: Sequence[Dict[str, Any]],
+                   resolutions: Sequence[int] = RESOLUTIONS) -> List[Dict[str, Any]]:
+    """Fold metric rows into one partial aggregate per server, resolution, metric and bucket.
+
+    Rows are bucketed on ``sampled_at``, when the agent took the sample, so
+    late and spooled batches land in the buckets they belong to. Rows
+    without it fall back to ``created_at``.
+    """
+    buckets: Dict[Tuple[str, int, str, datetime], Dict[str, Any]] = {}
+    for row in rows:
+        sampled_at = row.get('sampled_at') or row['created_at']
+        for name, value in row_values(row):
+            for resolution in resolutions:
+                key = (row['server_id'], resolution, name, bucket_start(sampled_at, resolution))
+                bucket = buckets.get(key)
+                if bucket is None:
+                    buckets[key] = {
+                        'server_id': key[0],
+                        'resolution': resolution,
+                        'metric': name,
+                        'bucket_start': key[3],
+                        'count': 1,
+                        'sum': value,
+                        'min': value,
+                        'max': value
+                    }
+                    continue
+                bucket['count'] += 1
+                bucket['sum'] += value
+                bucket['min'] = min(bucket['min'], value)
+                bucket['max'] = max(bucket['max'], value)
+    # A stable order keeps concurrent upserts from deadlocking on row locks
+    return [buckets[key] for key in sorted(buckets)]
+
+def update_rollups(db: Session, rows: Sequence[Dict[str, Any]]) -> int:
+    """Merge new metric rows into the stored rollups with one upsert.
+
+    Every row needs ``server_id`` and ``created_at``, and preferably
+    ``sampled_at``. Returns the number of buckets touched.
+    """
+    aggregates = aggregate_rows(rows)
+    if not aggregates:
+        return 0
+    dialect = db.get_bind().dialect.name
+    if dialect == 'postgresql':
+        stmt = postgresql.insert(MetricRollup)
+        least, greatest = func.least, func.greatest
+    elif dialect == 'sqlite':
+        stmt = sqlite.insert(MetricRollup)
+        least, greatest = func.min, func.max
+    else:
+        return merge_rollups(db, aggregates)
+
+    table = MetricRollup.__table__
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[c.name for c in table.primary_key.columns],
+        set_={
+            'count': table.c.count + stmt.excluded.count,
+            'sum': table.c.sum + stmt.excluded.sum,
+            'min': least(table.c.min, stmt.excluded.min),
+            'max': greatest(table.c.max, stmt.excluded.max),
+            'updated_at': datetime.utcnow()
+        }
+    )
+    db.execute(stmt, aggregates)
+    return len(aggregates)
+
+def merge_rollups(db: Session, aggregates: Sequence[Dict[str, Any]]) -> int:
+    """Merge partial aggregates by reading and updating each bucket, for dialects without an upsert.
+
+    Buckets are locked as they are read. Two first writers of the same new
+    bucket can still conflict, in which case one transaction fails and the
+    client retries its batch.
+    """
+    for aggregate in aggregates:
+        key = (aggregate['server_id'], aggregate['resolution'], aggregate['metric'], aggregate['bucket_start'])
+        rollup = db.get(MetricRollup, key, with_for_update=True)
+        if rollup is None:
+            db.add(MetricRollup(**aggregate))
+            continue
+        rollup.count += aggregate['count']
+        rollup.sum += aggregate['sum']
+        rollup.min = min(rollup.min, aggregate['min'])
+        rollup.max = max(rollup.max, aggregate['max'])
+    db.flush()
+    return len(aggregates)
+
+def rollup_resolution(span: float, max_points: int) -> int:
+    """Finest rollup resolution whose point count for ``span`` seconds stays within ``max_points``."""
+    for resolution in RESOLUTIONS:
+        if span / resolution <= max_points:
+            return resolution
+    return RESOLUTIONS[-1]
+
+def choose_resolution(start: datetime, end: datetime, max_points: int) -> int:
+    """Pick the finest resolution whose point count for the range stays within ``max_points``.
+
+    Raw rows are used when they fit, and the coarsest rollup when nothing does.
+    """
+    span = max((end - start).total_seconds(), 0.0)
+    if span / RAW_INTERVAL <= max_points:
+        return RAW_RESOLUTION
+    return rollup_resolution(span, max_points)
+
+def raw_rows(db: Session, server_id: str, start: datetime, end: datetime, limit: int) -> List[Metric]:
+    """The newest ``limit`` raw rows of ``[start, end)``, newest first."""
+    return (
+        db.query(Metric)
+        .filter(Metric.server_id == server_id, Metric.created_at >= start, Metric.created_at < end)
+        .order_by(Metric.created_at.desc())
+        .limit(limit)
+        .all()
+    )
+
+def query_series(db: Session, server_id: str, start: datetime, end: datetime,
+                 max_points: int, resolution: Optional[int] = None) -> Dict[str, Any]:
+    """Return min/max/avg/count per metric over ``[start, end)`` at a fitting resolution.
+
+    When raw rows were chosen but the server samples faster than
+    ``RAW_INTERVAL``, the finest fitting rollup is served instead. Raw rows
+    asked for explicitly are cut to the newest ``max_points``.
+    """
+    rows: List[Metric] = []
+    if resolution is None:
+        resolution = choose_resolution(start, end, max_points)
+        if resolution == RAW_RESOLUTION:
+            rows = raw_rows(db, server_id, start, end, max_points + 1)
+            if len(rows) > max_points:
+                resolution = rollup_resolution(max((end - start).total_seconds(), 0.0), max_points)
+    elif resolution == RAW_RESOLUTION:
+        rows = raw_rows(db, server_id, start, end, max_points)
+    series: Dict[str, List[Dict[str, Any]]] = {name: [] for name in ROLLUP_METRICS}
+
+    if resolution == RAW_RESOLUTION:
+        for row in reversed(rows[:max_points]):
+            values = {
+                'server_id': row.server_id,
+                'cpu_usage': row.cpu_usage,
+                'memory_usage': row.memory_usage,
+                'disk_usage': row.disk_usage,
+                'network_stats': row.network_stats
+            }
+            for name, value in row_values(values):
+                series[name].append({
+                    'timestamp': row.created_at.isoformat(),
+                    'min': value, 'max': value, 'avg': value, 'count': 1
+                })
+    else:
+        rollups = (
+            db.query(MetricRollup)
+            .filter(
+                MetricRollup.server_id == server_id,
+                MetricRollup.resolution == resolution,
+                MetricRollup.bucket_start >= bucket_start(start, resolution),
+                MetricRollup.bucket_start < end
+            )
+            .order_by(MetricRollup.metric, MetricRollup.bucket_start)
+        )
+        for rollup in rollups:
+            series.setdefault(rollup.metric, []).append({
+                'timestamp': rollup.bucket_start.isoformat(),
+                'min': rollup.min,
+                'max': rollup.max,
+                'avg': rollup.avg,
+                'count': rollup.count
+            })
+
+    return {
+        'server_id': server_id,
+        'resolution': resolution,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'series': series
+    }
+
+def prune_rollups(conn: Connection, now: Optional[datetime] = None) -> int:
+    """Delete rollup buckets older than the retention of their resolution."""
+    now = now or datetime.utcnow()
+    table = MetricRollup.__table__
+    deleted = 0
+    for resolution, days in ROLLUP_RETENTION_DAYS.items():
+        result = conn.execute(table.delete().where(
+            table.c.resolution == resolution,
+            table.c.bucket_start < now - timedelta(days=days)
+        ))
+        deleted += result.rowcount or 0
+    return deleted
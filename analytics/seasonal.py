@@ -0,0 +1,238 @@
+"""Seasonal forecasts by additive Holt-Winters, fitted off the request path.
+
+Models are fitted on the hourly rollups of every server and metric and
+cached in Redis, where the API reads them and extrapolates in closed form.
+Fitting is CPU-bound, so ``refit_changed`` runs it on a process pool and only
+for series whose complete buckets changed since their last fit.
+
+Run ``python -m analytics.seasonal`` periodically (for example from cron),
+or with ``SEASONAL_REFIT_INTERVAL`` set to keep refitting in a loop.
+"""
+import os
+import json
+import time
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from itertools import product
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from redis import Redis
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from cache.redis_config import redis_client
+from models.rollup import MetricRollup
+from .rollups import EPOCH, bucket_start
+
+logger = logging.getLogger(__name__)
+
+# Rollup resolution the models are fitted on (seconds) and steps per season
+SEASONAL_RESOLUTION = int(os.getenv('SEASONAL_RESOLUTION', 3600))
+SEASONAL_PERIOD = int(os.getenv('SEASONAL_PERIOD', 24))  # 168 for weekly cycles
+
+# Days of history each fit uses
+SEASONAL_HISTORY_DAYS = int(os.getenv('SEASONAL_HISTORY_DAYS', 28))
+
+# Worker processes fitting models, and seconds between refits (0 runs once)
+SEASONAL_WORKERS = int(os.getenv('SEASONAL_WORKERS', os.cpu_count() or 1))
+SEASONAL_REFIT_INTERVAL = int(os.getenv('SEASONAL_REFIT_INTERVAL', 0))
+
+# Hash of models per server, field per metric
+MODELS_KEY_PREFIX = 'forecast:models:'
+# Hash of the data signature each model was fitted on, field per series
+SIGNATURES_KEY = 'forecast:signatures'
+
+# Smoothing parameters tried by every fit
+ALPHAS = (0.1, 0.3, 0.5, 0.7, 0.9)
+BETAS = (0.0, 0.01, 0.05, 0.1)
+GAMMAS = (0.05, 0.1, 0.3, 0.5)
+PARAMETER_GRID = np.array(list(product(ALPHAS, BETAS, GAMMAS)))
+
+# A series to fit: server id, metric, bucket epochs, values and data signature
+Job = Tuple[str, str, np.ndarray, np.ndarray, str]
+
+def fit_holt_winters(values: np.ndarray, period: int = SEASONAL_PERIOD,
+                     grid: np.ndarray = PARAMETER_GRID) -> Optional[Dict[str, Any]]:
+    """Fit additive Holt-Winters, picking the smoothing parameters with the least one-step error.
+
+    Every parameter set of ``grid`` runs through the recursion at once as
+    one vector. Needs two full seasons; returns None for shorter series.
+    The returned season is rotated so its first entry belongs to the step
+    after the last value.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n < 2 * period:
+        return None
+    alpha, beta, gamma = grid.T
+    size = len(grid)
+
+    first, second = values[:period], values[period:2 * period]
+    level = np.full(size, first.mean())
+    trend = np.full(size, (second.mean() - first.mean()) / period)
+    season = np.tile(first - first.mean(), (size, 1))
+    sse = np.zeros(size)
+    for t in range(n):
+        phase = t % period
+        seasonal = season[:, phase]
+        if t >= period:
+            # The first season only initializes the components
+            sse += (values[t] - (level + trend + seasonal)) ** 2
+        previous = level
+        level = alpha * (values[t] - seasonal) + (1 - alpha) * (level + trend)
+        trend = beta * (level - previous) + (1 - beta) * trend
+        season[:, phase] = gamma * (values[t] - level) + (1 - gamma) * seasonal
+
+    best = int(np.argmin(sse))
+    return {
+        'alpha': float(alpha[best]),
+        'beta': float(beta[best]),
+        'gamma': float(gamma[best]),
+        'level': float(level[best]),
+        'trend': float(trend[best]),
+        'season': np.roll(season[best], -(n % period)).tolist(),
+        'rmse': float(np.sqrt(sse[best] / (n - period)))
+    }
+
+def forecast_model(model: Dict[str, Any], steps: int) -> List[Dict[str, float]]:
+    """Extrapolate a fitted model ``steps`` buckets past its last one."""
+    season = np.asarray(model['season'])
+    horizon = np.arange(1, steps + 1)
+    values = model['level'] + horizon * model['trend'] + season[(horizon - 1) % len(season)]
+    timestamps = model['last_bucket'] + horizon * model['resolution']
+    return [{'timestamp': float(t), 'value': float(v)} for t, v in zip(timestamps, values)]
+
+def regular_series(timestamps: np.ndarray, values: np.ndarray,
+                   resolution: int = SEASONAL_RESOLUTION) -> Tuple[np.ndarray, np.ndarray]:
+    """Place bucket values on an evenly spaced grid, interpolating missing buckets."""
+    grid = np.arange(timestamps[0], timestamps[-1] + resolution, resolution)
+    return grid, np.interp(grid, timestamps, values)
+
+def fit_series(job: Job, period: int = SEASONAL_PERIOD,
+               resolution: int = SEASONAL_RESOLUTION) -> Tuple[str, str, str, Optional[Dict[str, Any]]]:
+    """Fit the model of one series; runs in a worker process."""
+    server_id, metric, timestamps, values, signature = job
+    grid, series = regular_series(timestamps, values, resolution)
+    model = fit_holt_winters(series, period)
+    if model is not None:
+        model.update({
+            'period': period,
+            'resolution': resolution,
+            'last_bucket': float(grid[-1]),
+            'fitted_at': time.time(),
+            'signature': signature
+        })
+    return server_id, metric, signature, model
+
+def series_field(server_id: str, metric: str) -> str:
+    """Field of a series in the signatures hash."""
+    return f"{server_id}|{metric}"
+
+def fit_window(now: Optional[datetime] = None,
+               resolution: int = SEASONAL_RESOLUTION) -> Tuple[datetime, datetime]:
+    """Range of complete buckets models are fitted on; the current bucket is still filling."""
+    end = bucket_start(now or datetime.utcnow(), resolution)
+    return end - timedelta(days=SEASONAL_HISTORY_DAYS), end
+
+def series_signatures(db: Session, start: datetime, end: datetime,
+                      resolution: int = SEASONAL_RESOLUTION) -> Dict[Tuple[str, str], str]:
+    """Signature of every series in ``[start, end)``, changing whenever its data does."""
+    rows = (
+        db.query(MetricRollup.server_id, MetricRollup.metric,
+                 func.min(MetricRollup.bucket_start), func.max(MetricRollup.bucket_start),
+                 func.count(), func.sum(MetricRollup.count), func.sum(MetricRollup.sum))
+        .filter(MetricRollup.resolution == resolution,
+                MetricRollup.bucket_start >= start, MetricRollup.bucket_start < end)
+        .group_by(MetricRollup.server_id, MetricRollup.metric)
+    )
+    return {
+        (server_id, metric): f"{first}|{last}|{buckets}|{samples}|{total!r}"
+        for server_id, metric, first, last, buckets, samples, total in rows
+    }
+
+def load_series(db: Session, server_ids: Sequence[str], start: datetime, end: datetime,
+                resolution: int = SEASONAL_RESOLUTION) -> Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]]:
+    """Bucket epochs and averages of every series of some servers."""
+    rows = (
+        db.query(MetricRollup.server_id, MetricRollup.metric, MetricRollup.bucket_start,
+                 MetricRollup.sum, MetricRollup.count)
+        .filter(MetricRollup.resolution == resolution, MetricRollup.server_id.in_(server_ids),
+                MetricRollup.bucket_start >= start, MetricRollup.bucket_start < end)
+        .order_by(MetricRollup.server_id, MetricRollup.metric, MetricRollup.bucket_start)
+    )
+    points: Dict[Tuple[str, str], List[Tuple[float, float]]] = {}
+    for server_id, metric, start_at, total, count in rows:
+        points.setdefault((server_id, metric), []).append(
+            ((start_at - EPOCH).total_seconds(), total / count if count else 0.0))
+    return {key: tuple(np.array(column) for column in zip(*series)) for key, series in points.items()}
+
+def changed_jobs(db: Session, client: Redis = redis_client,
+                 now: Optional[datetime] = None) -> Iterable[Job]:
+    """Series whose data changed since their model was fitted."""
+    start, end = fit_window(now)
+    signatures = series_signatures(db, start, end)
+    fitted = client.hgetall(SIGNATURES_KEY)
+    changed = {
+        key: signature for key, signature in signatures.items()
+        if fitted.get(series_field(*key)) != signature
+    }
+    server_ids = sorted({server_id for server_id, _ in changed})
+    # Load a bounded number of servers per query
+    for i in range(0, len(server_ids), 100):
+        for key, (timestamps, values) in load_series(db, server_ids[i:i + 100], start, end).items():
+            if key in changed:
+                yield key[0], key[1], timestamps, values, changed[key]
+
+def save_models(results: Iterable[Tuple[str, str, str, Optional[Dict[str, Any]]]],
+                client: Redis = redis_client) -> int:
+    """Store fitted models and the signatures they were fitted on; returns the number of models."""
+    pipe = client.pipeline(transaction=False)
+    count = 0
+    for server_id, metric, signature, model in results:
+        if model is not None:
+            pipe.hset(f"{MODELS_KEY_PREFIX}{server_id}", metric, json.dumps(model))
+            count += 1
+        # Too short series are not retried until their data changes
+        pipe.hset(SIGNATURES_KEY, series_field(server_id, metric), signature)
+    pipe.execute()
+    return count
+
+def refit_changed(db: Session, executor: Executor, client: Redis = redis_client,
+                  now: Optional[datetime] = None) -> int:
+    """Refit the models of changed series on ``executor`` and cache them."""
+    jobs = list(changed_jobs(db, client, now))
+    if not jobs:
+        return 0
+    chunksize = max(1, len(jobs) // (4 * SEASONAL_WORKERS))
+    return save_models(executor.map(fit_series, jobs, chunksize=chunksize), client)
+
+def load_models(server_id: str, client: Redis = redis_client) -> Dict[str, Dict[str, Any]]:
+    """Cached models of a server, per metric."""
+    return {
+        metric: json.loads(model)
+        for metric, model in client.hgetall(f"{MODELS_KEY_PREFIX}{server_id}").items()
+    }
+
+def forget_models(server_id: str, client: Redis = redis_client) -> None:
+    """Drop the cached models of a server and the signatures they were fitted on."""
+    client.delete(f"{MODELS_KEY_PREFIX}{server_id}")
+    fields = [field for field, _ in client.hscan_iter(SIGNATURES_KEY, match=f"{server_id}|*")]
+    if fields:
+        client.hdel(SIGNATURES_KEY, *fields)
+
+def run_refits() -> None:
+    """Refit changed series once, or every ``SEASONAL_REFIT_INTERVAL`` seconds."""
+    from database import get_db
+    with ProcessPoolExecutor(SEASONAL_WORKERS) as executor:
+        while True:
+            started = time.monotonic()
+            with get_db() as db:
+                count = refit_changed(db, executor)
+            logger.info("Refitted %d seasonal models in %.1fs", count, time.monotonic() - started)
+            if not SEASONAL_REFIT_INTERVAL:
+                return
+            time.sleep(max(0.0, SEASONAL_REFIT_INTERVAL - (time.monotonic() - started)))
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    run_refits()
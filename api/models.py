@@ -45,4 +45,55 @@ metric_submission = Model('MetricSubmission', {
     'timestamp': fields.DateTime(required=True, description='Timestamp of the metrics'),
     'server_info': fields.Nested(server, required=True),
     'metrics': fields.Nested(metric, required=True)
-}) 
\ No newline at end of file
+}) 
+# Batch metric submission
+metric_batch = Model('MetricBatch', {
+    'submissions': fields.List(
+        fields.Nested(metric_submission),
+        required=True,
+        description='Metric submissions from one or more servers'
+    )
+})
+
+# Per-item result of a batch submission
+batch_item_status = Model('BatchItemStatus', {
+    'index': fields.Integer(description='Position of the submission in the batch'),
+    'server_id': fields.String(description='The server identifier'),
+    'status': fields.String(description='created or rejected'),
+    'error': fields.String(description='Reason the submission was rejected')
+})
+
+# Batch submission result
+metric_batch_result = Model('MetricBatchResult', {
+    'accepted': fields.Integer(description='Number of stored submissions'),
+    'rejected': fields.Integer(description='Number of rejected submissions'),
+    'items': fields.List(fields.Nested(batch_item_status))
+})
+
+# Metric series for one server
+metric_series = Model('MetricSeries', {
+    'server_id': fields.String(description='The server identifier'),
+    'resolution': fields.Integer(description='Bucket width in seconds, 0 for raw samples'),
+    'from': fields.String(description='Start of the range (ISO 8601, UTC)'),
+    'to': fields.String(description='End of the range (ISO 8601, UTC)'),
+    'series': fields.Raw(description='Points ({timestamp, min, max, avg, count}) per metric name')
+})
+
+# Seasonal forecast of one server, extrapolated from cached models
+metric_forecast = Model('MetricForecast', {
+    'server_id': fields.String(description='The server identifier'),
+    'steps': fields.Integer(description='Forecast buckets per metric'),
+    'forecasts': fields.Raw(description='Per metric name: resolution, fitted_at, rmse and points ({timestamp, value})')
+})
+
+# Latest state of one server, served from Redis
+server_state = Model('ServerState', {
+    'server_id': fields.String(description='The server identifier'),
+    'server_info': fields.Raw(description='Server information from the latest submission'),
+    'timestamp': fields.Float(description='Time of the latest sample (epoch seconds)'),
+    'metrics': fields.Raw(description='Latest metrics, with network rates'),
+    'anomalies': fields.Raw(description='Metrics of the latest sample above their thresholds'),
+    'anomalous': fields.Boolean(description='Whether the latest sample had any anomaly'),
+    'deviations': fields.Raw(description='Scores of metrics straying from the server baseline'),
+    'last_seen': fields.Float(description='When the latest sample was received (epoch seconds)')
+})
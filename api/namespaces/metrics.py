@@ -1,17 +1,41 @@
 """Metrics API namespace."""
-from flask_restx import Namespace, Resource
-from flask import request
-from typing import Dict, List
+import os
+import json
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+from flask_restx import Namespace, Resource, marshal
+from flask import Response, request, stream_with_context
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from redis import RedisError
+from sqlalchemy import insert, tuple_
+from sqlalchemy.orm import Query, Session
 from database import get_db
 from models.metric import Metric
 from models.server import Server
-from ..models import metric, metric_submission
+from metrics import wire_format
+from metrics.history import parse_timestamp
+from metrics.rates import RateCalculator
+from analytics.rollups import update_rollups, query_series
+from analytics.anomaly_detection import detect_anomaly
+from analytics.seasonal import load_models, forecast_model
+from ..models import (
+    metric,
+    metric_submission,
+    metric_batch,
+    batch_item_status,
+    metric_batch_result,
+    metric_series,
+    metric_forecast
+)
 from auth.decorators import login_required, admin_required, api_key_required
 from cache.redis_config import (
     cache_response,
     invalidate_cache_prefix,
     CACHE_TIMES
 )
+from cache.live_state import build_state, record_states
 
 # Create namespace
 ns = Namespace('metrics', description='Metrics management operations')
@@ -19,15 +43,156 @@ ns = Namespace('metrics', description='Metrics management operations')
 # Register models
 ns.models[metric.name] = metric
 ns.models[metric_submission.name] = metric_submission
+ns.models[metric_batch.name] = metric_batch
+ns.models[batch_item_status.name] = batch_item_status
+ns.models[metric_batch_result.name] = metric_batch_result
+ns.models[metric_series.name] = metric_series
+ns.models[metric_forecast.name] = metric_forecast
+
+# Maximum number of submissions accepted in a single batch
+MAX_BATCH_SIZE = int(os.getenv('METRICS_BATCH_MAX_SIZE', 1000))
+
+# Default and maximum number of points per series query
+DEFAULT_SERIES_POINTS = 500
+MAX_SERIES_POINTS = 5000
+
+# Default and maximum number of buckets per seasonal forecast
+DEFAULT_FORECAST_STEPS = 24
+MAX_FORECAST_STEPS = 24 * 14
+
+# Default and maximum number of metrics per page of a server's metrics
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = int(os.getenv('METRICS_PAGE_MAX_SIZE', 10000))
+
+# Rows fetched from the database per round trip while streaming a page
+STREAM_CHUNK_SIZE = 500
+
+# Server columns taken from a submission's server_info
+SERVER_FIELDS = ('server_id', 'hostname', 'ip_address', 'os_info')
+
+# Derive per-second network rates from the cumulative counters agents send.
+# Baselines are per process, so each worker's first sample of a server has no rate.
+rate_calculator = RateCalculator()
+
+def with_rates(submission: Dict) -> Dict:
+    """Return the submission with counter rates added to its network stats."""
+    server_id = submission['server_info']['server_id']
+    timestamp = parse_timestamp(submission.get('timestamp'))
+    metrics = rate_calculator.apply(server_id, timestamp, submission['metrics'])
+    return {**submission, 'metrics': metrics}
+
+def submissions_from_batch(batch: Dict) -> List[Dict]:
+    """Expand a single-server batch into one submission per sample."""
+    return [
+        {'server_info': batch['server_info'], **sample}
+        for sample in batch['samples']
+    ]
+
+def rollup_row(row: Dict, timestamp: float) -> Dict:
+    """Metric row tagged with the time its sample was taken, which rollups bucket on."""
+    return {**row, 'sampled_at': datetime.utcfromtimestamp(timestamp)}
+
+def live_state(submission: Dict) -> Dict:
+    """Live state of the server that sent a submission with rates already derived."""
+    metrics = submission['metrics']
+    return build_state(submission['server_info'], parse_timestamp(submission.get('timestamp')),
+                       metrics, detect_anomaly(metrics))
+
+def submission_server_id(submission: Any) -> Optional[str]:
+    """Server id of a submission, or None when it has none, to label rejected items."""
+    try:
+        return submission['server_info']['server_id']
+    except (KeyError, TypeError):
+        return None
+
+def prepare_submission(submission: Dict, now: datetime) -> Tuple[Dict, Dict, Dict]:
+    """Validate one submission into its server fields, metric row and live state.
+
+    Raises KeyError for missing fields and TypeError, ValueError or
+    AttributeError for malformed ones.
+    """
+    server_info = submission['server_info']
+    server_fields = {key: server_info[key] for key in SERVER_FIELDS}
+    row = Metric.row_from_dict(submission)
+    # Derive rates only once the sample is known to be valid
+    rated = with_rates(submission)
+    row['network_stats'] = rated['metrics']['network']
+    row['created_at'] = row['updated_at'] = now
+    return server_fields, row, live_state({**rated, 'server_info': server_fields})
+
+def upsert_servers(db: Session, servers: Dict[str, Dict]) -> None:
+    """Create missing servers and update the changed fields of existing ones."""
+    existing = {
+        s.server_id: s
+        for s in db.query(Server).filter(Server.server_id.in_(list(servers)))
+    }
+    for server_id, server_fields in servers.items():
+        server_obj = existing.get(server_id)
+        if server_obj is None:
+            db.add(Server(**server_fields))
+            continue
+        for key, value in server_fields.items():
+            if getattr(server_obj, key) != value:
+                setattr(server_obj, key, value)
+    db.flush()
+
+def ingest_batch(db: Session, submissions: List[Dict]) -> Tuple[Dict, Dict[str, Dict]]:
+    """Upsert servers and bulk insert metrics for a batch of submissions.
+
+    Invalid submissions are reported per item and never reject the rest of
+    the batch. Returns the batch result and the latest live state of each
+    server that received new metrics.
+    """
+    items = []
+    rows = []
+    rollup_rows = []
+    servers: Dict[str, Dict] = {}
+    states: Dict[str, Dict] = {}
+    now = datetime.utcnow()
+
+    for index, submission in enumerate(submissions):
+        server_id = submission_server_id(submission)
+        try:
+            server_fields, row, state = prepare_submission(submission, now)
+        except KeyError as e:
+            items.append({'index': index, 'server_id': server_id, 'status': 'rejected',
+                          'error': f'Missing field {e}'})
+            continue
+        except (TypeError, ValueError, AttributeError) as e:
+            items.append({'index': index, 'server_id': server_id, 'status': 'rejected',
+                          'error': f'Invalid submission: {e}'})
+            continue
+
+        rows.append(row)
+        rollup_rows.append(rollup_row(row, state['timestamp']))
+        # Later submissions for the same server carry the freshest info
+        servers[server_id] = server_fields
+        if server_id not in states or state['timestamp'] >= states[server_id]['timestamp']:
+            states[server_id] = state
+        items.append({'index': index, 'server_id': server_id, 'status': 'created', 'error': None})
+
+    if servers:
+        upsert_servers(db, servers)
+
+    if rows:
+        db.execute(insert(Metric), rows)
+        update_rollups(db, rollup_rows)
+
+    result = {
+        'accepted': len(rows),
+        'rejected': len(items) - len(rows),
+        'items': items
+    }
+    return result, states
 
 @ns.route('/')
 class MetricList(Resource):
     """Shows a list of all metrics, and lets you POST to add new ones"""
 
     @ns.doc('list_metrics')
-    @ns.marshal_list_with(metric)
     @login_required
     @cache_response('metrics:list', CACHE_TIMES['metrics'])
+    @ns.marshal_list_with(metric)
     def get(self) -> List[Dict]:
         """List all metrics"""
         with get_db() as db:
@@ -49,9 +214,15 @@ class MetricList(Resource):
                 db.add(server)
             
             # Create metric
-            new_metric = Metric.from_dict(ns.payload)
+            submission = with_rates(ns.payload)
+            row = Metric.row_from_dict(submission)
+            row['created_at'] = row['updated_at'] = datetime.utcnow()
+            new_metric = Metric(**row)
             db.add(new_metric)
+            db.flush()
+            update_rollups(db, [rollup_row(row, parse_timestamp(submission.get('timestamp')))])
             db.commit()
+            record_states([live_state(submission)])
             
             # Invalidate caches
             server_id = server_info['server_id']
@@ -61,23 +232,248 @@ class MetricList(Resource):
             
             return new_metric.to_dict(), 201
 
+@ns.route('/batch')
+class MetricBatch(Resource):
+    """Lets agents and collectors POST many metric submissions at once"""
+
+    @ns.doc('submit_metrics_batch')
+    @ns.expect(metric_batch)
+    @ns.response(207, 'Some submissions were rejected', metric_batch_result)
+    @ns.response(400, 'No submission was accepted', metric_batch_result)
+    @ns.response(413, 'Batch too large')
+    @ns.marshal_with(metric_batch_result, code=201)
+    @api_key_required
+    def post(self) -> Tuple[Dict, int]:
+        """Submit metrics from one or more servers in one transaction (requires API key)"""
+        if request.mimetype == wire_format.CONTENT_TYPE:
+            try:
+                submissions = submissions_from_batch(wire_format.decode_batch(request.get_data()))
+            except ValueError as e:
+                ns.abort(400, str(e))
+        else:
+            submissions = (ns.payload or {}).get('submissions')
+        if not isinstance(submissions, list) or not submissions:
+            ns.abort(400, 'submissions must be a non-empty list')
+        if len(submissions) > MAX_BATCH_SIZE:
+            ns.abort(413, f'Batch exceeds {MAX_BATCH_SIZE} submissions')
+
+        with get_db() as db:
+            result, states = ingest_batch(db, submissions)
+            db.commit()
+        record_states(states.values())
+
+        # Invalidate caches once for the whole batch
+        server_ids = set(states)
+        if server_ids:
+            invalidate_cache_prefix('metrics:list')
+            invalidate_cache_prefix('servers:list')
+            for server_id in server_ids:
+                invalidate_cache_prefix(f'metrics:server:{server_id}')
+                invalidate_cache_prefix(f'servers:detail:{server_id}')
+
+        if not result['accepted']:
+            return result, 400
+        if result['rejected']:
+            return result, 207
+        return result, 201
+
+def parse_time_arg(name: str, default: Optional[datetime]) -> Optional[datetime]:
+    """Read an ISO 8601 query argument as a naive UTC datetime."""
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        ns.abort(400, f"Invalid {name} timestamp: {value}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def encode_cursor(created_at: datetime, metric_id: int) -> str:
+    """Opaque cursor pointing just past a metric row."""
+    key = f'{created_at.isoformat()}|{metric_id}'.encode('utf-8')
+    return base64.urlsafe_b64encode(key).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of ``encode_cursor``, raising ValueError for malformed cursors."""
+    try:
+        key = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, metric_id = key.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(metric_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(f'Invalid cursor: {cursor}') from e
+
+def server_metrics_query(db: Session, server_id: str, start: Optional[datetime] = None,
+                         end: Optional[datetime] = None, cursor: Optional[str] = None) -> Query:
+    """Newest-first metrics of a server in ``[start, end)``, after ``cursor``.
+
+    Pages are keyed on ``(created_at, id)`` rather than OFFSET, so every page
+    is a range scan of the ``(server_id, created_at)`` index no matter how
+    deep it is.
+    """
+    query = db.query(Metric).filter(Metric.server_id == server_id)
+    if start is not None:
+        query = query.filter(Metric.created_at >= start)
+    if end is not None:
+        query = query.filter(Metric.created_at < end)
+    if cursor:
+        query = query.filter(tuple_(Metric.created_at, Metric.id) < tuple_(*decode_cursor(cursor)))
+    return query.order_by(Metric.created_at.desc(), Metric.id.desc())
+
+def page_boundary(query: Query, limit: int) -> Optional[Tuple[datetime, int]]:
+    """Key of the last row of the first ``limit`` rows of ``query``, if another page follows.
+
+    Only the keys of the last row of the page and the row after it are read,
+    so the page itself can be streamed after the headers are sent.
+    """
+    keys = query.with_entities(Metric.created_at, Metric.id).offset(limit - 1).limit(2).all()
+    if len(keys) < 2:
+        return None
+    return tuple(keys[0])
+
+def next_page_cursor(query: Query, limit: int) -> Optional[str]:
+    """Cursor of the page after the first ``limit`` rows of ``query``, if there is one."""
+    boundary = page_boundary(query, limit)
+    return encode_cursor(*boundary) if boundary else None
+
+def page_rows(query: Query, boundary: Optional[Tuple[datetime, int]]) -> Query:
+    """Rows of ``query`` down to ``boundary``, the page its cursor was computed for.
+
+    Bounding by key instead of LIMIT keeps rows committed after the cursor
+    was computed from moving the page, so the next page starts right after
+    the last row streamed.
+    """
+    if boundary is None:
+        return query
+    return query.filter(tuple_(Metric.created_at, Metric.id) >= tuple_(*boundary))
+
 @ns.route('/server/<string:server_id>')
 @ns.response(404, 'Server not found')
 @ns.param('server_id', 'The server identifier')
 class ServerMetrics(Resource):
     """Show metrics for a specific server"""
 
-    @ns.doc('get_server_metrics')
-    @ns.marshal_list_with(metric)
+    @ns.doc('get_server_metrics', params={
+        'from': 'Only metrics created at or after this time (ISO 8601)',
+        'to': 'Only metrics created before this time (ISO 8601)',
+        'limit': f'Page size (default {DEFAULT_PAGE_SIZE}, max {MAX_PAGE_SIZE})',
+        'cursor': 'Cursor from the X-Next-Cursor header of the previous page'
+    })
+    @ns.response(200, 'Success', [metric])
     @login_required
-    @cache_response('metrics:server', CACHE_TIMES['server_metrics'])
-    def get(self, server_id: str) -> List[Dict]:
-        """Fetch metrics for a given server"""
+    def get(self, server_id: str) -> Response:
+        """Fetch a page of metrics for a given server, newest first"""
+        start = parse_time_arg('from', None)
+        # Pinned at request start, so rows arriving while the page streams are left for later requests
+        end = parse_time_arg('to', datetime.utcnow())
+        try:
+            limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            ns.abort(400, 'limit must be an integer')
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+
         with get_db() as db:
-            server = db.query(Server).filter(Server.server_id == server_id).first()
-            if not server:
+            if not db.query(Server.server_id).filter(Server.server_id == server_id).first():
+                ns.abort(404, f"Server {server_id} doesn't exist")
+            try:
+                boundary = page_boundary(server_metrics_query(db, server_id, start, end, cursor), limit)
+            except ValueError as e:
+                ns.abort(400, str(e))
+        next_cursor = encode_cursor(*boundary) if boundary else None
+
+        def generate() -> Iterator[str]:
+            # Rows are fetched and serialized a chunk at a time, so memory stays
+            # flat however large the page is
+            with get_db() as db:
+                query = page_rows(server_metrics_query(db, server_id, start, end, cursor), boundary)
+                yield '['
+                for i, row in enumerate(query.yield_per(STREAM_CHUNK_SIZE)):
+                    yield (',' if i else '') + json.dumps(marshal(row.to_dict(), metric))
+                yield ']'
+
+        response = Response(stream_with_context(generate()), mimetype='application/json')
+        if next_cursor:
+            args = request.args.to_dict()
+            args['cursor'] = next_cursor
+            response.headers['X-Next-Cursor'] = next_cursor
+            response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+        return response
+
+@ns.route('/server/<string:server_id>/series')
+@ns.response(404, 'Server not found')
+@ns.param('server_id', 'The server identifier')
+class ServerMetricSeries(Resource):
+    """Chart series for a server, read from the coarsest fitting rollup"""
+
+    @ns.doc('get_server_metric_series', params={
+        'from': 'Start of the range (ISO 8601, default one hour before to)',
+        'to': 'End of the range (ISO 8601, default now)',
+        'points': f'Maximum points per metric (default {DEFAULT_SERIES_POINTS})'
+    })
+    @ns.marshal_with(metric_series)
+    @login_required
+    def get(self, server_id: str) -> Dict:
+        """Fetch min/max/avg series for a server at a resolution fitting the range"""
+        end = parse_time_arg('to', datetime.utcnow())
+        start = parse_time_arg('from', end - timedelta(hours=1))
+        if start >= end:
+            ns.abort(400, 'from must be before to')
+        try:
+            points = int(request.args.get('points', DEFAULT_SERIES_POINTS))
+        except ValueError:
+            ns.abort(400, 'points must be an integer')
+        points = max(1, min(points, MAX_SERIES_POINTS))
+
+        with get_db() as db:
+            if not db.query(Server.server_id).filter(Server.server_id == server_id).first():
                 ns.abort(404, f"Server {server_id} doesn't exist")
-            return [m.to_dict() for m in server.metrics]
+            return query_series(db, server_id, start, end, points)
+
+@ns.route('/server/<string:server_id>/forecast')
+@ns.response(404, 'No forecast for this server')
+@ns.param('server_id', 'The server identifier')
+class ServerMetricForecast(Resource):
+    """Seasonal forecasts for a server, extrapolated from models fitted in the background"""
+
+    @ns.doc('get_server_metric_forecast', params={
+        'metric': 'Only this metric (e.g. cpu_usage, default all)',
+        'steps': f'Buckets to forecast (default {DEFAULT_FORECAST_STEPS})'
+    })
+    @ns.response(503, 'Forecast models unavailable')
+    @ns.marshal_with(metric_forecast)
+    @login_required
+    def get(self, server_id: str) -> Dict:
+        """Forecast a server's metrics from its cached Holt-Winters models"""
+        try:
+            steps = int(request.args.get('steps', DEFAULT_FORECAST_STEPS))
+        except ValueError:
+            ns.abort(400, 'steps must be an integer')
+        steps = max(1, min(steps, MAX_FORECAST_STEPS))
+        try:
+            models = load_models(server_id)
+        except RedisError as e:
+            ns.abort(503, f'Forecast models unavailable: {e}')
+        name = request.args.get('metric')
+        if name is not None:
+            models = {name: models[name]} if name in models else {}
+        if not models:
+            ns.abort(404, f"No forecast for server {server_id}")
+
+        return {
+            'server_id': server_id,
+            'steps': steps,
+            'forecasts': {
+                name: {
+                    'resolution': model['resolution'],
+                    'fitted_at': model['fitted_at'],
+                    'rmse': model['rmse'],
+                    'points': forecast_model(model, steps)
+                }
+                for name, model in models.items()
+            }
+        }
 
 @ns.route('/<int:id>')
 @ns.response(404, 'Metric not found')
@@ -86,9 +482,9 @@ class MetricResource(Resource):
     """Show a single metric"""
 
     @ns.doc('get_metric')
-    @ns.marshal_with(metric)
     @login_required
     @cache_response('metrics:detail', CACHE_TIMES['metrics'])
+    @ns.marshal_with(metric)
     def get(self, id: int) -> Dict:
         """Fetch a metric given its identifier"""
         with get_db() as db:
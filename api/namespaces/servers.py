@@ -1,16 +1,23 @@
 """Servers API namespace."""
+import logging
 from flask_restx import Namespace, Resource
 from flask import request
 from typing import Dict, List
+from redis import RedisError
 from database import get_db
 from models.server import Server
-from ..models import server, server_with_metrics
+from repositories.metrics import latest_metrics
+from ..models import server, server_with_metrics, server_state
 from auth.decorators import login_required, admin_required
 from cache.redis_config import (
     cache_response,
     invalidate_cache_prefix,
     CACHE_TIMES
 )
+from cache.live_state import fleet_state, forget_server
+from analytics.seasonal import forget_models
+
+logger = logging.getLogger(__name__)
 
 # Create namespace
 ns = Namespace('servers', description='Server management operations')
@@ -18,20 +25,22 @@ ns = Namespace('servers', description='Server management operations')
 # Register models
 ns.models[server.name] = server
 ns.models[server_with_metrics.name] = server_with_metrics
+ns.models[server_state.name] = server_state
 
 @ns.route('/')
 class ServerList(Resource):
     """Shows a list of all servers, and lets you POST to add new ones"""
 
     @ns.doc('list_servers')
-    @ns.marshal_list_with(server)
     @login_required
     @cache_response('servers:list', CACHE_TIMES['server'])
+    @ns.marshal_list_with(server_with_metrics)
     def get(self) -> List[Dict]:
-        """List all servers"""
+        """List all servers with their latest metrics"""
         with get_db() as db:
             servers = db.query(Server).all()
-            return [s.to_dict() for s in servers]
+            metrics = latest_metrics(db)
+            return [s.to_dict(metrics.get(s.server_id, [])) for s in servers]
 
     @ns.doc('create_server')
     @ns.expect(server)
@@ -49,6 +58,28 @@ class ServerList(Resource):
             
             return new_server.to_dict(), 201
 
+@ns.route('/live')
+class ServerFleet(Resource):
+    """Latest state of the whole fleet, read from Redis without touching the database"""
+
+    @ns.doc('list_server_states', params={
+        'max_age': 'Only servers seen within this many seconds'
+    })
+    @ns.response(503, 'Live state unavailable')
+    @ns.marshal_list_with(server_state)
+    @login_required
+    def get(self) -> List[Dict]:
+        """List the latest sample, last seen time and anomalies of every server"""
+        try:
+            max_age = float(request.args['max_age']) if 'max_age' in request.args else None
+        except ValueError:
+            ns.abort(400, 'max_age must be a number')
+        try:
+            fleet = fleet_state(max_age)
+        except RedisError as e:
+            ns.abort(503, f'Live state unavailable: {e}')
+        return [fleet[server_id] for server_id in sorted(fleet)]
+
 @ns.route('/<string:server_id>')
 @ns.response(404, 'Server not found')
 @ns.param('server_id', 'The server identifier')
@@ -56,16 +87,17 @@ class ServerResource(Resource):
     """Show a single server and lets you delete them"""
 
     @ns.doc('get_server')
-    @ns.marshal_with(server_with_metrics)
     @login_required
     @cache_response('servers:detail', CACHE_TIMES['server'])
+    @ns.marshal_with(server_with_metrics)
     def get(self, server_id: str) -> Dict:
         """Fetch a server given its identifier"""
         with get_db() as db:
             server_obj = db.query(Server).filter(Server.server_id == server_id).first()
             if not server_obj:
                 ns.abort(404, f"Server {server_id} doesn't exist")
-            return server_obj.to_dict()
+            metrics = latest_metrics(db, [server_id])
+            return server_obj.to_dict(metrics.get(server_id, []))
 
     @ns.doc('delete_server')
     @ns.response(204, 'Server deleted')
@@ -77,6 +109,16 @@ class ServerResource(Resource):
             if not server_obj:
                 ns.abort(404, f"Server {server_id} doesn't exist")
             db.delete(server_obj)
+            db.commit()
+            # The server is gone either way; a leftover live state ages out of max_age views
+            try:
+                forget_server(server_id)
+            except RedisError as e:
+                logger.warning(f"Failed to forget live state of {server_id}: {e}")
+            try:
+                forget_models(server_id)
+            except RedisError as e:
+                logger.warning(f"Failed to forget seasonal models of {server_id}: {e}")
             
             # Invalidate caches
             invalidate_cache_prefix('servers:list')
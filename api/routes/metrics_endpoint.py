@@ -1,11 +1,11 @@
 """Prometheus metrics endpoint."""
-from flask import Blueprint, Response
-from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
-from metrics.prometheus_metrics import registry
+from flask import Blueprint
+from metrics.prometheus_metrics import exposition_cache
+from metrics.live_collector import live_state_collector  # noqa: F401, exports system_metrics at scrape time
 
 metrics_bp = Blueprint('metrics', __name__)
 
 @metrics_bp.route('/metrics')
 def metrics():
     """Expose Prometheus metrics."""
-    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST) 
\ No newline at end of file
+    return exposition_cache.response()
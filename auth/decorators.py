@@ -1,10 +1,20 @@
 """Authentication decorators."""
+import time
 from functools import wraps
 from flask import request, g
 from flask_restx import abort
 from database import get_db
+from metrics.prometheus_metrics import auth_cache_requests_total, auth_lookup_duration_seconds
 from .models import User
 from .jwt import decode_token
+from .principal_cache import Principal, principal_cache
+
+def record_lookup(credential: str, result: str, started: float) -> None:
+    """Export the outcome and latency of a principal lookup."""
+    auth_cache_requests_total.labels(credential=credential, result=result).inc()
+    auth_lookup_duration_seconds.labels(credential=credential, result=result).observe(
+        time.perf_counter() - started
+    )
 
 def login_required(f):
     """Decorator to require authentication for an endpoint."""
@@ -14,16 +24,25 @@ def login_required(f):
         if not auth_header:
             abort(401, message='Missing authorization header')
         
+        started = time.perf_counter()
         try:
             # Extract token from "Bearer <token>"
             token = auth_header.split(' ')[1]
-            payload = decode_token(token)
-            
-            with get_db() as db:
-                user = db.query(User).filter(User.username == payload['sub']).first()
-                if not user:
-                    abort(401, message='Invalid user')
-                g.current_user = user
+            principal = principal_cache.get('token', token)
+            if principal is not None:
+                record_lookup('token', 'hit', started)
+            else:
+                payload = decode_token(token)
+                generation = principal_cache.generation(payload['sub'])
+                
+                with get_db() as db:
+                    user = db.query(User).filter(User.username == payload['sub']).first()
+                    if not user:
+                        abort(401, message='Invalid user')
+                    principal = Principal.from_user(user)
+                principal_cache.set('token', token, principal, generation, payload.get('exp'))
+                record_lookup('token', 'miss', started)
+            g.current_user = principal
                 
         except (IndexError, ValueError):
             abort(401, message='Invalid token')
@@ -49,11 +68,20 @@ def api_key_required(f):
         if not api_key:
             abort(401, message='Missing API key')
         
-        with get_db() as db:
-            user = db.query(User).filter(User.api_key == api_key).first()
-            if not user:
-                abort(401, message='Invalid API key')
-            g.current_user = user
+        started = time.perf_counter()
+        principal = principal_cache.get('api_key', api_key)
+        if principal is not None:
+            record_lookup('api_key', 'hit', started)
+        else:
+            generation = principal_cache.key_generation(api_key)
+            with get_db() as db:
+                user = db.query(User).filter(User.api_key == api_key).first()
+                if not user:
+                    abort(401, message='Invalid API key')
+                principal = Principal.from_user(user)
+            principal_cache.set('api_key', api_key, principal, generation)
+            record_lookup('api_key', 'miss', started)
+        g.current_user = principal
             
         return f(*args, **kwargs)
-    return decorated 
\ No newline at end of file
+    return decorated
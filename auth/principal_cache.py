@@ -0,0 +1,100 @@
+"""Cache of verified principals for the authentication decorators."""
+import os
+import time
+import hashlib
+import threading
+from typing import Dict, Iterable, NamedTuple, Optional
+from sqlalchemy import event, inspect
+from cache.local_cache import LocalCache
+from .models import User
+
+# Number of credentials kept and how long a verified one is trusted (seconds).
+# Changes made by other processes are picked up once entries expire.
+AUTH_CACHE_MAXSIZE = int(os.getenv('AUTH_CACHE_MAXSIZE', 10000))
+AUTH_CACHE_TTL = float(os.getenv('AUTH_CACHE_TTL', 60))
+
+class Principal(NamedTuple):
+    """The authenticated user of a request, detached from any session."""
+    username: str
+    email: str
+    is_admin: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> 'Principal':
+        """Build a principal from a loaded user."""
+        return cls(user.username, user.email, bool(user.is_admin))
+
+def credential_digest(kind: str, credential: str) -> str:
+    """Cache key of a credential; the raw token or key is never kept."""
+    return f"{kind}:{hashlib.sha256(credential.encode('utf-8')).hexdigest()}"
+
+class PrincipalCache:
+    """Bounded TTL cache of principals keyed by credential digest.
+
+    Invalidating a user bumps a per-user generation, which makes all of its
+    cached credentials miss without having to find them. API keys are
+    looked up before the user is known, so they carry the generation of
+    their own digest instead, bumped along with the user owning them.
+    """
+
+    def __init__(self, maxsize: int = AUTH_CACHE_MAXSIZE, ttl: float = AUTH_CACHE_TTL) -> None:
+        self.ttl = ttl
+        self._cache = LocalCache(maxsize, ttl)
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, credential: str) -> Optional[Principal]:
+        """Return the principal of a credential verified within the TTL."""
+        entry = self._cache.get(credential_digest(kind, credential))
+        if not entry or not entry.fresh:
+            return None
+        principal, subject, generation = entry.value
+        with self._lock:
+            current = self._generations.get(subject, 0)
+        return principal if generation == current else None
+
+    def generation(self, username: str) -> int:
+        """Current generation of a user, to pass to ``set`` for a token."""
+        with self._lock:
+            return self._generations.get(username, 0)
+
+    def key_generation(self, api_key: str) -> int:
+        """Current generation of an API key, to pass to ``set`` for it."""
+        return self.generation(credential_digest('api_key', api_key))
+
+    def set(self, kind: str, credential: str, principal: Principal, generation: int,
+            expires_at: Optional[float] = None) -> None:
+        """Remember a verified credential, never past its own expiry.
+
+        Read ``generation`` before loading the user, so a change committed
+        in between is not cached as current.
+        """
+        ttl = self.ttl
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+            if ttl <= 0:
+                return
+        digest = credential_digest(kind, credential)
+        subject = digest if kind == 'api_key' else principal.username
+        self._cache.set(digest, (principal, subject, generation), ttl)
+
+    def invalidate_user(self, username: str, api_keys: Iterable[str] = ()) -> None:
+        """Forget every cached credential of a user, given the API keys it has or had."""
+        subjects = [username] + [credential_digest('api_key', key) for key in api_keys if key]
+        with self._lock:
+            for subject in subjects:
+                self._generations[subject] = self._generations.get(subject, 0) + 1
+
+    def clear(self) -> None:
+        """Forget every cached credential."""
+        self._cache.clear()
+
+principal_cache = PrincipalCache()
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_changed_user(mapper, connection, target: User) -> None:
+    """Drop cached credentials as soon as a user, its role or its API key changes."""
+    # A replaced key must stop working too, so include the previous one
+    history = inspect(target).attrs.api_key.history
+    principal_cache.invalidate_user(target.username, [target.api_key, *history.deleted])
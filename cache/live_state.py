@@ -0,0 +1,79 @@
+"""Latest state of every server, kept in Redis for fleet overviews.
+
+All servers share one hash with a field per server, so the whole fleet is
+read with a single HSCAN and never touches the database.
+"""
+import os
+import json
+import time
+import logging
+from typing import Any, Dict, Iterable, Optional
+from redis import Redis, RedisError
+from cache.redis_config import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Hash holding one JSON state per server
+LIVE_STATE_KEY = 'live:servers'
+
+# Fields requested per HSCAN round trip
+LIVE_SCAN_COUNT = int(os.getenv('LIVE_SCAN_COUNT', 1000))
+
+def build_state(server_info: Dict[str, Any], timestamp: float, metrics: Dict[str, Any],
+                anomalies: Optional[Dict[str, Any]] = None,
+                last_seen: Optional[float] = None,
+                deviations: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """Build the live state of a server from its latest sample.
+
+    ``deviations`` are the scores of metrics that stray from the server's
+    learned baseline, as reported by an online detector.
+    """
+    return {
+        'server_id': server_info['server_id'],
+        'server_info': server_info,
+        'timestamp': timestamp,
+        'metrics': metrics,
+        'anomalies': anomalies or {},
+        'anomalous': bool(anomalies),
+        'deviations': deviations or {},
+        'last_seen': time.time() if last_seen is None else last_seen
+    }
+
+def record_states(states: Iterable[Dict[str, Any]], client: Redis = redis_client) -> int:
+    """Write server states in one pipelined round trip.
+
+    Live state is best effort, a Redis failure is logged and never fails the
+    ingest that produced the states. Returns the number of states written.
+    """
+    pipe = client.pipeline(transaction=False)
+    count = 0
+    for state in states:
+        pipe.hset(LIVE_STATE_KEY, state['server_id'], json.dumps(state))
+        count += 1
+    if not count:
+        return 0
+    try:
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Failed to record live state: {e}")
+        return 0
+    return count
+
+def fleet_state(max_age: Optional[float] = None, client: Redis = redis_client) -> Dict[str, Dict[str, Any]]:
+    """Return the state of every server, optionally only those seen in the last ``max_age`` seconds."""
+    cutoff = time.time() - max_age if max_age is not None else None
+    fleet = {}
+    for server_id, value in client.hscan_iter(LIVE_STATE_KEY, count=LIVE_SCAN_COUNT):
+        state = json.loads(value)
+        if cutoff is None or state['last_seen'] >= cutoff:
+            fleet[server_id] = state
+    return fleet
+
+def server_state(server_id: str, client: Redis = redis_client) -> Optional[Dict[str, Any]]:
+    """Return the state of one server, if it has reported."""
+    value = client.hget(LIVE_STATE_KEY, server_id)
+    return json.loads(value) if value else None
+
+def forget_server(server_id: str, client: Redis = redis_client) -> None:
+    """Drop the state of a removed server."""
+    client.hdel(LIVE_STATE_KEY, server_id)
@@ -0,0 +1,117 @@
+"""In-process cache tier and single-flight helper."""
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional
+
+class CacheEntry(NamedTuple):
+    """A cached value and whether it is still within its TTL."""
+    value: Any
+    fresh: bool
+
+class LocalCache:
+    """Thread-safe LRU cache with a size bound, a TTL and a stale window.
+
+    Entries past their TTL are still returned, flagged as stale, for
+    ``stale_ttl`` more seconds so callers can serve them while refreshing.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 5.0, stale_ttl: float = 0.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        # key -> (value, fresh until, stale until)
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        """Return the entry for ``key``, or None if it is missing or past its stale window."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, fresh_until, stale_until = item
+            if now >= stale_until:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return CacheEntry(value, now < fresh_until)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store ``value``, evicting the least recently used entries beyond ``maxsize``."""
+        ttl = self.ttl if ttl is None else ttl
+        fresh_until = time.monotonic() + ttl
+        with self._lock:
+            self._entries[key] = (value, fresh_until, fresh_until + self.stale_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """Drop the entry for ``key``."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix: str) -> None:
+        """Drop ``prefix`` and every ``prefix:...`` string key."""
+        with self._lock:
+            for key in [k for k in self._entries
+                        if isinstance(k, str) and (k == prefix or k.startswith(f'{prefix}:'))]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class _Call:
+    """A computation shared by concurrent callers."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """Run at most one computation per key at a time within the process.
+
+    Callers arriving while a computation for their key is running wait for
+    it and share its result, or its exception.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Whether a computation for ``key`` is running."""
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Return ``fn()``, computed once for all concurrent callers with the same key."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
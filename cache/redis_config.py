@@ -1,11 +1,18 @@
 """Redis configuration and utilities."""
 import os
 import json
-from typing import Any, Optional
+import time
+import hashlib
+import logging
+from typing import Any, Callable, Dict, List, Optional, Sequence
 from functools import wraps
 from redis import Redis
-from flask import request
-from metrics.prometheus_metrics import cache_hits_total, cache_misses_total
+from redis.exceptions import LockError
+from flask import Response, request
+from cache.local_cache import LocalCache, SingleFlight
+from metrics.prometheus_metrics import cache_hits_total, cache_misses_total, cache_stale_hits_total
+
+logger = logging.getLogger(__name__)
 
 # Redis configuration
 REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
@@ -20,6 +27,25 @@ CACHE_TIMES = {
     'server_metrics': 120,  # 2 minutes
 }
 
+# Namespace generations live this long after their last bump. It must exceed
+# every cache TTL, entries of older generations then expire on their own.
+GENERATION_TTL = int(os.getenv('CACHE_GENERATION_TTL', 86400))
+GENERATION_PREFIX = 'gen:'
+
+# Expired entries are still served for this long while one worker refreshes them
+CACHE_STALE_TTL = int(os.getenv('CACHE_STALE_TTL', 30))
+
+# In-process tier in front of Redis. Other processes see invalidations only
+# once their local entries expire, so keep the TTL short.
+CACHE_LOCAL_MAXSIZE = int(os.getenv('CACHE_LOCAL_MAXSIZE', 1024))
+CACHE_LOCAL_TTL = float(os.getenv('CACHE_LOCAL_TTL', 5))
+
+# Lock letting a single process recompute a missing or stale entry
+CACHE_LOCK_TIMEOUT = float(os.getenv('CACHE_LOCK_TIMEOUT', 10))
+# How long other processes wait for that entry before computing it themselves
+CACHE_LOCK_WAIT = float(os.getenv('CACHE_LOCK_WAIT', 2))
+CACHE_LOCK_POLL_INTERVAL = 0.05
+
 # Initialize Redis client
 redis_client = Redis(
     host=REDIS_HOST,
@@ -29,48 +55,163 @@ redis_client = Redis(
     decode_responses=True
 )
 
+local_cache = LocalCache(CACHE_LOCAL_MAXSIZE, CACHE_LOCAL_TTL, CACHE_STALE_TTL)
+single_flight = SingleFlight()
+
 def get_cache_key(*args, **kwargs) -> str:
-    """Generate a cache key from arguments."""
-    key_parts = [str(arg) for arg in args]
-    key_parts.extend(f"{k}:{v}" for k, v in sorted(kwargs.items()))
+    """Generate a cache key from arguments.
+
+    Only plain values take part, so the resource instance passed as ``self``
+    does not, and URL parameters come out in the same form as the namespaces
+    given to ``invalidate_cache_prefix`` (e.g. ``servers:detail:<server_id>``).
+    """
+    key_parts = [str(arg) for arg in args if isinstance(arg, (str, int, float))]
+    key_parts.extend(str(v) for _, v in sorted(kwargs.items()))
     return ':'.join(key_parts)
 
+def get_generations(namespaces: Sequence[str]) -> List[str]:
+    """Current generation of each namespace, read in one round trip."""
+    values = redis_client.mget([f"{GENERATION_PREFIX}{namespace}" for namespace in namespaces])
+    return [value or '0' for value in values]
+
+def versioned_key(prefix: str, key: str) -> str:
+    """Cache key embedding the generations of ``prefix`` and of ``prefix:key``.
+
+    Bumping either generation moves readers to a new key, which is how
+    entries are invalidated without deleting them.
+    """
+    namespaces = [prefix, f"{prefix}:{key}"] if key else [prefix]
+    version = '.'.join(get_generations(namespaces))
+    return f"{prefix}:v{version}:{key}" if key else f"{prefix}:v{version}"
+
+def read_entry(cache_key: str) -> Optional[dict]:
+    """Read a ``{data, fresh_until}`` entry stored by ``cache_response``."""
+    cached_data = redis_client.get(cache_key)
+    return json.loads(cached_data) if cached_data else None
+
+def acquire_lock(cache_key: str):
+    """Take the recompute lock of a key without blocking, returning it or None."""
+    lock = redis_client.lock(f"lock:{cache_key}", timeout=CACHE_LOCK_TIMEOUT, blocking=False)
+    return lock if lock.acquire() else None
+
+def release_lock(lock) -> None:
+    """Release a recompute lock, which may already have timed out."""
+    try:
+        lock.release()
+    except LockError:
+        logger.warning("Cache lock expired before the entry was recomputed")
+
+def wait_for_entry(cache_key: str) -> Optional[dict]:
+    """Poll for a fresh entry being computed by another process."""
+    deadline = time.monotonic() + CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(CACHE_LOCK_POLL_INTERVAL)
+        entry = read_entry(cache_key)
+        if entry and entry['fresh_until'] > time.time():
+            return entry
+    return None
+
+def load_shared(prefix: str, key: str, expire: int, compute: Callable[[], Any]) -> Any:
+    """Return an entry from Redis, recomputing it under the lock when missing or stale."""
+    cache_key = versioned_key(prefix, key)
+    entry = read_entry(cache_key)
+    if entry and entry['fresh_until'] > time.time():
+        cache_hits_total.labels(cache_type=prefix, tier='redis').inc()
+        return entry['data']
+
+    lock = acquire_lock(cache_key)
+    if lock is None:
+        if entry:
+            # Stale, and another process is refreshing it
+            cache_stale_hits_total.labels(cache_type=prefix, tier='redis').inc()
+            return entry['data']
+        entry = wait_for_entry(cache_key)
+        if entry:
+            cache_hits_total.labels(cache_type=prefix, tier='redis').inc()
+            return entry['data']
+    cache_misses_total.labels(cache_type=prefix, tier='redis').inc()
+
+    try:
+        # Get fresh data
+        data = compute()
+        # Cache the response, kept past its TTL for the stale window
+        redis_client.setex(
+            cache_key,
+            expire + CACHE_STALE_TTL,
+            json.dumps({'data': data, 'fresh_until': time.time() + expire})
+        )
+    finally:
+        if lock is not None:
+            release_lock(lock)
+    return data
+
+def render_json(data: Any) -> Dict[str, str]:
+    """Serialize a response body once and tag it with a hash of its content."""
+    body = json.dumps(data) + '\n'
+    etag = hashlib.blake2b(body.encode('utf-8'), digest_size=16).hexdigest()
+    return {'body': body, 'etag': etag}
+
+def conditional_response(rendered: Dict[str, str]) -> Response:
+    """Respond with a rendered body, or 304 when the client already has it."""
+    response = Response(rendered['body'], mimetype='application/json')
+    response.set_etag(rendered['etag'])
+    # Authenticated data: clients may keep it but must revalidate every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
 def cache_response(prefix: str, expire: int = 300):
-    """Decorator to cache API responses."""
+    """Decorator to cache API responses.
+
+    Apply it above ``marshal_with`` so the final JSON body is cached. Hits
+    skip marshalling and serialization and carry an ``ETag``, and requests
+    whose ``If-None-Match`` matches it get an empty 304.
+
+    Lookups go through an in-process LRU tier, then Redis. Concurrent misses
+    for a key are computed once per process and, through a Redis lock, once
+    across processes. Expired entries are served for ``CACHE_STALE_TTL`` more
+    seconds while the lock holder refreshes them.
+    """
+    local_ttl = min(CACHE_LOCAL_TTL, expire)
+
     def decorator(f):
         @wraps(f)
         def decorated(*args, **kwargs):
-            # Generate cache key
-            cache_key = f"{prefix}:{get_cache_key(*args, **kwargs)}"
-            
-            # Try to get from cache
-            cached_data = redis_client.get(cache_key)
-            if cached_data:
-                cache_hits_total.labels(cache_type=prefix).inc()
-                return json.loads(cached_data)
-            
-            cache_misses_total.labels(cache_type=prefix).inc()
-            
-            # Get fresh data
-            data = f(*args, **kwargs)
-            
-            # Cache the response
-            redis_client.setex(
-                cache_key,
-                expire,
-                json.dumps(data)
-            )
-            
-            return data
+            key = get_cache_key(*args, **kwargs)
+            local_key = f"{prefix}:{key}" if key else prefix
+
+            entry = local_cache.get(local_key)
+            if entry and entry.fresh:
+                cache_hits_total.labels(cache_type=prefix, tier='local').inc()
+                return conditional_response(entry.value)
+            if entry and single_flight.in_flight(local_key):
+                # Another thread of this process is already refreshing it
+                cache_stale_hits_total.labels(cache_type=prefix, tier='local').inc()
+                return conditional_response(entry.value)
+            cache_misses_total.labels(cache_type=prefix, tier='local').inc()
+
+            def load() -> Dict[str, str]:
+                rendered = load_shared(prefix, key, expire, lambda: render_json(f(*args, **kwargs)))
+                local_cache.set(local_key, rendered, local_ttl)
+                return rendered
+
+            return conditional_response(single_flight.do(local_key, load))
         return decorated
     return decorator
 
 def invalidate_cache_prefix(prefix: str) -> None:
-    """Invalidate all cache keys with given prefix."""
-    pattern = f"{prefix}:*"
-    keys = redis_client.keys(pattern)
-    if keys:
-        redis_client.delete(*keys)
+    """Invalidate all cache keys with given prefix.
+
+    This bumps the generation of the namespace instead of scanning for keys.
+    A missing generation is seeded from the clock, so a namespace whose
+    counter expired never returns to a generation that may still be cached.
+    """
+    local_cache.delete_prefix(prefix)
+    generation_key = f"{GENERATION_PREFIX}{prefix}"
+    pipe = redis_client.pipeline()
+    pipe.set(generation_key, int(time.time() * 1000), nx=True)
+    pipe.incr(generation_key)
+    pipe.expire(generation_key, GENERATION_TTL)
+    pipe.execute()
 
 def set_cache(key: str, value: Any, expire: int = 300) -> None:
     """Set a value in cache."""
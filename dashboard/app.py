@@ -1,6 +1,10 @@
 import os
 import sys
-from collections import defaultdict
+import json
+import zlib
+import time
+import atexit
+import threading
 from datetime import datetime
 import logging
 
@@ -13,25 +17,147 @@ project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
 
 from flask import Flask, request, jsonify, render_template
+from redis import RedisError
+from werkzeug.exceptions import RequestEntityTooLarge
 from analytics.anomaly_detection import detect_anomaly
-from alerts.alert_manager import send_alert
+from analytics.fleet_detection import FleetDetector, load_thresholds
+from analytics.online_detection import build_detector, ONLINE_DETECTOR_STATE_PATH
+from analytics.predictive_analytics import TrendForecaster, forecast_dict
+from analytics.capacity import CapacityPlanner
+from alerts.dispatcher import AlertDispatcher
+from alerts.alert_state import AlertStateManager
+from alerts.rules import RuleEngine, load_rules
+from metrics.prometheus_metrics import registry, exposition_cache
+from metrics.live_collector import live_state_collector  # noqa: F401, exports system_metrics at scrape time
+from metrics.history import HistoryStore, parse_timestamp
+from metrics.rates import RateCalculator
+from metrics import wire_format
+from cache.live_state import build_state, record_states, fleet_state
 
 app = Flask(__name__)
 
-# Store metrics for multiple servers
-# Format: {server_id: [metrics]}
-metrics_store = defaultdict(list)
+# Deliver alerts off the request path
+alert_dispatcher = AlertDispatcher()
+# Fire alerts on sustained breaches only, and send their changes as digests
+alert_states = AlertStateManager(alert_dispatcher.submit)
+
+# Store recent metrics for multiple servers in fixed-size ring buffers
+metrics_store = HistoryStore()
+# Derive per-second rates from cumulative counters
+rate_calculator = RateCalculator()
+# Latest sample of every server for whole-fleet threshold checks
+fleet_detector = FleetDetector(load_thresholds())
+# Learned per-server baselines, restored so a restart does not reset them
+online_detector = build_detector()
+try:
+    online_detector.load(ONLINE_DETECTOR_STATE_PATH)
+except (OSError, ValueError) as e:
+    logger.warning(f"Starting with empty baselines, cannot restore them: {str(e)}")
+# Running linear trends of every server, for forecasts on each refresh
+forecaster = TrendForecaster()
+# Time until disk and memory of every server reach capacity
+capacity_planner = CapacityPlanner()
+registry.register(capacity_planner)
 # Store server information
 servers_info = {}
+# Configured alert rules, evaluated over the history on a fixed tick. Their
+# "for" durations already require persistence, so they fire on the first breach.
+rule_engine = RuleEngine(metrics_store, load_rules(fields=metrics_store.fields))
+rule_alert_states = AlertStateManager(alert_dispatcher.submit, fire_after=1, source='rule')
+
+# Forecast horizon used when none is requested (in seconds)
+DEFAULT_FORECAST_HORIZON = 300
+
+# Largest metrics payload accepted once decompressed (in bytes)
+MAX_PAYLOAD_SIZE = int(os.getenv('MAX_PAYLOAD_SIZE', 16 * 1024 * 1024))
+
+def read_payload():
+    """Parse the request body as JSON or binary batch, inflating it first if it is gzip-encoded."""
+    body = request.get_data()
+    if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        body = decompressor.decompress(body, MAX_PAYLOAD_SIZE)
+        if decompressor.unconsumed_tail:
+            raise RequestEntityTooLarge(f"Decompressed payload exceeds {MAX_PAYLOAD_SIZE} bytes")
+    if request.mimetype == wire_format.CONTENT_TYPE:
+        return wire_format.decode_batch(body)
+    return json.loads(body)
+
+def save_baselines():
+    """Stop the periodic snapshots and write a final one."""
+    online_detector.stop()
+    try:
+        online_detector.save(ONLINE_DETECTOR_STATE_PATH)
+    except OSError as e:
+        logger.warning(f"Failed to snapshot baselines: {str(e)}")
+
+def evaluate_rules(results):
+    """Feed the rule breaches of one tick to their alert states."""
+    now = time.time()
+    for server_id, breaches in results.items():
+        info = servers_info.get(server_id, {})
+        rule_alert_states.observe({**info, 'server_id': server_id}, now, breaches)
+    rule_alert_states.flush_if_due()
+
+_background_lock = threading.Lock()
+_background_started = False
+
+def start_background_tasks():
+    """Start the snapshot, digest and rule threads once per serving process.
+
+    They start with the first request rather than on import, so neither
+    importing the app nor the watching parent of the debug reloader runs
+    them, and only a process that served requests saves its baselines.
+    """
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+        # Snapshot baselines in the background, never while an ingest request waits
+        online_detector.start(ONLINE_DETECTOR_STATE_PATH)
+        atexit.register(save_baselines)
+        # Send digests on a timer, so pending transitions go out even when agents stop posting
+        alert_states.start()
+        rule_alert_states.start()
+        # Exit handlers run last first: send the pending digests, then drain the queue
+        atexit.register(alert_dispatcher.stop)
+        atexit.register(alert_states.stop)
+        atexit.register(rule_alert_states.stop)
+        rule_engine.start(evaluate_rules)
+
+@app.before_request
+def ensure_background_tasks():
+    if not _background_started:
+        start_background_tasks()
+
+def ingest_sample(server_info, timestamp, metrics):
+    """Store one sample, with counter rates already derived, and track alerts for its anomalies.
+
+    Returns the live state of the server after the sample.
+    """
+    # Store metrics, the ring buffer drops the oldest sample when full
+    metrics_store.append(server_info['server_id'], timestamp, metrics)
+    fleet_detector.update(server_info['server_id'], metrics)
+    epoch = parse_timestamp(timestamp)
+    forecaster.observe(server_info['server_id'], epoch, metrics)
+    capacity_planner.observe(server_info['server_id'], epoch, metrics)
+    # Score against the server's own baseline before folding the sample in
+    deviations = online_detector.observe(server_info['server_id'], metrics)
+
+    # Check for anomalies; alerts fire and resolve through the state manager
+    anomalies = detect_anomaly(metrics)
+    alert_states.observe(server_info, epoch, anomalies)
+    return build_state(server_info, timestamp, metrics, anomalies, deviations=deviations)
 
 @app.route('/metrics', methods=['POST'])
 def receive_metrics():
     try:
-        data = request.json
-        logger.debug(f"Received metrics data: {data}")
+        data = read_payload()
         
         server_info = data['server_info']
         server_id = server_info['server_id']
+        logger.debug("Received metrics from %s", server_id)
         
         # Store or update server information
         servers_info[server_id] = {
@@ -41,41 +167,52 @@ def receive_metrics():
             'last_seen': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        # Store metrics
-        metrics_store[server_id].append(data)
-        
-        # Keep only last 100 metrics per server
-        if len(metrics_store[server_id]) > 100:
-            metrics_store[server_id].pop(0)
-        
-        # Check for anomalies
-        anomalies = detect_anomaly(data['metrics'])
-        if anomalies:
-            # Include server information in alert
-            alert_data = {
-                'server_info': server_info,
-                'anomalies': anomalies,
-                'timestamp': data['timestamp']
-            }
-            send_alert(alert_data)
+        # Batches carry server_info once for many samples
+        if 'samples' in data:
+            samples = data['samples']
+            timestamps = [parse_timestamp(sample['timestamp']) for sample in samples]
+            rated = rate_calculator.apply_batch(server_id, timestamps, [s['metrics'] for s in samples])
+            states = [ingest_sample(server_info, timestamp, metrics) for timestamp, metrics in zip(timestamps, rated)]
+            if states:
+                # Only the newest sample of the batch is the server's current state
+                record_states([max(states, key=lambda state: state['timestamp'])])
+            alert_states.flush_if_due()
+            return jsonify({
+                "status": "Metrics received",
+                "server_id": server_id,
+                "count": len(data['samples'])
+            }), 200
+
+        timestamp = parse_timestamp(data['timestamp'])
+        metrics = rate_calculator.apply(server_id, timestamp, data['metrics'])
+        record_states([ingest_sample(server_info, timestamp, metrics)])
+        alert_states.flush_if_due()
         
         return jsonify({
             "status": "Metrics received", 
             "server_id": server_id,
-            "metrics": data['metrics']
+            "metrics": metrics
         }), 200
+    except RequestEntityTooLarge as e:
+        logger.error(f"Rejected metrics payload: {e.description}")
+        return jsonify({"status": "error", "message": e.description}), 413
     except Exception as e:
         logger.error(f"Error processing metrics: {str(e)}", exc_info=True)
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/metrics', methods=['GET'])
+def expose_metrics():
+    """Expose Prometheus metrics."""
+    return exposition_cache.response()
+
 @app.route('/')
 def dashboard():
     # Prepare data for the dashboard
     dashboard_data = {
         'servers': servers_info,
         'metrics': {
-            server_id: server_metrics[-1] if server_metrics else None
-            for server_id, server_metrics in metrics_store.items()
+            server_id: metrics_store.get(server_id).latest()
+            for server_id in metrics_store
         }
     }
     logger.debug(f"Rendering dashboard with initial data: {dashboard_data}")
@@ -86,7 +223,7 @@ def get_server_metrics(server_id):
     try:
         if server_id in metrics_store:
             # Return the last 20 metrics for the chart
-            metrics = metrics_store[server_id][-20:] if metrics_store[server_id] else []
+            metrics = metrics_store.get(server_id).samples(20)
             logger.debug(f"Returning metrics for server {server_id}: {metrics}")
             return jsonify(metrics)
         logger.warning(f"Server {server_id} not found in metrics store")
@@ -95,13 +232,86 @@ def get_server_metrics(server_id):
         logger.error(f"Error retrieving metrics for server {server_id}: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+def server_summary(state):
+    """Shape a live server state like the entries of ``/servers``."""
+    server_info = state['server_info']
+    return {
+        'hostname': server_info.get('hostname'),
+        'ip': server_info.get('ip', server_info.get('ip_address')),
+        'os': server_info.get('os', server_info.get('os_info')),
+        'last_seen': datetime.fromtimestamp(state['last_seen']).strftime('%Y-%m-%d %H:%M:%S'),
+        'last_metrics': state['metrics'],
+        'anomalies': state['anomalies'],
+        'deviations': state.get('deviations', {})
+    }
+
+@app.route('/fleet', methods=['GET'])
+def get_fleet():
+    """Latest state of every server, from a single scan of the Redis live state."""
+    max_age = request.args.get('max_age', type=float)
+    try:
+        return jsonify(fleet_state(max_age))
+    except RedisError as e:
+        logger.error(f"Error reading live state: {str(e)}")
+        return jsonify({"error": "Live state unavailable"}), 503
+
+@app.route('/anomalies', methods=['GET'])
+def get_anomalies():
+    """Metrics above their per-server thresholds in the latest sample of every server."""
+    return jsonify(fleet_detector.anomalies())
+
+@app.route('/forecast', methods=['GET'])
+def get_forecast():
+    """Metrics of every server extrapolated ``horizon`` seconds past its latest sample."""
+    horizon = request.args.get('horizon', DEFAULT_FORECAST_HORIZON, type=float)
+    server_ids, forecasts = forecaster.forecast_all(horizon)
+    return jsonify({
+        'horizon': horizon,
+        'servers': {
+            server_id: forecast_dict(forecaster.metrics, values)
+            for server_id, values in zip(server_ids, forecasts)
+        }
+    })
+
+@app.route('/capacity', methods=['GET'])
+def get_capacity():
+    """Time until disk and memory reach capacity, soonest first.
+
+    ``sort`` orders by one resource instead of the soonest of both,
+    ``order=desc`` reverses the order and ``limit`` keeps the first servers.
+    """
+    try:
+        report = capacity_planner.report(
+            sort=request.args.get('sort'),
+            descending=request.args.get('order', 'asc') == 'desc',
+            limit=request.args.get('limit', type=int)
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(report)
+
+@app.route('/alerts', methods=['GET'])
+def get_alerts():
+    """Alerts currently firing, from thresholds and from rules."""
+    return jsonify(alert_states.active() + rule_alert_states.active())
+
 @app.route('/servers', methods=['GET'])
 def get_servers():
+    try:
+        # Live state in Redis is shared by every dashboard process
+        return jsonify({
+            server_id: server_summary(state)
+            for server_id, state in fleet_state().items()
+        })
+    except RedisError as e:
+        logger.warning(f"Live state unavailable, serving local state: {str(e)}")
     try:
         # Add last metrics to server info
         response = {}
         for server_id, info in servers_info.items():
-            last_metrics = metrics_store[server_id][-1]['metrics'] if metrics_store[server_id] else None
+            history = metrics_store.get(server_id)
+            latest = history.latest() if history else None
+            last_metrics = latest['metrics'] if latest else None
             response[server_id] = {
                 **info,
                 'last_metrics': last_metrics
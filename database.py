@@ -45,4 +45,8 @@ def get_db() -> Generator[Session, None, None]:
 def init_db() -> None:
     """Initialize database."""
     from models.base import Base
-    Base.metadata.create_all(bind=engine) 
\ No newline at end of file
+    from partitions import ensure_partitions
+    Base.metadata.create_all(bind=engine)
+    # Make sure today's and upcoming metrics partitions exist
+    with engine.begin() as conn:
+        ensure_partitions(conn) 
\ No newline at end of file
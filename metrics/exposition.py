@@ -0,0 +1,101 @@
+"""Cached, compressed Prometheus exposition.
+
+Serializing a registry with per-server series is the expensive part of a
+scrape, and every Prometheus replica scrapes on its own. ``ExpositionCache``
+renders each format at most once per ``METRICS_CACHE_TTL`` seconds and
+gzips it once for every scraper that accepts gzip. Keep the TTL below the
+scrape interval so every scrape still sees new values.
+"""
+import os
+import gzip
+import time
+import threading
+from typing import Callable, Dict, Optional, Tuple
+from flask import Response, request
+from prometheus_client import CollectorRegistry, Gauge, Histogram
+from prometheus_client.exposition import choose_encoder
+
+# Seconds a rendered exposition is served again, 0 renders every scrape
+METRICS_CACHE_TTL = float(os.getenv('METRICS_CACHE_TTL', 2))
+METRICS_GZIP_LEVEL = int(os.getenv('METRICS_GZIP_LEVEL', 6))
+
+OPENMETRICS = 'application/openmetrics-text'
+
+class ExpositionCache:
+    """Render a registry per negotiated format and encoding, reusing renders for ``ttl`` seconds.
+
+    ``prepare`` runs before each render, for registries whose values are
+    set right before serializing. The serialization time and the payload
+    size are exported on the registry itself.
+    """
+
+    def __init__(self, registry: CollectorRegistry, ttl: float = METRICS_CACHE_TTL,
+                 prepare: Optional[Callable[[], None]] = None,
+                 compresslevel: int = METRICS_GZIP_LEVEL) -> None:
+        self.registry = registry
+        self.ttl = ttl
+        self.prepare = prepare
+        self.compresslevel = compresslevel
+        self.duration = Histogram(
+            'metrics_exposition_duration_seconds',
+            'Time to serialize the metrics exposition in seconds',
+            ['format'],
+            registry=registry,
+            buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+        )
+        self.size = Gauge(
+            'metrics_exposition_bytes',
+            'Size of the latest metrics exposition in bytes',
+            ['format', 'encoding'],
+            registry=registry
+        )
+        # (format, encoding) -> (rendered at, body)
+        self._entries: Dict[Tuple[str, str], Tuple[float, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, key: Tuple[str, str], now: float) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry and now - entry[0] < self.ttl:
+            return entry[1]
+        return None
+
+    def render(self, accept: Optional[str] = None, compress: bool = False) -> Tuple[bytes, str]:
+        """Exposition body and content type for an ``Accept`` header, gzipped if ``compress``."""
+        encoder, content_type = choose_encoder(accept)
+        fmt = 'openmetrics' if content_type.startswith(OPENMETRICS) else 'prometheus'
+        encoding = 'gzip' if compress else 'identity'
+        # One render at a time, so concurrent scrapes wait for it instead of repeating it
+        with self._lock:
+            now = time.monotonic()
+            body = self._fresh((fmt, encoding), now)
+            if body is not None:
+                return body, content_type
+
+            text = self._fresh((fmt, 'identity'), now)
+            if text is None:
+                if self.prepare is not None:
+                    self.prepare()
+                started = time.perf_counter()
+                text = encoder(self.registry)
+                self.duration.labels(format=fmt).observe(time.perf_counter() - started)
+                self.size.labels(format=fmt, encoding='identity').set(len(text))
+                self._entries[(fmt, 'identity')] = (now, text)
+                # A compressed copy of the previous render is now outdated
+                self._entries.pop((fmt, 'gzip'), None)
+            if not compress:
+                return text, content_type
+
+            body = gzip.compress(text, compresslevel=self.compresslevel)
+            self.size.labels(format=fmt, encoding='gzip').set(len(body))
+            self._entries[(fmt, 'gzip')] = (self._entries[(fmt, 'identity')][0], body)
+            return body, content_type
+
+    def response(self) -> Response:
+        """Respond to the current scrape, negotiating format and compression from its headers."""
+        compress = request.accept_encodings['gzip'] > 0
+        body, content_type = self.render(request.headers.get('Accept'), compress)
+        response = Response(body, content_type=content_type)
+        if compress:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.vary.update(('Accept', 'Accept-Encoding'))
+        return response
@@ -0,0 +1,159 @@
+"""Fixed-capacity columnar history of recent metrics per server."""
+import os
+import time
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Number of samples kept per server
+MAX_METRICS_HISTORY = int(os.getenv('MAX_METRICS_HISTORY', 720))
+
+# Fields agents report inside the nested network dict
+NETWORK_FIELDS: Tuple[str, ...] = ('bytes_sent', 'bytes_recv', 'bytes_sent_rate', 'bytes_recv_rate')
+
+# Columns stored for every sample, in order
+FIELDS: Tuple[str, ...] = ('cpu', 'memory', 'disk') + NETWORK_FIELDS
+
+# Format of the timestamps sent by agents
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def parse_timestamp(value: Any) -> float:
+    """Convert an agent timestamp into epoch seconds, falling back to now."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.strptime(value, TIMESTAMP_FORMAT).timestamp()
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+def format_timestamp(value: float) -> str:
+    """Convert epoch seconds back into the agent timestamp format."""
+    return datetime.fromtimestamp(value).strftime(TIMESTAMP_FORMAT)
+
+def flatten_metrics(metrics: Dict[str, Any], fields: Sequence[str] = FIELDS) -> List[float]:
+    """Flatten an agent metrics dict into one value per field, NaN when absent."""
+    flat = dict(metrics)
+    network = flat.pop('network', None)
+    if isinstance(network, dict):
+        flat.update(network)
+    values = (flat.get(field) for field in fields)
+    return [np.nan if value is None else float(value) for value in values]
+
+class MetricHistory:
+    """Ring buffer of samples for one server.
+
+    Every sample is written twice, at ``i`` and ``i + capacity``, so that any
+    window of up to ``capacity`` most recent samples is a contiguous slice and
+    can be returned as a view without copying.
+    """
+
+    def __init__(self, capacity: int = MAX_METRICS_HISTORY, fields: Sequence[str] = FIELDS) -> None:
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self.capacity = capacity
+        self.fields = tuple(fields)
+        self._columns = {name: i + 1 for i, name in enumerate(self.fields)}
+        # Row 0 holds timestamps, the remaining rows one field each
+        self._data = np.full((len(self.fields) + 1, 2 * capacity), np.nan)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def append(self, timestamp: float, values: Sequence[float]) -> None:
+        """Add a sample in O(1), overwriting the oldest one when full."""
+        with self._lock:
+            pos = self._count % self.capacity
+            self._data[0, pos] = self._data[0, pos + self.capacity] = timestamp
+            self._data[1:, pos] = values
+            self._data[1:, pos + self.capacity] = values
+            self._count += 1
+
+    def _bounds(self, n: Optional[int]) -> Tuple[int, int]:
+        size = len(self)
+        n = size if n is None else max(0, min(n, size))
+        end = (self._count - 1) % self.capacity + self.capacity + 1 if self._count else 0
+        return end - n, end
+
+    def window(self, n: Optional[int] = None) -> np.ndarray:
+        """Return the last ``n`` samples as a ``(1 + fields, n)`` view, oldest first.
+
+        Row 0 holds timestamps. The view is overwritten by later appends, so
+        copy it if it has to outlive the current request.
+        """
+        start, end = self._bounds(n)
+        return self._data[:, start:end]
+
+    def column(self, name: str, n: Optional[int] = None) -> np.ndarray:
+        """Return the last ``n`` values of one field (or ``timestamp``) as a view."""
+        start, end = self._bounds(n)
+        row = 0 if name == 'timestamp' else self._columns[name]
+        return self._data[row, start:end]
+
+    def samples(self, n: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return the last ``n`` samples in the agent payload shape."""
+        window = self.window(n)
+        return [self._to_sample(window[:, i]) for i in range(window.shape[1])]
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """Return the most recent sample, if any."""
+        samples = self.samples(1)
+        return samples[0] if samples else None
+
+    def _to_sample(self, column: np.ndarray) -> Dict[str, Any]:
+        values = {
+            name: None if np.isnan(column[i]) else float(column[i])
+            for name, i in self._columns.items()
+        }
+        metrics: Dict[str, Any] = {
+            name: value for name, value in values.items()
+            if name not in NETWORK_FIELDS
+        }
+        metrics['network'] = {
+            name: value for name, value in values.items()
+            if name in NETWORK_FIELDS
+        }
+        return {
+            'timestamp': format_timestamp(column[0]),
+            'metrics': metrics
+        }
+
+class HistoryStore:
+    """Per-server ring buffers created on first use."""
+
+    def __init__(self, capacity: int = MAX_METRICS_HISTORY, fields: Sequence[str] = FIELDS) -> None:
+        self.capacity = capacity
+        self.fields = tuple(fields)
+        self._servers: Dict[str, MetricHistory] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, server_id: str) -> bool:
+        return server_id in self._servers
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._servers))
+
+    def get(self, server_id: str) -> Optional[MetricHistory]:
+        """Return the history of a server, if it has reported."""
+        return self._servers.get(server_id)
+
+    def append(self, server_id: str, timestamp: Any, metrics: Dict[str, Any]) -> None:
+        """Record an agent sample for a server."""
+        history = self._servers.get(server_id)
+        if history is None:
+            with self._lock:
+                history = self._servers.setdefault(
+                    server_id, MetricHistory(self.capacity, self.fields)
+                )
+        history.append(parse_timestamp(timestamp), flatten_metrics(metrics, self.fields))
+
+    def remove(self, server_id: str) -> None:
+        """Forget the history of a server."""
+        with self._lock:
+            self._servers.pop(server_id, None)
@@ -0,0 +1,66 @@
+"""Per-server system metrics, read from the live state at scrape time.
+
+Ingest only writes the live state of each server. The collector turns the
+servers seen within ``SYSTEM_METRICS_MAX_AGE`` seconds into samples when
+``/metrics`` is scraped, so servers that stop reporting drop out of the
+exposition by themselves and the registry holds no per-server children.
+"""
+import logging
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+from redis import RedisError
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+from cache.live_state import fleet_state
+from metrics.prometheus_metrics import registry, SYSTEM_METRICS_MAX_AGE
+
+logger = logging.getLogger(__name__)
+
+def numeric_metrics(metrics: Dict[str, Any]) -> Iterator[Tuple[str, float]]:
+    """Numeric values of a sample, including nested ones such as network rates."""
+    for metric_type, value in metrics.items():
+        if isinstance(value, dict):
+            yield from numeric_metrics(value)
+        elif isinstance(value, (int, float)):
+            yield metric_type, value
+
+class LiveStateCollector(Collector):
+    """Export the latest sample of every recently seen server.
+
+    ``source`` returns the fleet as ``{server_id: state}``; by default the
+    live state in Redis, filtered by ``max_age``.
+    """
+
+    def __init__(self, max_age: float = SYSTEM_METRICS_MAX_AGE,
+                 source: Optional[Callable[[], Dict[str, Dict[str, Any]]]] = None) -> None:
+        self.max_age = max_age
+        self.source = source or (lambda: fleet_state(self.max_age))
+
+    def families(self) -> Tuple[GaugeMetricFamily, GaugeMetricFamily]:
+        """Empty metric families, filled by ``collect``."""
+        return (
+            GaugeMetricFamily('system_metrics', 'System metrics collected from servers',
+                              labels=['server_id', 'metric_type']),
+            GaugeMetricFamily('server_last_seen_timestamp_seconds', 'Unix time of the latest sample of a server',
+                              labels=['server_id'])
+        )
+
+    def describe(self) -> Iterable[GaugeMetricFamily]:
+        # Names only, so registering does not read the fleet
+        return self.families()
+
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        values, last_seen = self.families()
+        try:
+            fleet = self.source()
+        except RedisError as e:
+            # The scrape still succeeds, without per-server series
+            logger.warning(f"Failed to read live state for Prometheus: {e}")
+            fleet = {}
+        for server_id, state in fleet.items():
+            last_seen.add_metric([server_id], state['last_seen'])
+            for metric_type, value in numeric_metrics(state['metrics']):
+                values.add_metric([server_id, metric_type], value)
+        return values, last_seen
+
+live_state_collector = LiveStateCollector()
+registry.register(live_state_collector)
@@ -1,6 +1,8 @@
 """Prometheus metrics configuration and collectors."""
+import os
 from prometheus_client import Counter, Histogram, Gauge, Info
 from prometheus_client.core import CollectorRegistry
+from metrics.exposition import ExpositionCache
 import time
 
 # Create a custom registry
@@ -21,13 +23,9 @@ http_request_duration_seconds = Histogram(
     registry=registry
 )
 
-# System metrics
-system_metrics_gauge = Gauge(
-    'system_metrics',
-    'System metrics collected from servers',
-    ['server_id', 'metric_type'],
-    registry=registry
-)
+# Per-server series are exported at scrape time, by metrics.live_collector and
+# analytics.capacity, for servers seen within this many seconds only
+SYSTEM_METRICS_MAX_AGE = float(os.getenv('SYSTEM_METRICS_MAX_AGE', 300))
 
 # Server info
 server_info = Info(
@@ -53,18 +51,85 @@ db_operation_duration_seconds = Histogram(
     registry=registry
 )
 
-# Cache metrics
+# Cache metrics, per tier (local or redis)
 cache_hits_total = Counter(
     'cache_hits_total',
     'Total number of cache hits',
-    ['cache_type'],
+    ['cache_type', 'tier'],
     registry=registry
 )
 
 cache_misses_total = Counter(
     'cache_misses_total',
     'Total number of cache misses',
-    ['cache_type'],
+    ['cache_type', 'tier'],
+    registry=registry
+)
+
+cache_stale_hits_total = Counter(
+    'cache_stale_hits_total',
+    'Total number of expired cache entries served while being refreshed',
+    ['cache_type', 'tier'],
+    registry=registry
+)
+
+# Authentication metrics, per credential kind (token or api_key)
+auth_cache_requests_total = Counter(
+    'auth_cache_requests_total',
+    'Total number of principal lookups by cache result',
+    ['credential', 'result'],
+    registry=registry
+)
+
+auth_lookup_duration_seconds = Histogram(
+    'auth_lookup_duration_seconds',
+    'Time to resolve the principal of a request in seconds',
+    ['credential', 'result'],
+    registry=registry,
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+)
+
+# Alert delivery metrics
+alert_queue_depth = Gauge(
+    'alert_queue_depth',
+    'Number of alerts waiting to be delivered',
+    registry=registry
+)
+
+alert_delivery_duration_seconds = Histogram(
+    'alert_delivery_duration_seconds',
+    'Time from enqueueing an alert to its delivery in seconds',
+    registry=registry,
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+alerts_total = Counter(
+    'alerts_total',
+    'Total number of alerts by delivery outcome',
+    ['status'],
+    registry=registry
+)
+
+alert_rule_evaluation_seconds = Histogram(
+    'alert_rule_evaluation_seconds',
+    'Time to evaluate one alert rule over every server in seconds',
+    ['rule'],
+    registry=registry,
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+)
+
+# Alert states, per source (threshold or rule)
+alerts_active = Gauge(
+    'alerts_active',
+    'Number of firing alerts',
+    ['source'],
+    registry=registry
+)
+
+alert_transitions_total = Counter(
+    'alert_transitions_total',
+    'Total number of alerts that fired or resolved',
+    ['source', 'status'],
     registry=registry
 )
 
@@ -75,6 +140,9 @@ active_users = Gauge(
     registry=registry
 )
 
+# Renders of the registry served to scrapers, cached for METRICS_CACHE_TTL seconds
+exposition_cache = ExpositionCache(registry)
+
 def track_request_duration(method, endpoint):
     """Context manager to track request duration."""
     start_time = time.time()
@@ -82,12 +150,6 @@ def track_request_duration(method, endpoint):
     duration = time.time() - start_time
     http_request_duration_seconds.labels(method=method, endpoint=endpoint).observe(duration)
 
-def update_system_metrics(server_id, metrics):
-    """Update system metrics in Prometheus."""
-    for metric_type, value in metrics.items():
-        if isinstance(value, (int, float)):
-            system_metrics_gauge.labels(server_id=server_id, metric_type=metric_type).set(value)
-
 def update_server_info(server_id, info):
     """Update server information in Prometheus."""
     server_info.labels(server_id=server_id).info({
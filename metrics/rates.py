@@ -0,0 +1,97 @@
+"""Per-second rates derived from cumulative counters at ingest time."""
+import threading
+from typing import Any, Dict, Optional, Sequence, Tuple
+import numpy as np
+
+# Cumulative network counters reported by agents
+COUNTERS: Tuple[str, ...] = ('bytes_sent', 'bytes_recv')
+
+def rate_name(counter: str) -> str:
+    """Name of the rate derived from a counter."""
+    return f'{counter}_rate'
+
+def counter_rates(previous: Optional[Tuple[float, np.ndarray]], timestamps: np.ndarray,
+                  values: np.ndarray) -> np.ndarray:
+    """Compute per-second rates for consecutive counter samples.
+
+    ``values`` has one row per sample and one column per counter. A counter
+    that goes backwards is treated as reset to zero, so its delta is the new
+    value. Samples without a usable predecessor or time step get NaN.
+    """
+    timestamps = np.asarray(timestamps, dtype=float)
+    values = np.asarray(values, dtype=float).reshape(len(timestamps), -1)
+    if previous is None:
+        prev_ts = np.array([np.nan])
+        prev_values = np.full((1, values.shape[1]), np.nan)
+    else:
+        prev_ts = np.array([previous[0]])
+        prev_values = np.asarray(previous[1], dtype=float).reshape(1, -1)
+
+    deltas = values - np.concatenate([prev_values, values[:-1]])
+    deltas = np.where(deltas < 0, values, deltas)
+    elapsed = timestamps - np.concatenate([prev_ts, timestamps[:-1]])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rates = deltas / elapsed[:, None]
+    rates[~(elapsed > 0)] = np.nan
+    return rates
+
+class RateCalculator:
+    """Keep the previous counter values per server and turn new ones into rates.
+
+    State is O(servers), each update is O(1) per sample and batches are
+    processed with NumPy in one pass.
+    """
+
+    def __init__(self, counters: Sequence[str] = COUNTERS) -> None:
+        self.counters = tuple(counters)
+        self._previous: Dict[str, Tuple[float, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def update_batch(self, server_id: str, timestamps: Sequence[float], values: Any) -> np.ndarray:
+        """Return rates for a server's samples, given in time order."""
+        timestamps = np.asarray(timestamps, dtype=float)
+        values = np.asarray(values, dtype=float).reshape(len(timestamps), len(self.counters))
+        if not len(timestamps):
+            return values
+        with self._lock:
+            rates = counter_rates(self._previous.get(server_id), timestamps, values)
+            last = self._previous.get(server_id)
+            # Out-of-order samples must not move the baseline backwards
+            if last is None or timestamps[-1] >= last[0]:
+                self._previous[server_id] = (float(timestamps[-1]), values[-1].copy())
+        return rates
+
+    def update(self, server_id: str, timestamp: float, values: Sequence[float]) -> np.ndarray:
+        """Return rates for a single sample."""
+        return self.update_batch(server_id, [timestamp], [values])[0]
+
+    def apply(self, server_id: str, timestamp: float, metrics: Dict[str, Any]) -> Dict[str, Any]:
+        """Add ``<counter>_rate`` entries next to the raw counters of an agent sample."""
+        network = metrics.get('network')
+        if not isinstance(network, dict):
+            return metrics
+        values = [network.get(counter, np.nan) for counter in self.counters]
+        rates = self.update(server_id, timestamp, values)
+        return {**metrics, 'network': {**network, **self._rate_dict(rates)}}
+
+    def apply_batch(self, server_id: str, timestamps: Sequence[float],
+                    samples: Sequence[Dict[str, Any]]) -> list:
+        """Vectorized ``apply`` for a server's samples, given in time order."""
+        networks = [sample.get('network') or {} for sample in samples]
+        values = [[network.get(counter, np.nan) for counter in self.counters] for network in networks]
+        rates = self.update_batch(server_id, timestamps, values)
+        return [
+            {**sample, 'network': {**network, **self._rate_dict(row)}}
+            for sample, network, row in zip(samples, networks, rates)
+        ]
+
+    def forget(self, server_id: str) -> None:
+        """Drop the baseline of a server."""
+        with self._lock:
+            self._previous.pop(server_id, None)
+
+    def _rate_dict(self, rates: np.ndarray) -> Dict[str, Optional[float]]:
+        return {
+            rate_name(counter): None if np.isnan(rate) else float(rate)
+            for counter, rate in zip(self.counters, rates)
+        }
@@ -0,0 +1,109 @@
+"""Compact binary encoding for agent metric batches.
+
+A batch is laid out as::
+
+    magic (2s) | version (B) | server_info length (H) | server_info (JSON)
+    | sample count (I) | samples
+
+Server identity is sent once per batch and every sample is a fixed 36-byte
+little-endian record, so the dashboard can decode a whole batch with a
+single ``numpy.frombuffer`` call instead of parsing JSON.
+
+Missing gauges are sent as NaN and missing counters as ``MISSING_COUNTER``;
+both decode to absent values rather than zeros, which rate derivation
+would take for a counter reset.
+"""
+import json
+import struct
+from typing import Any, Dict, List, Sequence, Tuple
+import numpy as np
+
+# Content type selecting this encoding
+CONTENT_TYPE = 'application/x-metrics-batch'
+
+MAGIC = b'MB'
+# Version 2 added MISSING_COUNTER, version 1 batches decode the same way
+VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+
+HEADER = struct.Struct('<2sBH')
+COUNT = struct.Struct('<I')
+
+# One fixed-size record per sample
+SAMPLE_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('cpu', '<f4'),
+    ('memory', '<f4'),
+    ('disk', '<f4'),
+    ('bytes_sent', '<u8'),
+    ('bytes_recv', '<u8')
+])
+
+COUNTERS = ('bytes_sent', 'bytes_recv')
+# Counter value standing for "not reported"
+MISSING_COUNTER = np.iinfo(np.uint64).max
+
+def encode_counter(value: Any) -> int:
+    """Wire value of a counter, ``MISSING_COUNTER`` when it was not reported."""
+    return MISSING_COUNTER if value is None else value
+
+def encode_batch(server_info: Dict[str, Any], samples: Sequence[Tuple[float, Dict[str, Any]]]) -> bytes:
+    """Encode ``(epoch timestamp, metrics dict)`` samples for one server."""
+    info = json.dumps(server_info, separators=(',', ':')).encode('utf-8')
+    records = np.zeros(len(samples), dtype=SAMPLE_DTYPE)
+    for i, (timestamp, metrics) in enumerate(samples):
+        network = metrics.get('network') or {}
+        records[i] = (
+            timestamp,
+            metrics.get('cpu', np.nan),
+            metrics.get('memory', np.nan),
+            metrics.get('disk', np.nan),
+            encode_counter(network.get('bytes_sent')),
+            encode_counter(network.get('bytes_recv'))
+        )
+    return b''.join([
+        HEADER.pack(MAGIC, VERSION, len(info)),
+        info,
+        COUNT.pack(len(samples)),
+        records.tobytes()
+    ])
+
+def decode_batch_arrays(body: bytes) -> Tuple[Dict[str, Any], np.ndarray]:
+    """Decode a batch into its server info and a structured array of samples.
+
+    Counters not reported hold ``MISSING_COUNTER`` in the array.
+    """
+    if len(body) < HEADER.size:
+        raise ValueError('Truncated metrics batch')
+    magic, version, info_size = HEADER.unpack_from(body)
+    if magic != MAGIC or version not in SUPPORTED_VERSIONS:
+        raise ValueError('Unsupported metrics batch format')
+    offset = HEADER.size
+    server_info = json.loads(body[offset:offset + info_size])
+    offset += info_size
+    if len(body) < offset + COUNT.size:
+        raise ValueError('Truncated metrics batch')
+    (count,) = COUNT.unpack_from(body, offset)
+    offset += COUNT.size
+    if len(body) != offset + count * SAMPLE_DTYPE.itemsize:
+        raise ValueError('Metrics batch length does not match its sample count')
+    return server_info, np.frombuffer(body, dtype=SAMPLE_DTYPE, count=count, offset=offset)
+
+def decode_batch(body: bytes) -> Dict[str, Any]:
+    """Decode a batch into the JSON batch shape ``{server_info, samples}``."""
+    server_info, records = decode_batch_arrays(body)
+    samples: List[Dict[str, Any]] = [
+        {
+            'timestamp': timestamp,
+            'metrics': {
+                'cpu': cpu,
+                'memory': memory,
+                'disk': disk,
+                'network': {
+                    name: value for name, value in zip(COUNTERS, counters) if value != MISSING_COUNTER
+                }
+            }
+        }
+        for timestamp, cpu, memory, disk, *counters in records.tolist()
+    ]
+    return {'server_info': server_info, 'samples': samples}
@@ -13,6 +13,7 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from models.base import Base
 import models.server
 import models.metric
+import models.rollup
 
 # this is the Alembic Config object
 config = context.config
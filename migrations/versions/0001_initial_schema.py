@@ -0,0 +1,60 @@
+"""Initial schema.
+
+Databases created earlier through ``init_db`` already match this revision
+and only need ``alembic stamp 0001``.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('username', sa.String(50), primary_key=True),
+        sa.Column('password_hash', sa.String(255), nullable=False),
+        sa.Column('email', sa.String(255), nullable=False, unique=True),
+        sa.Column('is_admin', sa.Boolean(), nullable=True),
+        sa.Column('api_key', sa.String(255), nullable=True, unique=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    )
+    op.create_table(
+        'servers',
+        sa.Column('server_id', sa.String(36), primary_key=True),
+        sa.Column('hostname', sa.String(255), nullable=False),
+        sa.Column('ip_address', sa.String(45), nullable=False),
+        sa.Column('os_info', sa.String(255), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    )
+    op.create_table(
+        'metrics',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('server_id', sa.String(36), sa.ForeignKey('servers.server_id'), nullable=False),
+        sa.Column('cpu_usage', sa.Float(), nullable=False),
+        sa.Column('memory_usage', sa.Float(), nullable=False),
+        sa.Column('disk_usage', sa.Float(), nullable=False),
+        sa.Column('network_stats', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('metrics')
+    op.drop_table('servers')
+    op.drop_table('users')
@@ -0,0 +1,98 @@
+"""Range-partition metrics by day and index (server_id, created_at).
+
+Existing rows are copied into daily partitions. A default partition catches
+rows outside the created range. ``partitions.py`` keeps creating upcoming
+partitions and drops expired ones.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = 'id, server_id, cpu_usage, memory_usage, disk_usage, network_stats, created_at, updated_at'
+
+# Days of partitions created ahead of today
+PARTITIONS_AHEAD = 7
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE metrics RENAME TO metrics_legacy")
+    op.execute("ALTER SEQUENCE metrics_id_seq RENAME TO metrics_legacy_id_seq")
+    op.execute("ALTER INDEX metrics_pkey RENAME TO metrics_legacy_pkey")
+
+    # The partition key has to be part of the primary key
+    op.execute("""
+        CREATE TABLE metrics (
+            id SERIAL NOT NULL,
+            server_id VARCHAR(36) NOT NULL REFERENCES servers (server_id),
+            cpu_usage FLOAT NOT NULL,
+            memory_usage FLOAT NOT NULL,
+            disk_usage FLOAT NOT NULL,
+            network_stats JSON NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.create_index('ix_metrics_server_id_created_at', 'metrics', ['server_id', 'created_at'])
+    op.execute("CREATE TABLE metrics_default PARTITION OF metrics DEFAULT")
+
+    # One partition per UTC day, from the oldest stored metric to a week ahead
+    op.execute(f"""
+        DO $$
+        DECLARE
+            today date := (now() AT TIME ZONE 'utc')::date;
+            part_day date;
+        BEGIN
+            FOR part_day IN
+                SELECT generate_series(
+                    COALESCE((SELECT min(created_at)::date FROM metrics_legacy), today),
+                    today + {PARTITIONS_AHEAD},
+                    interval '1 day'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF metrics FOR VALUES FROM (%L) TO (%L)',
+                    'metrics_p' || to_char(part_day, 'YYYYMMDD'), part_day, part_day + 1
+                );
+            END LOOP;
+        END $$;
+    """)
+
+    op.execute(f"INSERT INTO metrics ({COLUMNS}) SELECT {COLUMNS} FROM metrics_legacy")
+    op.execute("SELECT setval('metrics_id_seq', COALESCE((SELECT max(id) FROM metrics), 0) + 1, false)")
+    op.execute("DROP TABLE metrics_legacy")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE metrics RENAME TO metrics_partitioned")
+    op.execute("ALTER SEQUENCE metrics_id_seq RENAME TO metrics_partitioned_id_seq")
+    op.execute("ALTER INDEX metrics_pkey RENAME TO metrics_partitioned_pkey")
+    op.execute("ALTER INDEX ix_metrics_server_id_created_at RENAME TO ix_metrics_partitioned_server_id_created_at")
+    op.create_table(
+        'metrics',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('server_id', sa.String(36), sa.ForeignKey('servers.server_id'), nullable=False),
+        sa.Column('cpu_usage', sa.Float(), nullable=False),
+        sa.Column('memory_usage', sa.Float(), nullable=False),
+        sa.Column('disk_usage', sa.Float(), nullable=False),
+        sa.Column('network_stats', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_metrics_server_id_created_at', 'metrics', ['server_id', 'created_at'])
+    op.execute(f"INSERT INTO metrics ({COLUMNS}) SELECT {COLUMNS} FROM metrics_partitioned")
+    op.execute("SELECT setval('metrics_id_seq', COALESCE((SELECT max(id) FROM metrics), 0) + 1, false)")
+    op.execute("DROP TABLE metrics_partitioned")
@@ -0,0 +1,39 @@
+"""Add metric_rollups for 1-minute, 5-minute and 1-hour aggregates.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'metric_rollups',
+        sa.Column('server_id', sa.String(36), sa.ForeignKey('servers.server_id', ondelete='CASCADE'),
+                  primary_key=True),
+        sa.Column('resolution', sa.Integer(), primary_key=True),
+        sa.Column('metric', sa.String(32), primary_key=True),
+        sa.Column('bucket_start', sa.DateTime(), primary_key=True),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('sum', sa.Float(), nullable=False),
+        sa.Column('min', sa.Float(), nullable=False),
+        sa.Column('max', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('metric_rollups')
@@ -1,6 +1,6 @@
 """Metric model for storing system metrics."""
 from typing import Any
-from sqlalchemy import Column, String, Float, Integer, ForeignKey, JSON
+from sqlalchemy import Column, String, Float, Integer, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from .base import Base
 
@@ -8,6 +8,11 @@ class Metric(Base):
     """Metric model."""
     
     __tablename__ = 'metrics'
+    # On PostgreSQL the table is range-partitioned by day on created_at,
+    # see migrations/versions/0002_partition_metrics.py and partitions.py
+    __table_args__ = (
+        Index('ix_metrics_server_id_created_at', 'server_id', 'created_at'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     server_id = Column(String(36), ForeignKey('servers.server_id'), nullable=False)
@@ -26,9 +31,18 @@ class Metric(Base):
     @classmethod
     def from_dict(cls, data: dict[str, Any]) -> 'Metric':
         """Create metric from dictionary."""
-        return cls(
-            cpu_usage=data['metrics']['cpu'],
-            memory_usage=data['metrics']['memory'],
-            disk_usage=data['metrics']['disk'],
-            network_stats=data['metrics']['network']
-        ) 
\ No newline at end of file
+        return cls(**cls.row_from_dict(data))
+
+    @staticmethod
+    def row_from_dict(data: dict[str, Any]) -> dict[str, Any]:
+        """Build a column mapping from a submission dictionary for bulk inserts."""
+        metrics = data['metrics']
+        if not isinstance(metrics.get('network'), dict):
+            raise ValueError('network must be an object')
+        return {
+            'server_id': data['server_info']['server_id'],
+            'cpu_usage': float(metrics['cpu']),
+            'memory_usage': float(metrics['memory']),
+            'disk_usage': float(metrics['disk']),
+            'network_stats': metrics['network']
+        } 
\ No newline at end of file
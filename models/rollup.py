@@ -0,0 +1,26 @@
+"""Rollup model for pre-aggregated metrics."""
+from sqlalchemy import Column, String, Float, Integer, DateTime, ForeignKey
+from .base import Base
+
+class MetricRollup(Base):
+    """Aggregate of one metric of one server over a fixed time bucket."""
+
+    __tablename__ = 'metric_rollups'
+
+    server_id = Column(String(36), ForeignKey('servers.server_id', ondelete='CASCADE'), primary_key=True)
+    resolution = Column(Integer, primary_key=True)  # Bucket width in seconds
+    metric = Column(String(32), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    count = Column(Integer, nullable=False)
+    sum = Column(Float, nullable=False)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+
+    def __repr__(self) -> str:
+        """String representation."""
+        return f'<MetricRollup {self.metric} {self.resolution}s {self.bucket_start} for server {self.server_id}>'
+
+    @property
+    def avg(self) -> float:
+        """Mean value over the bucket."""
+        return self.sum / self.count if self.count else 0.0
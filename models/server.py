@@ -1,5 +1,5 @@
 """Server model for storing server information."""
-from typing import Any
+from typing import Any, Optional, Sequence
 from sqlalchemy import Column, String
 from sqlalchemy.orm import relationship
 from .base import Base
@@ -21,8 +21,13 @@ class Server(Base):
         """String representation."""
         return f'<Server {self.hostname} ({self.ip_address})>'
 
-    def to_dict(self) -> dict[str, Any]:
-        """Convert to dictionary with additional fields."""
+    def to_dict(self, metrics: Optional[Sequence[Any]] = None) -> dict[str, Any]:
+        """Convert to dictionary, including ``metrics`` when given.
+
+        The metrics relationship is never loaded here; fetch the latest rows
+        with ``repositories.metrics.latest_metrics`` instead.
+        """
         data = super().to_dict()
-        data['metrics'] = [metric.to_dict() for metric in self.metrics[-10:]]  # Last 10 metrics
-        return data 
\ No newline at end of file
+        if metrics is not None:
+            data['metrics'] = [metric.to_dict() for metric in metrics]
+        return data
@@ -0,0 +1,162 @@
+"""Daily partition management and retention for the metrics table.
+
+Run ``python partitions.py`` periodically (for example from cron once an
+hour) to create upcoming partitions and drop expired ones.
+"""
+import os
+import re
+import logging
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+# Days of metrics to keep
+METRICS_RETENTION_DAYS = int(os.getenv('METRICS_RETENTION_DAYS', 30))
+# Days of partitions to create ahead of time
+METRICS_PARTITIONS_AHEAD = int(os.getenv('METRICS_PARTITIONS_AHEAD', 7))
+
+PARENT_TABLE = 'metrics'
+DEFAULT_PARTITION = f'{PARENT_TABLE}_default'
+PARTITION_NAME = re.compile(rf'^{PARENT_TABLE}_p(\d{{8}})$')
+
+def partition_name(day: date) -> str:
+    """Name of the partition holding one day of metrics."""
+    return f"{PARENT_TABLE}_p{day:%Y%m%d}"
+
+def partition_day(name: str) -> Optional[date]:
+    """Day covered by a partition, or None for the default partition."""
+    match = PARTITION_NAME.match(name)
+    return datetime.strptime(match.group(1), '%Y%m%d').date() if match else None
+
+def is_partitioned(conn: Connection) -> bool:
+    """Whether the metrics table is range-partitioned (PostgreSQL only)."""
+    if conn.dialect.name != 'postgresql':
+        return False
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :table"
+    ), {'table': PARENT_TABLE}).scalar())
+
+def list_partitions(conn: Connection) -> List[str]:
+    """Names of all partitions attached to the metrics table."""
+    return list(conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table ORDER BY c.relname"
+    ), {'table': PARENT_TABLE}).scalars())
+
+def has_default_rows(conn: Connection, day: date) -> bool:
+    """Whether the default partition holds rows of ``day``."""
+    return bool(conn.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end)"
+    ), {'start': day, 'end': day + timedelta(days=1)}).scalar())
+
+def default_days(conn: Connection, since: date) -> List[date]:
+    """Days from ``since`` on whose rows landed in the default partition."""
+    return list(conn.execute(text(
+        f"SELECT DISTINCT created_at::date FROM {DEFAULT_PARTITION} WHERE created_at >= :since ORDER BY 1"
+    ), {'since': since}).scalars())
+
+def create_partition(conn: Connection, day: date) -> None:
+    """Create the partition of one day, moving its rows out of the default partition first.
+
+    PostgreSQL refuses a new partition whose range overlaps rows of the
+    default partition, so such a day is filled as a plain table and attached.
+    """
+    name = partition_name(day)
+    bounds = f"FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+    if not has_default_rows(conn, day):
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} FOR VALUES {bounds}"))
+        return
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    moved = conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end "
+        f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+    ), {'start': day, 'end': day + timedelta(days=1)})
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+    logger.info("Moved %s metrics from the default partition into %s", moved.rowcount, name)
+
+def ensure_partitions(conn: Connection, start: Optional[date] = None,
+                      days_ahead: int = METRICS_PARTITIONS_AHEAD,
+                      retention_days: int = METRICS_RETENTION_DAYS) -> List[str]:
+    """Create the daily partitions from ``start`` (today by default) onwards.
+
+    Days within the retention window whose rows fell into the default
+    partition, for example while maintenance did not run, get their
+    partition too. A day that cannot be created is logged and skipped.
+    """
+    if not is_partitioned(conn):
+        return []
+    start = start or datetime.utcnow().date()
+    existing = set(list_partitions(conn))
+    days = {start + timedelta(days=offset) for offset in range(days_ahead + 1)}
+    days.update(default_days(conn, start - timedelta(days=retention_days)))
+    created = []
+    for day in sorted(days):
+        name = partition_name(day)
+        if name in existing:
+            continue
+        try:
+            with conn.begin_nested():
+                create_partition(conn, day)
+        except SQLAlchemyError as e:
+            logger.error("Failed to create metrics partition %s: %s", name, e)
+            continue
+        created.append(name)
+    if created:
+        logger.info("Created metrics partitions: %s", ', '.join(created))
+    return created
+
+def drop_expired_partitions(conn: Connection, retention_days: int = METRICS_RETENTION_DAYS,
+                            today: Optional[date] = None) -> List[str]:
+    """Detach and drop whole partitions older than the retention window.
+
+    Dropping a partition is a metadata operation, unlike a row-by-row DELETE
+    it does not scan, lock or bloat the remaining data.
+    """
+    if not is_partitioned(conn):
+        return []
+    cutoff = (today or datetime.utcnow().date()) - timedelta(days=retention_days)
+    dropped = []
+    for name in list_partitions(conn):
+        day = partition_day(name)
+        if day is None or day >= cutoff:
+            continue
+        conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+        conn.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    if dropped:
+        logger.info("Dropped expired metrics partitions: %s", ', '.join(dropped))
+    return dropped
+
+def prune_default_partition(conn: Connection, retention_days: int = METRICS_RETENTION_DAYS,
+                            today: Optional[date] = None) -> int:
+    """Delete rows of the default partition older than the retention window.
+
+    Dropping partitions never reaches them, so they are deleted row by row;
+    the default partition only holds rows that missed their daily partition.
+    """
+    if not is_partitioned(conn):
+        return 0
+    cutoff = (today or datetime.utcnow().date()) - timedelta(days=retention_days)
+    result = conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at < :cutoff"), {'cutoff': cutoff})
+    return result.rowcount or 0
+
+def run_maintenance() -> None:
+    """Create upcoming partitions, drop expired ones and prune old rollups."""
+    from database import engine
+    from analytics.rollups import prune_rollups
+    with engine.begin() as conn:
+        ensure_partitions(conn)
+        drop_expired_partitions(conn)
+        logger.info("Pruned %d expired metrics from the default partition", prune_default_partition(conn))
+        logger.info("Pruned %d expired rollup buckets", prune_rollups(conn))
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    run_maintenance()
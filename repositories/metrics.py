@@ -0,0 +1,56 @@
+"""Queries reading metrics for many servers at once."""
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence
+from sqlalchemy import Select, func, select, true
+from sqlalchemy.orm import Session, aliased
+from models.metric import Metric
+from models.server import Server
+
+# Metrics returned with each server
+LATEST_METRICS_COUNT = 10
+
+def latest_metrics_statement(dialect: str, server_ids: Optional[Sequence[str]] = None,
+                             limit: int = LATEST_METRICS_COUNT) -> Select:
+    """Select the newest ``limit`` metrics of each server in a single statement.
+
+    PostgreSQL runs a LATERAL subquery per server, an index scan of
+    ``(server_id, created_at)`` that stops after ``limit`` rows. Other
+    databases rank rows with ROW_NUMBER instead.
+    """
+    newest_first = (Metric.created_at.desc(), Metric.id.desc())
+    if dialect == 'postgresql':
+        servers = select(Server.server_id)
+        if server_ids is not None:
+            servers = servers.where(Server.server_id.in_(server_ids))
+        servers = servers.subquery()
+        latest = (
+            select(Metric)
+            .where(Metric.server_id == servers.c.server_id)
+            .order_by(*newest_first)
+            .limit(limit)
+            .lateral()
+        )
+        row = aliased(Metric, latest)
+        stmt = select(row).select_from(servers).join(latest, true())
+    else:
+        ranked = select(
+            Metric,
+            func.row_number().over(partition_by=Metric.server_id, order_by=newest_first).label('rank')
+        )
+        if server_ids is not None:
+            ranked = ranked.where(Metric.server_id.in_(server_ids))
+        ranked = ranked.subquery()
+        row = aliased(Metric, ranked)
+        stmt = select(row).where(ranked.c.rank <= limit)
+    return stmt.order_by(row.server_id, row.created_at, row.id)
+
+def latest_metrics(db: Session, server_ids: Optional[Sequence[str]] = None,
+                   limit: int = LATEST_METRICS_COUNT) -> Dict[str, List[Metric]]:
+    """Newest ``limit`` metrics per server, oldest first, for the given or all servers."""
+    if server_ids is not None and not server_ids:
+        return {}
+    stmt = latest_metrics_statement(db.get_bind().dialect.name, server_ids, limit)
+    result: Dict[str, List[Metric]] = defaultdict(list)
+    for metric in db.execute(stmt).scalars():
+        result[metric.server_id].append(metric)
+    return dict(result)
@@ -0,0 +1,70 @@
+"""Tests for batched metric delivery from the agent."""
+import gzip
+import json
+import pytest
+from unittest.mock import MagicMock
+from agents.spool import MetricsSpool
+from agents.system_metrics_agent import send_batch
+
+def make_batch(mock_server_info, mock_metrics, count=3):
+    """Build a batch of identical samples."""
+    return {
+        'server_info': mock_server_info,
+        'samples': [{'timestamp': '2024-01-01 00:00:00', 'metrics': mock_metrics}] * count
+    }
+
+@pytest.mark.unit
+def test_spool_replays_in_order(tmp_path):
+    """Test that spooled batches are replayed oldest first and removed once sent."""
+    spool = MetricsSpool(str(tmp_path / 'spool.jsonl'))
+    for i in range(3):
+        spool.append({'id': i})
+
+    sent = []
+    assert spool.replay(lambda batch: sent.append(batch['id']) or True)
+    assert sent == [0, 1, 2]
+    assert len(spool) == 0
+
+@pytest.mark.unit
+def test_spool_keeps_unsent_batches(tmp_path):
+    """Test that replay stops at the first failure and keeps the rest."""
+    spool = MetricsSpool(str(tmp_path / 'spool.jsonl'))
+    for i in range(3):
+        spool.append({'id': i})
+
+    assert not spool.replay(lambda batch: batch['id'] == 0)
+    assert len(spool) == 2
+
+@pytest.mark.unit
+def test_spool_is_bounded(tmp_path):
+    """Test that the oldest batches are dropped when the spool is full."""
+    spool = MetricsSpool(str(tmp_path / 'spool.jsonl'), max_bytes=50)
+    for i in range(10):
+        spool.append({'id': i})
+
+    sent = []
+    spool.replay(lambda batch: sent.append(batch['id']) or True)
+    assert sent[-1] == 9
+    assert 0 not in sent
+    assert len(sent) * len('{"id":0}\n') <= 50
+
+@pytest.mark.unit
+def test_send_batch_compresses_payload(mock_server_info, mock_metrics):
+    """Test that batches are posted gzip-compressed over the session."""
+    session = MagicMock()
+    session.post.return_value.status_code = 200
+    batch = make_batch(mock_server_info, mock_metrics)
+
+    assert send_batch(session, 'http://dashboard/metrics', batch)
+    body = session.post.call_args.kwargs['data']
+    assert json.loads(gzip.decompress(body)) == batch
+
+@pytest.mark.unit
+def test_send_batch_retries_server_errors(mock_server_info, mock_metrics):
+    """Test that server errors ask for a retry while client errors do not."""
+    session = MagicMock()
+    session.post.return_value.status_code = 503
+    assert not send_batch(session, 'http://dashboard/metrics', make_batch(mock_server_info, mock_metrics))
+
+    session.post.return_value.status_code = 400
+    assert send_batch(session, 'http://dashboard/metrics', make_batch(mock_server_info, mock_metrics))
@@ -0,0 +1,89 @@
+"""Tests for the asynchronous alert dispatcher."""
+import threading
+import pytest
+from unittest.mock import patch, MagicMock
+from alerts.dispatcher import AlertDispatcher
+
+SMTP_SETTINGS = {
+    'server': 'smtp.example.com',
+    'port': 587,
+    'user': 'alerts@example.com',
+    'password': 'secret'
+}
+
+def make_alert(mock_server_info, mock_metrics):
+    """Build an alert payload."""
+    return {
+        'server_info': mock_server_info,
+        'anomalies': {'cpu': mock_metrics['cpu']},
+        'timestamp': '2024-01-01 00:00:00'
+    }
+
+@pytest.mark.unit
+def test_alerts_share_one_smtp_session(mock_server_info, mock_metrics):
+    """Test that queued alerts reuse a single SMTP connection."""
+    smtp = MagicMock()
+    with patch('alerts.dispatcher.get_smtp_settings', return_value=SMTP_SETTINGS), \
+         patch('smtplib.SMTP', return_value=smtp) as smtp_cls:
+        dispatcher = AlertDispatcher(workers=1)
+        for _ in range(3):
+            assert dispatcher.submit(make_alert(mock_server_info, mock_metrics))
+        dispatcher.stop()
+
+    smtp_cls.assert_called_once()
+    smtp.login.assert_called_once_with('alerts@example.com', 'secret')
+    assert smtp.send_message.call_count == 3
+
+@pytest.mark.unit
+def test_full_queue_drops_without_blocking(mock_server_info, mock_metrics):
+    """Test that a full queue drops alerts instead of blocking the caller."""
+    dispatcher = AlertDispatcher(workers=1, maxsize=1)
+    with patch.object(dispatcher, 'start'):
+        assert dispatcher.submit(make_alert(mock_server_info, mock_metrics))
+        assert not dispatcher.submit(make_alert(mock_server_info, mock_metrics))
+    assert dispatcher.queue.qsize() == 1
+
+@pytest.mark.unit
+def test_digests_are_sent_as_one_email(mock_server_info):
+    """Test that a digest is delivered as a single digest email."""
+    smtp = MagicMock()
+    digest = {
+        'events': [
+            {'server_info': mock_server_info, 'metric': 'cpu', 'status': 'firing',
+             'value': 95.0, 'since': 0.0, 'timestamp': 10.0}
+        ],
+        'active': 1,
+        'timestamp': 10.0
+    }
+    with patch('alerts.dispatcher.get_smtp_settings', return_value=SMTP_SETTINGS), \
+         patch('smtplib.SMTP', return_value=smtp):
+        dispatcher = AlertDispatcher(workers=1)
+        assert dispatcher.submit(digest)
+        dispatcher.stop()
+
+    message = smtp.send_message.call_args[0][0]
+    assert message['Subject'] == 'System Alert Digest: 1 changes, 1 active'
+
+@pytest.mark.unit
+def test_stop_with_a_full_queue(mock_server_info, mock_metrics):
+    """Test that stop neither raises nor hangs on a full queue, and workers still drain it."""
+    busy, release = threading.Event(), threading.Event()
+    delivered = []
+
+    def deliver(*args):
+        busy.set()
+        delivered.append(release.wait(5))
+
+    dispatcher = AlertDispatcher(workers=1, maxsize=1)
+    with patch('alerts.dispatcher.get_smtp_settings', return_value=SMTP_SETTINGS), \
+         patch.object(dispatcher, '_deliver', side_effect=deliver):
+        assert dispatcher.submit(make_alert(mock_server_info, mock_metrics))
+        busy.wait(5)
+        assert dispatcher.submit(make_alert(mock_server_info, mock_metrics))
+        workers = list(dispatcher._threads)
+        dispatcher.stop(timeout=0.1)
+
+        release.set()
+        workers[0].join(5)
+    assert not workers[0].is_alive()
+    assert len(delivered) == 2
@@ -0,0 +1,97 @@
+"""Tests for the alert state machine and digests."""
+import time
+import pytest
+from unittest.mock import MagicMock
+from alerts.alert_state import AlertStateManager, FIRING, RESOLVED
+from alerts.alert_manager import format_digest_message
+
+def make_manager(**kwargs):
+    """Build a manager whose digests are captured."""
+    submit = MagicMock()
+    options = {'fire_after': 3, 'resolve_after': 2, 'digest_interval': 60}
+    options.update(kwargs)
+    return AlertStateManager(submit, **options), submit
+
+@pytest.mark.unit
+def test_alert_fires_after_consecutive_breaches(mock_server_info):
+    """Test that a breach streak interrupted by a clear sample starts over."""
+    manager, _ = make_manager()
+    assert manager.observe(mock_server_info, 1, {'cpu': 95}) == []
+    assert manager.observe(mock_server_info, 2, {'cpu': 96}) == []
+    assert manager.observe(mock_server_info, 3, {}) == []
+    assert manager.observe(mock_server_info, 4, {'cpu': 95}) == []
+    assert manager.observe(mock_server_info, 5, {'cpu': 95}) == []
+
+    events = manager.observe(mock_server_info, 6, {'cpu': 97})
+    assert [(e['metric'], e['status'], e['value'], e['since']) for e in events] == [('cpu', FIRING, 97, 4)]
+    assert manager.active_count() == 1
+
+@pytest.mark.unit
+def test_firing_alert_is_suppressed_until_resolved(mock_server_info):
+    """Test that repeats send nothing and resolution needs consecutive clear samples."""
+    manager, _ = make_manager(fire_after=1)
+    manager.observe(mock_server_info, 1, {'cpu': 95})
+    for t in range(2, 100):
+        assert manager.observe(mock_server_info, t, {'cpu': 95}) == []
+
+    assert manager.observe(mock_server_info, 100, {}) == []
+    # A breach between clear samples keeps the alert firing
+    assert manager.observe(mock_server_info, 101, {'cpu': 95}) == []
+    assert manager.observe(mock_server_info, 102, {}) == []
+    events = manager.observe(mock_server_info, 103, {})
+    assert [(e['metric'], e['status']) for e in events] == [('cpu', RESOLVED)]
+    assert manager.active() == []
+
+@pytest.mark.unit
+def test_transitions_are_batched_into_digests(mock_server_info):
+    """Test that every transition of an interval goes out in one digest."""
+    manager, submit = make_manager(fire_after=1)
+    for i in range(5):
+        manager.observe({**mock_server_info, 'server_id': f'srv-{i}'}, 1, {'cpu': 95, 'memory': 92})
+
+    assert manager.flush_if_due() is None
+    submit.assert_not_called()
+    digest = manager.flush()
+    submit.assert_called_once_with(digest)
+    assert len(digest['events']) == 10
+    assert digest['active'] == 10
+    assert manager.flush() is None
+
+    message = format_digest_message(digest)
+    assert '10 fired, 0 resolved, 10 active' in message
+    assert '[FIRING] test-server (192.168.1.100) CPU: 95' in message
+
+@pytest.mark.unit
+def test_zero_interval_sends_right_away(mock_server_info):
+    """Test that digests are due on every call without an interval."""
+    manager, submit = make_manager(fire_after=1, digest_interval=0)
+    manager.observe(mock_server_info, 1, {'cpu': 95})
+    assert manager.flush_if_due() is not None
+    submit.assert_called_once()
+
+@pytest.mark.unit
+def test_active_count_follows_resolves_and_forgets(mock_server_info):
+    """Test that the firing count drops when alerts resolve or their server is forgotten."""
+    manager, _ = make_manager(fire_after=1, resolve_after=1)
+    manager.observe(mock_server_info, 1, {'cpu': 95, 'memory': 92})
+    manager.observe({**mock_server_info, 'server_id': 'srv-2'}, 1, {'cpu': 95})
+    assert manager.active_count() == 3
+
+    manager.observe(mock_server_info, 2, {'cpu': 95})
+    assert manager.active_count() == 2
+    manager.forget('srv-2')
+    assert manager.active_count() == 1
+
+@pytest.mark.unit
+def test_digests_are_sent_without_samples(mock_server_info):
+    """Test that the digest thread submits pending transitions when no samples arrive."""
+    manager, submit = make_manager(fire_after=1, digest_interval=0.01)
+    manager.observe(mock_server_info, 1, {'cpu': 95})
+    manager.start()
+    deadline = time.monotonic() + 5
+    while not submit.called and time.monotonic() < deadline:
+        time.sleep(0.01)
+    manager.stop()
+
+    submit.assert_called_once()
+    assert submit.call_args[0][0]['events'][0]['status'] == FIRING
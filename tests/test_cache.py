@@ -0,0 +1,208 @@
+"""Tests for response caching and generation-based invalidation."""
+import json
+import time
+import threading
+from unittest.mock import patch
+import pytest
+from flask import Flask
+import cache.redis_config as redis_config
+from cache.redis_config import cache_response, invalidate_cache_prefix, local_cache
+from cache.local_cache import LocalCache, SingleFlight
+
+class FakeRedis:
+    """Dictionary-backed stand-in for the Redis commands used by the cache."""
+
+    def __init__(self):
+        self.data = {}
+        self.commands = []
+
+    def get(self, key):
+        self.commands.append('get')
+        return self.data.get(key)
+
+    def mget(self, keys):
+        self.commands.append('mget')
+        return [self.data.get(key) for key in keys]
+
+    def setex(self, key, expire, value):
+        self.commands.append('setex')
+        self.data[key] = value
+
+    def set(self, key, value, nx=False):
+        self.commands.append('set')
+        if not (nx and key in self.data):
+            self.data[key] = str(value)
+
+    def incr(self, key):
+        self.commands.append('incr')
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+
+    def expire(self, key, seconds):
+        self.commands.append('expire')
+
+    def keys(self, pattern):
+        raise AssertionError('KEYS must not be used')
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def lock(self, name, timeout=None, blocking=True):
+        return FakeLock(self, name)
+
+    def execute(self):
+        return []
+
+class FakeLock:
+    """Non-blocking lock stored as a key of the fake client."""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def acquire(self):
+        if self.name in self.client.data:
+            return False
+        self.client.data[self.name] = 'locked'
+        return True
+
+    def release(self):
+        self.client.data.pop(self.name, None)
+
+app = Flask(__name__)
+
+@pytest.fixture
+def fake_redis():
+    """Patch the cache module's Redis client with an in-memory fake and empty the local tier."""
+    client = FakeRedis()
+    local_cache.clear()
+    with patch.object(redis_config, 'redis_client', client), app.test_request_context():
+        yield client
+    local_cache.clear()
+
+class Resource:
+    """Minimal resource whose calls are counted."""
+
+    def __init__(self):
+        self.calls = 0
+
+    @cache_response('servers:detail', 60)
+    def get(self, server_id):
+        self.calls += 1
+        return {'server_id': server_id, 'calls': self.calls}
+
+    def calls_seen(self, server_id):
+        """Call count in the body returned for a server."""
+        return self.get(server_id=server_id).get_json()['calls']
+
+@pytest.mark.unit
+def test_responses_are_cached_per_url_parameter(fake_redis):
+    """Test that repeated calls hit the cache regardless of the resource instance."""
+    first = Resource()
+    assert first.get(server_id='srv-1').get_json() == {'server_id': 'srv-1', 'calls': 1}
+    assert Resource().get(server_id='srv-1').get_json() == {'server_id': 'srv-1', 'calls': 1}
+    assert first.get(server_id='srv-2').get_json() == {'server_id': 'srv-2', 'calls': 2}
+
+@pytest.mark.unit
+def test_invalidation_bumps_generations(fake_redis):
+    """Test that invalidating a prefix or one of its keys misses only the affected entries."""
+    resource = Resource()
+    resource.get(server_id='srv-1')
+    resource.get(server_id='srv-2')
+
+    invalidate_cache_prefix('servers:detail:srv-1')
+    assert resource.calls_seen('srv-1') == 3
+    assert resource.calls_seen('srv-2') == 2
+
+    invalidate_cache_prefix('servers:detail')
+    assert resource.calls_seen('srv-2') == 4
+    assert 'incr' in fake_redis.commands
+
+@pytest.mark.unit
+def test_local_tier_skips_redis(fake_redis):
+    """Test that a hit in the in-process tier makes no Redis call."""
+    resource = Resource()
+    resource.get(server_id='srv-1')
+    fake_redis.commands.clear()
+
+    assert resource.calls_seen('srv-1') == 1
+    assert fake_redis.commands == []
+
+@pytest.mark.unit
+def test_stale_entries_are_served_while_locked(fake_redis):
+    """Test that an expired entry is served when another process holds the refresh lock."""
+    resource = Resource()
+    resource.get(server_id='srv-1')
+    local_cache.clear()
+    cache_key = redis_config.versioned_key('servers:detail', 'srv-1')
+    entry = json.loads(fake_redis.data[cache_key])
+    fake_redis.data[cache_key] = json.dumps({**entry, 'fresh_until': time.time() - 1})
+    fake_redis.data[f'lock:{cache_key}'] = 'locked'
+
+    assert resource.calls_seen('srv-1') == 1
+
+    del fake_redis.data[f'lock:{cache_key}']
+    local_cache.clear()
+    assert resource.calls_seen('srv-1') == 2
+
+@pytest.mark.unit
+def test_local_cache_lru_and_ttl():
+    """Test size-bounded eviction and the stale window."""
+    cache = LocalCache(maxsize=2, ttl=60, stale_ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == (1, True)
+
+    cache.set('d', 4, ttl=0)
+    assert cache.get('d') == (4, False)
+
+@pytest.mark.unit
+def test_single_flight_shares_one_computation():
+    """Test that concurrent callers for a key share the leader's result."""
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'value'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('key', compute)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do('key', compute))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    # Give the followers time to join the running computation
+    time.sleep(0.1)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert results == ['value'] * 4
+    assert len(calls) == 1
+    assert not flight.in_flight('key')
+
+@pytest.mark.unit
+def test_etag_and_not_modified(fake_redis):
+    """Test that hits carry an ETag and a matching If-None-Match gets an empty 304."""
+    resource = Resource()
+    etag = resource.get(server_id='srv-1').get_etag()[0]
+    assert etag
+
+    with app.test_request_context(headers={'If-None-Match': f'"{etag}"'}):
+        response = resource.get(server_id='srv-1')
+    assert response.status_code == 304
+    assert resource.calls == 1
+
+    invalidate_cache_prefix('servers:detail:srv-1')
+    with app.test_request_context(headers={'If-None-Match': f'"{etag}"'}):
+        response = resource.get(server_id='srv-1')
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
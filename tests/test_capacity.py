@@ -0,0 +1,73 @@
+"""Tests for capacity forecasting."""
+import numpy as np
+import pytest
+from analytics.capacity import CapacityPlanner, seconds_to_threshold
+from prometheus_client import CollectorRegistry
+
+START = 1_700_000_000.0
+
+def feed(planner, server_id, disk, memory, samples=20, step=60):
+    """Feed linearly changing usage, ``disk`` and ``memory`` being (start, change per sample)."""
+    for i in range(samples):
+        planner.observe(server_id, START + i * step, {
+            'disk': disk[0] + disk[1] * i,
+            'memory': memory[0] + memory[1] * i
+        })
+
+@pytest.mark.unit
+def test_seconds_to_threshold():
+    """Test growing, shrinking, exhausted and unknown series."""
+    seconds = seconds_to_threshold(
+        np.array([50.0, 50.0, 97.0, np.nan]),
+        np.array([0.01, -0.01, 0.01, 0.01]),
+        np.full(4, 95.0)
+    )
+    np.testing.assert_array_equal(seconds, [4500.0, np.inf, 0.0, np.nan])
+
+@pytest.mark.unit
+def test_estimates_follow_the_trend():
+    """Test that time to threshold and its absolute time come from the fitted line."""
+    planner = CapacityPlanner(thresholds={'disk': 95, 'memory': 95}, window=100)
+    feed(planner, 'srv-1', disk=(50, 0.5), memory=(40, 0))
+
+    report = planner.report()[0]
+    last = START + 19 * 60
+    assert report['disk']['current'] == pytest.approx(59.5)
+    assert report['disk']['rate_per_hour'] == pytest.approx(30.0)
+    assert report['disk']['seconds_to_threshold'] == pytest.approx(35.5 / 0.5 * 60)
+    assert report['disk']['exhausted_at'] == pytest.approx(last + 35.5 / 0.5 * 60)
+    assert report['memory']['seconds_to_threshold'] is None
+
+@pytest.mark.unit
+def test_report_sorts_by_soonest_exhaustion():
+    """Test default and per-resource ordering, with non-growing servers last."""
+    planner = CapacityPlanner(thresholds={'disk': 95, 'memory': 95}, window=100)
+    feed(planner, 'disk-soon', disk=(80, 0.5), memory=(40, 0))
+    feed(planner, 'memory-soon', disk=(50, 0.1), memory=(80, 1))
+    feed(planner, 'flat', disk=(50, 0), memory=(50, 0))
+
+    assert [r['server_id'] for r in planner.report()] == ['memory-soon', 'disk-soon', 'flat']
+    assert [r['server_id'] for r in planner.report(sort='disk')] == ['disk-soon', 'memory-soon', 'flat']
+    descending = planner.report(sort='disk', descending=True)
+    assert [r['server_id'] for r in descending] == ['memory-soon', 'disk-soon', 'flat']
+    assert len(planner.report(limit=1)) == 1
+    with pytest.raises(ValueError):
+        planner.report(sort='cpu')
+
+@pytest.mark.unit
+def test_estimates_are_collected_for_recent_servers():
+    """Test that estimates are exported per server at scrape time and dropped once stale."""
+    planner = CapacityPlanner(thresholds={'disk': 95, 'memory': 95}, window=100, max_age=60)
+    registry = CollectorRegistry()
+    registry.register(planner)
+    feed(planner, 'gauge-srv', disk=(50, 0.5), memory=(40, 0))
+    labels = {'server_id': 'gauge-srv', 'metric': 'disk'}
+
+    assert registry.get_sample_value('capacity_seconds_to_threshold', labels) == pytest.approx(4260.0)
+    assert registry.get_sample_value('capacity_seconds_to_threshold',
+                                     {'server_id': 'gauge-srv', 'metric': 'memory'}) == float('inf')
+
+    planner.max_age = -1
+    assert registry.get_sample_value('capacity_seconds_to_threshold', labels) is None
+    planner.forget('gauge-srv')
+    assert planner.report() == []
@@ -0,0 +1,58 @@
+"""Tests for the background metrics sampler."""
+import time
+import pytest
+from agents.collectors import Collector, MetricsSampler, build_collectors
+
+class CountingCollector(Collector):
+    """Collector that reports how often it ran."""
+
+    name = 'counter'
+
+    def __init__(self, interval):
+        super().__init__(interval)
+        self.calls = 0
+
+    def collect(self):
+        self.calls += 1
+        return {'counter': self.calls}
+
+class FailingCollector(Collector):
+    """Collector that always raises."""
+
+    name = 'failing'
+
+    def collect(self):
+        raise RuntimeError('boom')
+
+@pytest.mark.unit
+def test_start_takes_first_sample():
+    """Test that the snapshot is complete as soon as the sampler starts."""
+    sampler = MetricsSampler(build_collectors(['cpu', 'memory', 'disk', 'network']))
+    sampler.start()
+    try:
+        snapshot = sampler.snapshot()
+        assert 0 <= snapshot['cpu'] <= 100
+        assert 0 <= snapshot['memory'] <= 100
+        assert 0 <= snapshot['disk'] <= 100
+        assert set(snapshot['network']) == {'bytes_sent', 'bytes_recv'}
+    finally:
+        sampler.stop()
+
+@pytest.mark.unit
+def test_collectors_run_on_their_interval():
+    """Test that fast collectors keep updating and failures are isolated."""
+    fast = CountingCollector(0.01)
+    sampler = MetricsSampler([fast, FailingCollector(0.01)])
+    sampler.start()
+    time.sleep(0.2)
+    sampler.stop()
+
+    assert fast.calls > 3
+    assert sampler.snapshot()['counter'] == fast.calls
+    assert 'failing' not in sampler.snapshot()
+
+@pytest.mark.unit
+def test_unknown_collector_is_rejected():
+    """Test that misconfigured collector names fail loudly."""
+    with pytest.raises(ValueError):
+        build_collectors(['cpu', 'gpu'])
@@ -0,0 +1,52 @@
+"""Tests for the cached and compressed metrics exposition."""
+import gzip
+import pytest
+from flask import Flask
+from prometheus_client import CollectorRegistry, Counter
+from metrics.exposition import ExpositionCache
+
+@pytest.fixture
+def exposed():
+    """A registry with one counter, served through an exposition cache by a test app."""
+    registry = CollectorRegistry()
+    requests_total = Counter('test_requests_total', 'Test requests', registry=registry)
+    cache = ExpositionCache(registry, ttl=60)
+    app = Flask(__name__)
+    app.add_url_rule('/metrics', 'metrics', cache.response)
+    return app.test_client(), cache, requests_total, registry
+
+@pytest.mark.unit
+def test_renders_are_reused_within_ttl(exposed):
+    """Test that scrapes within the TTL get the same render, and a TTL of 0 renders every time."""
+    client, cache, requests_total, registry = exposed
+    first = client.get('/metrics').data
+    requests_total.inc()
+    assert client.get('/metrics').data == first
+    assert registry.get_sample_value('metrics_exposition_duration_seconds_count', {'format': 'prometheus'}) == 1
+
+    cache.ttl = 0
+    assert b'test_requests_total 1.0' in client.get('/metrics').data
+
+@pytest.mark.unit
+def test_gzip_when_accepted(exposed):
+    """Test that scrapers accepting gzip get a compressed copy of the same render."""
+    client, _, _, registry = exposed
+    plain = client.get('/metrics')
+    compressed = client.get('/metrics', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == plain.data
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert registry.get_sample_value('metrics_exposition_bytes',
+                                     {'format': 'prometheus', 'encoding': 'gzip'}) == len(compressed.data)
+
+@pytest.mark.unit
+def test_openmetrics_negotiation(exposed):
+    """Test that OpenMetrics scrapers get the OpenMetrics format."""
+    client, _, _, _ = exposed
+    response = client.get('/metrics', headers={'Accept': 'application/openmetrics-text; version=0.0.1'})
+
+    assert response.content_type.startswith('application/openmetrics-text')
+    assert response.data.endswith(b'# EOF\n')
+    assert client.get('/metrics').content_type.startswith('text/plain')
@@ -0,0 +1,131 @@
+"""Tests for vectorized fleet anomaly detection."""
+import io
+import json
+from contextlib import nullcontext
+from unittest.mock import patch
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from datetime import datetime
+from models.base import Base
+from models.server import Server
+from models.metric import Metric
+from metrics.history import HistoryStore
+from analytics.fleet_detection import (
+    DETECTION_METRICS,
+    ThresholdConfig,
+    FleetDetector,
+    load_thresholds,
+    scan,
+    history_chunks,
+    backfill,
+    run_backfill
+)
+
+def sample(cpu, memory=50.0, disk=50.0, sent_rate=None):
+    """Build an agent-shaped sample."""
+    return {'cpu': cpu, 'memory': memory, 'disk': disk,
+            'network': {'bytes_sent': 0, 'bytes_recv': 0, 'bytes_sent_rate': sent_rate, 'bytes_recv_rate': None}}
+
+@pytest.mark.unit
+def test_thresholds_resolve_defaults_groups_and_servers():
+    """Test that server overrides beat group overrides, which beat the defaults."""
+    config = ThresholdConfig(groups={'db': {'cpu': 95, 'memory': 97}},
+                             servers={'db-1': {'cpu': 99}},
+                             membership={'db-1': 'db', 'db-2': 'db'})
+    matrix = config.matrix(['web-1', 'db-1', 'db-2'])
+    cpu, memory = DETECTION_METRICS.index('cpu'), DETECTION_METRICS.index('memory')
+    assert matrix[:, cpu].tolist() == [80, 99, 95]
+    assert matrix[:, memory].tolist() == [90, 97, 97]
+
+    with pytest.raises(ValueError):
+        config.set_server('web-1', {'unknown': 1})
+
+@pytest.mark.unit
+def test_fleet_detector_masks_whole_fleet():
+    """Test that one evaluation flags every server against its own thresholds."""
+    config = ThresholdConfig(servers={'busy': {'cpu': 95}})
+    detector = FleetDetector(config, capacity=1)
+    detector.update('quiet', sample(85.0))
+    detector.update('busy', sample(85.0, sent_rate=2e6))
+    detector.update('idle', sample(5.0))
+
+    assert detector.anomalies() == {
+        'quiet': {'cpu': 85.0},
+        'busy': {'bytes_sent_rate': 2e6}
+    }
+
+    # Threshold changes apply on the next evaluation
+    config.set_server('quiet', {'cpu': None})
+    assert 'quiet' not in detector.anomalies()
+
+    detector.remove('busy')
+    server_ids, _, mask = detector.evaluate()
+    assert server_ids == ['quiet', 'idle']
+    assert not mask.any()
+
+@pytest.mark.unit
+def test_rescan_history_in_chunks():
+    """Test that stored history is re-scanned chunk by chunk."""
+    store = HistoryStore(capacity=10)
+    for i in range(10):
+        store.append('srv-1', 1000.0 + i, sample(70.0 + 2 * i))
+    store.append('srv-2', 1000.0, sample(99.0))
+
+    results = list(scan(history_chunks(store, chunk_size=4), ThresholdConfig()))
+    server_ids = np.concatenate([r[0] for r in results]).tolist()
+    timestamps = np.concatenate([r[1] for r in results]).tolist()
+    assert server_ids == ['srv-1'] * 4 + ['srv-2']
+    assert timestamps == [1006.0, 1007.0, 1008.0, 1009.0, 1000.0]
+
+def stored_metrics():
+    """Session on a sqlite database holding three CPU samples of one server."""
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add(Server(server_id='srv-1', hostname='h', ip_address='10.0.0.1', os_info='Linux'))
+    for i, cpu in enumerate([50.0, 75.0, 90.0]):
+        db.add(Metric(server_id='srv-1', cpu_usage=cpu, memory_usage=10.0, disk_usage=10.0,
+                      network_stats={'bytes_recv_rate': None}, created_at=datetime(2024, 1, 1, 0, 0, i)))
+    db.commit()
+    return db
+
+@pytest.mark.unit
+def test_backfill_stored_metrics():
+    """Test detection over the metrics table after thresholds change."""
+    db = stored_metrics()
+    config = ThresholdConfig(defaults={'cpu': 70})
+    found = list(backfill(db, config, chunk_size=2))
+    assert [item['anomalies'] for item in found] == [{'cpu': 75.0}, {'cpu': 90.0}]
+
+@pytest.mark.unit
+def test_run_backfill_writes_json_lines():
+    """Test that the command line backfill prints the anomalous samples in the time range."""
+    db = stored_metrics()
+    out = io.StringIO()
+    with patch('database.get_db', return_value=nullcontext(db)), \
+         patch('analytics.fleet_detection.load_thresholds', return_value=ThresholdConfig(defaults={'cpu': 70})):
+        assert run_backfill(datetime(2024, 1, 1, 0, 0, 2), out=out) == 1
+    assert [json.loads(line)['anomalies'] for line in out.getvalue().splitlines()] == [{'cpu': 90.0}]
+
+@pytest.mark.unit
+def test_load_thresholds_from_file(tmp_path):
+    """Test the JSON threshold file format."""
+    path = tmp_path / 'thresholds.json'
+    path.write_text(json.dumps({'defaults': {'network': {'bytes_recv_rate': 5e6}},
+                                'groups': {'db': {'disk': 95}}, 'membership': {'db-1': 'db'}}))
+    config = load_thresholds(str(path))
+    row = dict(zip(DETECTION_METRICS, config.row('db-1')))
+    assert row['disk'] == 95 and row['bytes_recv_rate'] == 5e6 and row['cpu'] == 80
+
+@pytest.mark.unit
+def test_nested_network_overrides():
+    """Test that nested network thresholds are accepted in every section."""
+    config = ThresholdConfig.from_dict({
+        'groups': {'web': {'network': {'bytes_sent_rate': 2e6}}},
+        'servers': {'web-1': {'network': {'bytes_recv_rate': 3e6}}},
+        'membership': {'web-1': 'web'}
+    })
+    row = dict(zip(DETECTION_METRICS, config.row('web-1')))
+    assert row['bytes_sent_rate'] == 2e6 and row['bytes_recv_rate'] == 3e6 and row['cpu'] == 80
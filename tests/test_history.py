@@ -0,0 +1,47 @@
+"""Tests for the in-memory metric history store."""
+import pytest
+import numpy as np
+from metrics.history import MetricHistory, HistoryStore, flatten_metrics, FIELDS
+
+@pytest.mark.unit
+def test_flatten_metrics(mock_metrics):
+    """Test that nested agent metrics flatten into the column order."""
+    assert flatten_metrics(mock_metrics)[:5] == [45.5, 60.0, 75.2, 1024.0, 2048.0]
+    assert np.isnan(flatten_metrics(mock_metrics)[5])
+    assert np.isnan(flatten_metrics({'cpu': 1.0})[1])
+
+@pytest.mark.unit
+def test_ring_buffer_keeps_latest_samples():
+    """Test that the buffer wraps and keeps the most recent samples in order."""
+    history = MetricHistory(capacity=4)
+    for i in range(10):
+        history.append(float(i), [i] * len(FIELDS))
+
+    assert len(history) == 4
+    assert history.column('timestamp').tolist() == [6.0, 7.0, 8.0, 9.0]
+    assert history.column('cpu', 2).tolist() == [8.0, 9.0]
+
+@pytest.mark.unit
+def test_window_is_a_view():
+    """Test that windows are returned without copying, even after wrapping."""
+    history = MetricHistory(capacity=3)
+    for i in range(5):
+        history.append(float(i), [i] * len(FIELDS))
+
+    window = history.window(3)
+    assert window.shape == (len(FIELDS) + 1, 3)
+    assert np.shares_memory(window, history.window())
+
+@pytest.mark.unit
+def test_store_samples_match_agent_shape(mock_metrics):
+    """Test that samples are returned in the agent payload shape."""
+    store = HistoryStore(capacity=10)
+    store.append('srv-1', '2024-01-01 12:00:00', mock_metrics)
+
+    assert 'srv-1' in store
+    latest = store.get('srv-1').latest()
+    assert latest['timestamp'] == '2024-01-01 12:00:00'
+    assert latest['metrics']['cpu'] == mock_metrics['cpu']
+    assert latest['metrics']['network']['bytes_recv'] == mock_metrics['network']['bytes_recv']
+    assert latest['metrics']['network']['bytes_recv_rate'] is None
+    assert store.get('srv-2') is None
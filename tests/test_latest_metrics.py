@@ -0,0 +1,55 @@
+"""Tests for fetching the latest metrics of many servers."""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from models.base import Base
+from models.server import Server
+from models.metric import Metric
+from repositories.metrics import latest_metrics
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+@pytest.fixture
+def test_db():
+    """Create a test database with three servers, one without metrics."""
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    for server_id, count in (('srv-1', 15), ('srv-2', 3), ('srv-3', 0)):
+        session.add(Server(server_id=server_id, hostname=server_id, ip_address='10.0.0.1', os_info='Linux'))
+        for i in range(count):
+            session.add(Metric(server_id=server_id, cpu_usage=float(i), memory_usage=50.0, disk_usage=70.0,
+                               network_stats={}, created_at=START + timedelta(seconds=5 * i)))
+    session.commit()
+    return session
+
+@pytest.mark.unit
+def test_latest_metrics_for_all_servers_in_one_query(test_db):
+    """Test that each server gets its newest rows, oldest first, from a single statement."""
+    statements = []
+    event.listen(test_db.get_bind(), 'before_cursor_execute',
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+
+    result = latest_metrics(test_db, limit=10)
+
+    assert len(statements) == 1
+    assert [m.cpu_usage for m in result['srv-1']] == [float(i) for i in range(5, 15)]
+    assert [m.cpu_usage for m in result['srv-2']] == [0.0, 1.0, 2.0]
+    assert 'srv-3' not in result
+
+@pytest.mark.unit
+def test_latest_metrics_for_selected_servers(test_db):
+    """Test filtering by server and the empty selection."""
+    assert list(latest_metrics(test_db, ['srv-2'], limit=2)) == ['srv-2']
+    assert [m.cpu_usage for m in latest_metrics(test_db, ['srv-2'], limit=2)['srv-2']] == [1.0, 2.0]
+    assert latest_metrics(test_db, []) == {}
+
+@pytest.mark.unit
+def test_server_to_dict_does_not_load_metrics(test_db):
+    """Test that serializing a server leaves its metric history alone."""
+    server = test_db.get(Server, 'srv-1')
+    assert 'metrics' not in server.to_dict()
+    assert 'metrics' not in server.__dict__
+    assert len(server.to_dict(latest_metrics(test_db, ['srv-1'], limit=3)['srv-1'])['metrics']) == 3
@@ -0,0 +1,47 @@
+"""Tests for the scrape-time collector of per-server metrics."""
+import json
+import time
+import pytest
+from prometheus_client import CollectorRegistry
+from redis import RedisError
+from cache.live_state import build_state, fleet_state
+from metrics.live_collector import LiveStateCollector
+
+@pytest.mark.unit
+def test_collector_exports_recent_servers(mock_redis, mock_server_info, mock_metrics):
+    """Test that only servers seen within max_age are exported, nested metrics included."""
+    now = time.time()
+    fresh = build_state({**mock_server_info, 'server_id': 'fresh'}, now, mock_metrics, last_seen=now)
+    stale = build_state({**mock_server_info, 'server_id': 'stale'}, now, mock_metrics, last_seen=now - 600)
+    mock_redis.hscan_iter.side_effect = lambda *args, **kwargs: iter(
+        [('fresh', json.dumps(fresh)), ('stale', json.dumps(stale))])
+    registry = CollectorRegistry()
+    registry.register(LiveStateCollector(source=lambda: fleet_state(60, client=mock_redis)))
+
+    assert registry.get_sample_value('system_metrics', {'server_id': 'fresh', 'metric_type': 'cpu'}) \
+        == mock_metrics['cpu']
+    assert registry.get_sample_value('system_metrics', {'server_id': 'fresh', 'metric_type': 'bytes_sent'}) \
+        == mock_metrics['network']['bytes_sent']
+    assert registry.get_sample_value('server_last_seen_timestamp_seconds', {'server_id': 'fresh'}) == now
+    assert registry.get_sample_value('system_metrics', {'server_id': 'stale', 'metric_type': 'cpu'}) is None
+
+@pytest.mark.unit
+def test_collector_follows_the_fleet(mock_server_info, mock_metrics):
+    """Test that a server gone from the live state disappears from the next scrape."""
+    fleet = {'srv-1': build_state({**mock_server_info, 'server_id': 'srv-1'}, 100.0, mock_metrics)}
+    registry = CollectorRegistry()
+    registry.register(LiveStateCollector(source=lambda: fleet))
+    labels = {'server_id': 'srv-1', 'metric_type': 'memory'}
+
+    assert registry.get_sample_value('system_metrics', labels) == mock_metrics['memory']
+    fleet.clear()
+    assert registry.get_sample_value('system_metrics', labels) is None
+
+@pytest.mark.unit
+def test_collector_survives_redis_errors():
+    """Test that an unavailable live state yields empty families instead of a failed scrape."""
+    def unavailable():
+        raise RedisError('down')
+
+    collector = LiveStateCollector(source=unavailable)
+    assert [family.samples for family in collector.collect()] == [[], []]
@@ -0,0 +1,57 @@
+"""Tests for the Redis live state of servers."""
+import json
+import time
+import pytest
+from redis import RedisError
+from cache.live_state import (
+    LIVE_STATE_KEY,
+    build_state,
+    record_states,
+    fleet_state,
+    server_state
+)
+
+@pytest.mark.unit
+def test_build_state_flags_anomalies(mock_server_info, mock_metrics):
+    """Test that anomalies set the anomalous flag."""
+    state = build_state(mock_server_info, 100.0, mock_metrics, {'cpu': 95.0}, last_seen=101.0)
+    assert state['server_id'] == 'test-id-123'
+    assert state['anomalous'] is True
+    assert state['last_seen'] == 101.0
+    assert build_state(mock_server_info, 100.0, mock_metrics)['anomalous'] is False
+
+@pytest.mark.unit
+def test_record_states_uses_one_pipeline(mock_redis, mock_server_info, mock_metrics):
+    """Test that all states are written in a single pipelined round trip."""
+    pipe = mock_redis.pipeline.return_value
+    states = [build_state({**mock_server_info, 'server_id': f'srv-{i}'}, 100.0, mock_metrics) for i in range(3)]
+
+    assert record_states(states, client=mock_redis) == 3
+    mock_redis.pipeline.assert_called_once_with(transaction=False)
+    assert pipe.hset.call_count == 3
+    assert pipe.hset.call_args[0][:2] == (LIVE_STATE_KEY, 'srv-2')
+    pipe.execute.assert_called_once()
+
+@pytest.mark.unit
+def test_record_states_survives_redis_errors(mock_redis, mock_server_info, mock_metrics):
+    """Test that a Redis failure does not propagate to the ingest path."""
+    mock_redis.pipeline.return_value.execute.side_effect = RedisError('down')
+    assert record_states([build_state(mock_server_info, 100.0, mock_metrics)], client=mock_redis) == 0
+
+@pytest.mark.unit
+def test_fleet_state_filters_by_age(mock_redis, mock_server_info, mock_metrics):
+    """Test that the fleet is read with HSCAN and stale servers can be skipped."""
+    now = time.time()
+    fresh = build_state({**mock_server_info, 'server_id': 'fresh'}, now, mock_metrics, last_seen=now)
+    stale = build_state({**mock_server_info, 'server_id': 'stale'}, now, mock_metrics, last_seen=now - 600)
+    mock_redis.hscan_iter.return_value = iter([('fresh', json.dumps(fresh)), ('stale', json.dumps(stale))])
+
+    assert set(fleet_state(max_age=60, client=mock_redis)) == {'fresh'}
+    mock_redis.hscan_iter.assert_called_once()
+    assert mock_redis.hscan_iter.call_args[0][0] == LIVE_STATE_KEY
+
+@pytest.mark.unit
+def test_server_state_missing(mock_redis):
+    """Test that unknown servers have no state."""
+    mock_redis.hget.return_value = None
+    assert server_state('unknown', client=mock_redis) is None
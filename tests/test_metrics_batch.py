@@ -0,0 +1,80 @@
+"""Tests for batch metric ingestion."""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models.base import Base
+from models.server import Server
+from models.metric import Metric
+from api.namespaces.metrics import ingest_batch
+
+@pytest.fixture
+def test_db():
+    """Create a test database."""
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    return Session()
+
+def make_submission(server_id, cpu=45.5, hostname='test-server'):
+    """Build a metric submission for the given server."""
+    return {
+        'timestamp': '2024-01-01T00:00:00',
+        'server_info': {
+            'server_id': server_id,
+            'hostname': hostname,
+            'ip_address': '192.168.1.100',
+            'os_info': 'Linux 5.10.0'
+        },
+        'metrics': {
+            'cpu': cpu,
+            'memory': 60.0,
+            'disk': 75.2,
+            'network': {'bytes_sent': 1024, 'bytes_recv': 2048}
+        }
+    }
+
+@pytest.mark.unit
+def test_ingest_batch_creates_servers_and_metrics(test_db):
+    """Test that a batch from many servers is stored in one pass."""
+    submissions = [make_submission('srv-1'), make_submission('srv-2'), make_submission('srv-1', cpu=50.0)]
+
+    result, states = ingest_batch(test_db, submissions)
+    test_db.commit()
+
+    assert result['accepted'] == 3
+    assert result['rejected'] == 0
+    assert set(states) == {'srv-1', 'srv-2'}
+    assert states['srv-1']['metrics']['cpu'] == 50.0
+    assert test_db.query(Server).count() == 2
+    assert test_db.query(Metric).filter(Metric.server_id == 'srv-1').count() == 2
+
+@pytest.mark.unit
+def test_ingest_batch_updates_existing_server(test_db):
+    """Test that known servers are updated rather than duplicated."""
+    test_db.add(Server(server_id='srv-1', hostname='old', ip_address='10.0.0.1', os_info='Linux'))
+    test_db.commit()
+
+    result, _ = ingest_batch(test_db, [make_submission('srv-1', hostname='new')])
+    test_db.commit()
+
+    assert result['accepted'] == 1
+    assert test_db.query(Server).count() == 1
+    assert test_db.query(Server).first().hostname == 'new'
+
+@pytest.mark.unit
+def test_ingest_batch_rejects_bad_items_only(test_db):
+    """Test that invalid submissions are reported without rejecting the batch."""
+    missing_cpu = make_submission('srv-2')
+    del missing_cpu['metrics']['cpu']
+    bad_value = make_submission('srv-3', cpu='not-a-number')
+
+    result, states = ingest_batch(test_db, [make_submission('srv-1'), missing_cpu, bad_value, 'garbage'])
+    test_db.commit()
+
+    assert result['accepted'] == 1
+    assert result['rejected'] == 3
+    assert set(states) == {'srv-1'}
+    statuses = [item['status'] for item in result['items']]
+    assert statuses == ['created', 'rejected', 'rejected', 'rejected']
+    assert 'cpu' in result['items'][1]['error']
+    assert test_db.query(Metric).count() == 1
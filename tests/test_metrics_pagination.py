@@ -0,0 +1,78 @@
+"""Tests for keyset pagination of a server's metrics."""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models.base import Base
+from models.server import Server
+from models.metric import Metric
+from api.namespaces.metrics import (
+    encode_cursor,
+    decode_cursor,
+    server_metrics_query,
+    next_page_cursor,
+    page_boundary,
+    page_rows
+)
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+@pytest.fixture
+def test_db():
+    """Create a test database with two servers and ten metrics for the first."""
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    for server_id in ('srv-1', 'srv-2'):
+        session.add(Server(server_id=server_id, hostname=server_id, ip_address='10.0.0.1', os_info='Linux'))
+    for i in range(10):
+        # Pairs of rows share a timestamp so the id breaks ties
+        session.add(Metric(server_id='srv-1', cpu_usage=float(i), memory_usage=50.0, disk_usage=70.0,
+                           network_stats={}, created_at=START + timedelta(seconds=5 * (i // 2))))
+    session.add(Metric(server_id='srv-2', cpu_usage=99.0, memory_usage=50.0, disk_usage=70.0,
+                       network_stats={}, created_at=START))
+    session.commit()
+    return session
+
+@pytest.mark.unit
+def test_cursor_round_trip():
+    """Test that cursors decode to the key they were built from."""
+    assert decode_cursor(encode_cursor(START, 42)) == (START, 42)
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
+
+@pytest.mark.unit
+def test_pages_cover_history_without_overlap(test_db):
+    """Test that following cursors visits every row once, newest first."""
+    seen, cursor = [], None
+    while True:
+        query = server_metrics_query(test_db, 'srv-1', cursor=cursor)
+        seen.extend(m.cpu_usage for m in query.limit(3))
+        cursor = next_page_cursor(query, 3)
+        if cursor is None:
+            break
+    assert seen == [9.0, 8.0, 7.0, 6.0, 5.0, 4.0, 3.0, 2.0, 1.0, 0.0]
+
+@pytest.mark.unit
+def test_time_range_filters(test_db):
+    """Test that from is inclusive, to is exclusive and other servers are excluded."""
+    query = server_metrics_query(test_db, 'srv-1', START + timedelta(seconds=5), START + timedelta(seconds=15))
+    assert [m.cpu_usage for m in query] == [5.0, 4.0, 3.0, 2.0]
+    assert next_page_cursor(query, 4) is None
+
+@pytest.mark.unit
+def test_rows_committed_between_queries_are_not_skipped(test_db):
+    """Test that the streamed page ends at the cursor's row whatever arrives after it was computed."""
+    end = START + timedelta(seconds=25)
+    boundary = page_boundary(server_metrics_query(test_db, 'srv-1', end=end), 3)
+    # A row newer than the pinned end, and a late row inside the page
+    for cpu, seconds in ((100.0, 30), (101.0, 20)):
+        test_db.add(Metric(server_id='srv-1', cpu_usage=cpu, memory_usage=50.0, disk_usage=70.0,
+                           network_stats={}, created_at=START + timedelta(seconds=seconds)))
+    test_db.commit()
+
+    page = [m.cpu_usage for m in page_rows(server_metrics_query(test_db, 'srv-1', end=end), boundary)]
+    assert page == [101.0, 9.0, 8.0, 7.0]
+    following = server_metrics_query(test_db, 'srv-1', end=end, cursor=encode_cursor(*boundary))
+    assert [m.cpu_usage for m in following.limit(2)] == [6.0, 5.0]
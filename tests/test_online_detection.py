@@ -0,0 +1,132 @@
+"""Tests for streaming anomaly detectors."""
+import json
+import time
+import numpy as np
+import pytest
+from analytics.online_detection import (
+    EWMADetector,
+    ZScoreDetector,
+    MADDetector,
+    build_detector
+)
+
+METRICS = ('cpu', 'memory')
+
+def sample(cpu, memory=50.0):
+    """Build an agent-shaped sample."""
+    return {'cpu': cpu, 'memory': memory, 'disk': 50.0, 'network': {}}
+
+def train(detector, server_id='srv-1', samples=300, seed=0):
+    """Feed a noisy, steady baseline around 40% CPU and 50% memory."""
+    rng = np.random.default_rng(seed)
+    for _ in range(samples):
+        detector.update(server_id, [40 + rng.normal(0, 2), 50 + rng.normal(0, 1)])
+
+@pytest.mark.unit
+@pytest.mark.parametrize('kind', ['ewma', 'zscore', 'mad'])
+def test_detectors_flag_only_deviations_from_the_baseline(kind):
+    """Test that a jump well within static thresholds is flagged on a quiet server."""
+    detector = build_detector(kind, warmup=30, metrics=METRICS)
+    train(detector)
+
+    assert detector.observe('srv-1', sample(41.0)) == {}
+    deviations = detector.observe('srv-1', sample(70.0))
+    assert set(deviations) == {'cpu'}
+    assert deviations['cpu'] > 5
+
+@pytest.mark.unit
+def test_baselines_are_per_server():
+    """Test that a busy server's normal load is not a deviation while a quiet one's is."""
+    detector = EWMADetector(warmup=30, metrics=METRICS)
+    rng = np.random.default_rng(1)
+    for _ in range(300):
+        detector.update('busy', [90 + rng.normal(0, 2), 50 + rng.normal(0, 1)])
+        detector.update('quiet', [10 + rng.normal(0, 2), 50 + rng.normal(0, 1)])
+
+    assert detector.observe('busy', sample(91.0)) == {}
+    assert 'cpu' in detector.observe('quiet', sample(91.0))
+
+@pytest.mark.unit
+def test_warmup_and_missing_values_are_not_scored():
+    """Test that young baselines score NaN and missing metrics leave the state alone."""
+    detector = ZScoreDetector(warmup=10, metrics=METRICS)
+    for _ in range(5):
+        scores = detector.update('srv-1', [40.0, 50.0])
+    assert np.isnan(scores).all()
+
+    detector.update('srv-1', [np.nan, 50.0])
+    count = detector.snapshot()['servers']['srv-1'][0]
+    assert count == [5, 6]
+
+@pytest.mark.unit
+def test_windowed_zscore_adapts_to_a_new_level():
+    """Test that the capped Welford window forgets the old level."""
+    detector = ZScoreDetector(window=50, warmup=10, metrics=METRICS)
+    train(detector)
+    rng = np.random.default_rng(2)
+    for _ in range(500):
+        detector.update('srv-1', [80 + rng.normal(0, 2), 50 + rng.normal(0, 1)])
+
+    assert detector.observe('srv-1', sample(80.0)) == {}
+
+@pytest.mark.unit
+def test_mad_baseline_ignores_isolated_spikes():
+    """Test that the median barely moves when a spike is folded in."""
+    detector = MADDetector(warmup=30, metrics=METRICS)
+    train(detector)
+    median = detector.snapshot()['servers']['srv-1'][1][0]
+    for _ in range(3):
+        detector.update('srv-1', [100.0, 50.0])
+
+    assert abs(detector.snapshot()['servers']['srv-1'][1][0] - median) < 1
+
+@pytest.mark.unit
+def test_snapshot_round_trip(tmp_path):
+    """Test that a restored detector scores exactly like the one that was saved."""
+    detector = EWMADetector(warmup=30, metrics=METRICS)
+    train(detector)
+    path = str(tmp_path / 'baselines.json')
+    detector.save(path)
+
+    restored = EWMADetector(warmup=30, metrics=METRICS)
+    assert restored.load(path)
+    assert 'srv-1' in restored
+    np.testing.assert_allclose(restored.update('srv-1', [60.0, 50.0]), detector.update('srv-1', [60.0, 50.0]))
+
+    assert not EWMADetector().load(str(tmp_path / 'missing.json'))
+    with pytest.raises(ValueError):
+        MADDetector(metrics=METRICS).restore(detector.snapshot())
+
+@pytest.mark.unit
+def test_snapshots_are_saved_in_the_background(tmp_path):
+    """Test that the snapshot thread saves periodically and stops on request."""
+    detector = EWMADetector(metrics=METRICS)
+    train(detector)
+    path = tmp_path / 'baselines.json'
+
+    detector.start(str(path), interval=0.01)
+    deadline = time.monotonic() + 5
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    detector.stop()
+    assert path.exists()
+    assert 'srv-1' in json.loads(path.read_text())['servers']
+
+@pytest.mark.unit
+def test_unknown_detector_kind():
+    """Test that an unknown kind is rejected."""
+    with pytest.raises(ValueError):
+        build_detector('holt')
+
+@pytest.mark.unit
+@pytest.mark.parametrize('kind', ['ewma', 'zscore', 'mad'])
+def test_flat_metrics_score_finite(kind):
+    """Test that a tiny change of a constant metric is neither infinite nor a deviation."""
+    detector = build_detector(kind, warmup=30, metrics=METRICS)
+    for _ in range(40):
+        detector.update('srv-1', [75.2, 50.0])
+
+    assert detector.observe('srv-1', sample(75.3)) == {}
+    scores = detector.update('srv-1', [90.0, 50.0])
+    assert np.isfinite(scores).all()
+    assert scores[0] > 5
@@ -0,0 +1,84 @@
+"""Tests for metrics partition maintenance."""
+from datetime import date
+import pytest
+from unittest.mock import MagicMock, patch
+from sqlalchemy import create_engine
+from partitions import (
+    partition_name,
+    partition_day,
+    ensure_partitions,
+    drop_expired_partitions,
+    prune_default_partition
+)
+
+@pytest.mark.unit
+def test_partition_names_round_trip():
+    """Test that partition names encode the day they hold."""
+    assert partition_name(date(2024, 3, 9)) == 'metrics_p20240309'
+    assert partition_day('metrics_p20240309') == date(2024, 3, 9)
+    assert partition_day('metrics_default') is None
+
+@pytest.mark.unit
+def test_unpartitioned_databases_are_left_alone():
+    """Test that maintenance is a no-op outside partitioned PostgreSQL."""
+    engine = create_engine('sqlite:///:memory:')
+    with engine.begin() as conn:
+        assert ensure_partitions(conn) == []
+        assert drop_expired_partitions(conn) == []
+
+@pytest.mark.unit
+def test_drop_expired_partitions_only():
+    """Test that only whole partitions older than the retention window are dropped."""
+    conn = MagicMock()
+    partitions = ['metrics_default', 'metrics_p20240101', 'metrics_p20240125', 'metrics_p20240201']
+    with patch('partitions.is_partitioned', return_value=True), \
+         patch('partitions.list_partitions', return_value=partitions):
+        dropped = drop_expired_partitions(conn, retention_days=10, today=date(2024, 2, 1))
+
+    assert dropped == ['metrics_p20240101']
+    statements = [str(call.args[0]) for call in conn.execute.call_args_list]
+    assert statements == [
+        'ALTER TABLE metrics DETACH PARTITION metrics_p20240101',
+        'DROP TABLE metrics_p20240101'
+    ]
+
+@pytest.mark.unit
+def test_ensure_partitions_creates_missing_days():
+    """Test that upcoming daily partitions are created once."""
+    conn = MagicMock()
+    with patch('partitions.is_partitioned', return_value=True), \
+         patch('partitions.list_partitions', return_value=['metrics_p20240101']), \
+         patch('partitions.default_days', return_value=[]), \
+         patch('partitions.has_default_rows', return_value=False):
+        created = ensure_partitions(conn, start=date(2024, 1, 1), days_ahead=2)
+
+    assert created == ['metrics_p20240102', 'metrics_p20240103']
+    assert "FROM ('2024-01-02') TO ('2024-01-03')" in str(conn.execute.call_args_list[0].args[0])
+
+@pytest.mark.unit
+def test_default_rows_are_moved_before_attaching():
+    """Test that days with rows in the default partition are filled first, then attached."""
+    conn = MagicMock()
+    with patch('partitions.is_partitioned', return_value=True), \
+         patch('partitions.list_partitions', return_value=['metrics_p20240105']), \
+         patch('partitions.default_days', return_value=[date(2023, 12, 30)]), \
+         patch('partitions.has_default_rows', side_effect=lambda conn, day: day == date(2023, 12, 30)):
+        created = ensure_partitions(conn, start=date(2024, 1, 5), days_ahead=0, retention_days=30)
+
+    assert created == ['metrics_p20231230']
+    statements = [str(call.args[0]) for call in conn.execute.call_args_list]
+    assert statements[0].startswith('CREATE TABLE metrics_p20231230 (LIKE metrics')
+    assert 'DELETE FROM metrics_default' in statements[1]
+    assert statements[2] == ("ALTER TABLE metrics ATTACH PARTITION metrics_p20231230 "
+                             "FOR VALUES FROM ('2023-12-30') TO ('2023-12-31')")
+
+@pytest.mark.unit
+def test_prune_default_partition():
+    """Test that expired rows of the default partition are deleted."""
+    conn = MagicMock()
+    conn.execute.return_value.rowcount = 3
+    with patch('partitions.is_partitioned', return_value=True):
+        assert prune_default_partition(conn, retention_days=10, today=date(2024, 2, 1)) == 3
+
+    assert str(conn.execute.call_args.args[0]) == 'DELETE FROM metrics_default WHERE created_at < :cutoff'
+    assert conn.execute.call_args.args[1] == {'cutoff': date(2024, 1, 22)}
@@ -0,0 +1,73 @@
+"""Tests for incremental trend forecasts."""
+import numpy as np
+import pytest
+from analytics.predictive_analytics import TrendForecaster, predict_future_metrics
+
+METRICS = ('cpu', 'disk')
+START = 1_700_000_000.0
+
+def feed(forecaster, server_id, timestamps, cpu, disk):
+    """Feed one sample per timestamp."""
+    for timestamp, values in zip(timestamps, zip(cpu, disk)):
+        forecaster.update(server_id, timestamp, values)
+
+@pytest.mark.unit
+def test_predict_future_metrics_matches_least_squares():
+    """Test that the closed form extrapolates like a fitted line."""
+    values = [1.0, 3.0, 2.0, 5.0, 7.0, 8.0]
+    slope, intercept = np.polyfit(np.arange(len(values)), values, 1)
+
+    assert predict_future_metrics(values) == pytest.approx(intercept + slope * (len(values) + 1))
+    assert predict_future_metrics([4.0]) == 4.0
+
+@pytest.mark.unit
+@pytest.mark.parametrize('window', [0, 50])
+def test_running_sums_match_a_full_fit(window):
+    """Test that forecasts match a least-squares fit over the same samples."""
+    rng = np.random.default_rng(0)
+    timestamps = START + np.arange(200) * 5.0
+    cpu = 20 + 0.01 * (timestamps - START) + rng.normal(0, 1, len(timestamps))
+    disk = 50 + 0.002 * (timestamps - START)
+    forecaster = TrendForecaster(window=window, metrics=METRICS)
+    feed(forecaster, 'srv-1', timestamps, cpu, disk)
+
+    fitted = slice(-window, None) if window else slice(None)
+    slope, intercept = np.polyfit(timestamps[fitted] - timestamps[-1], cpu[fitted], 1)
+    forecast = forecaster.forecast('srv-1', 600)
+    assert forecast['cpu'] == pytest.approx(intercept + slope * 600)
+    assert forecast['disk'] == pytest.approx(disk[-1] + 0.002 * 600)
+
+@pytest.mark.unit
+def test_window_follows_a_change_of_trend():
+    """Test that a windowed trend forgets samples older than the window."""
+    forecaster = TrendForecaster(window=20, metrics=METRICS)
+    timestamps = START + np.arange(100)
+    rising = np.arange(100, dtype=float)
+    feed(forecaster, 'srv-1', timestamps[:50], rising[:50], rising[:50])
+    feed(forecaster, 'srv-1', timestamps[50:], np.full(50, 10.0), np.full(50, 10.0))
+
+    assert forecaster.forecast('srv-1', 100) == {'cpu': pytest.approx(10.0), 'disk': pytest.approx(10.0)}
+
+@pytest.mark.unit
+def test_missing_values_and_young_series_have_no_forecast():
+    """Test that NaN samples are skipped and a single sample has no trend."""
+    forecaster = TrendForecaster(window=10, metrics=METRICS)
+    forecaster.update('srv-1', START, [10.0, np.nan])
+    forecaster.update('srv-1', START + 10, [20.0, 5.0])
+
+    assert forecaster.forecast('srv-1', 10) == {'cpu': pytest.approx(30.0), 'disk': None}
+    assert forecaster.forecast('unknown', 10) is None
+
+@pytest.mark.unit
+def test_forecast_all_is_batched_across_servers():
+    """Test that the whole fleet is forecast at once and forgotten servers drop out."""
+    forecaster = TrendForecaster(window=5, metrics=METRICS, capacity=2)
+    for i in range(5):
+        timestamps = START + np.arange(10)
+        feed(forecaster, f'srv-{i}', timestamps, i * np.arange(10.0), np.zeros(10))
+    forecaster.forget('srv-1')
+
+    server_ids, forecasts = forecaster.forecast_all(1)
+    assert server_ids == ['srv-0', 'srv-4', 'srv-2', 'srv-3']
+    np.testing.assert_allclose(forecasts[:, 0], [0.0, 40.0, 20.0, 30.0])
+    assert 'srv-1' not in forecaster
@@ -0,0 +1,131 @@
+"""Tests for caching verified principals."""
+import time
+from contextlib import contextmanager
+from unittest.mock import patch
+import pytest
+from flask import Flask, g
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from models.base import Base
+from auth.models import User
+from auth.jwt import create_access_token
+from auth import decorators
+from auth.principal_cache import Principal, PrincipalCache, principal_cache
+
+app = Flask(__name__)
+
+@pytest.fixture
+def user_db():
+    """Patch the decorators' sessions with a sqlite database holding one user, counting sessions."""
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    user = User(username='alice', email='alice@example.com', is_admin=False, api_key='key-1')
+    user.set_password('secret')
+    session.add(user)
+    session.commit()
+
+    opened = []
+
+    @contextmanager
+    def get_db():
+        opened.append(1)
+        db = Session()
+        try:
+            yield db
+            db.commit()
+        finally:
+            db.close()
+
+    principal_cache.clear()
+    with patch.object(decorators, 'get_db', get_db):
+        yield session, opened
+    principal_cache.clear()
+
+@decorators.api_key_required
+def submit():
+    """Endpoint protected by an API key."""
+    return g.current_user
+
+@decorators.login_required
+def view():
+    """Endpoint protected by a token."""
+    return g.current_user
+
+@pytest.mark.unit
+def test_api_key_lookups_are_cached(user_db):
+    """Test that a verified API key is resolved without the database."""
+    _, opened = user_db
+    for _ in range(3):
+        with app.test_request_context(headers={'X-API-Key': 'key-1'}):
+            assert submit() == Principal('alice', 'alice@example.com', False)
+    assert len(opened) == 1
+
+@pytest.mark.unit
+def test_token_lookups_are_cached(user_db):
+    """Test that a verified token is resolved without the database."""
+    _, opened = user_db
+    token = create_access_token({'sub': 'alice'})
+    for _ in range(3):
+        with app.test_request_context(headers={'Authorization': f'Bearer {token}'}):
+            assert view().username == 'alice'
+    assert len(opened) == 1
+
+@pytest.mark.unit
+def test_user_changes_invalidate_cached_principals(user_db):
+    """Test that updating a user drops its cached credentials."""
+    session, opened = user_db
+    with app.test_request_context(headers={'X-API-Key': 'key-1'}):
+        assert not submit().is_admin
+
+    session.get(User, 'alice').is_admin = True
+    session.commit()
+
+    with app.test_request_context(headers={'X-API-Key': 'key-1'}):
+        assert submit().is_admin
+    assert len(opened) == 2
+
+@pytest.mark.unit
+def test_entries_never_outlive_the_credential():
+    """Test that expired credentials are not cached."""
+    cache = PrincipalCache(maxsize=10, ttl=60)
+    principal = Principal('alice', 'alice@example.com', False)
+    cache.set('token', 'expired', principal, 0, expires_at=time.time() - 1)
+    cache.set('token', 'valid', principal, 0, expires_at=time.time() + 30)
+    assert cache.get('token', 'expired') is None
+    assert cache.get('token', 'valid') == principal
+
+@pytest.mark.unit
+def test_changes_during_an_api_key_lookup_are_not_cached(user_db):
+    """Test that a user changed while its API key is being looked up is loaded again."""
+    session, opened = user_db
+    lookup = decorators.get_db
+
+    @contextmanager
+    def racing_get_db():
+        with lookup() as db:
+            db.query(User).filter(User.api_key == 'key-1').first()
+            session.get(User, 'alice').is_admin = True
+            session.commit()
+            yield db
+
+    with patch.object(decorators, 'get_db', racing_get_db):
+        with app.test_request_context(headers={'X-API-Key': 'key-1'}):
+            submit()
+    with app.test_request_context(headers={'X-API-Key': 'key-1'}):
+        assert submit().is_admin
+    assert len(opened) == 2
+
+@pytest.mark.unit
+def test_replaced_api_keys_stop_resolving(user_db):
+    """Test that a cached API key misses once the user's key is replaced."""
+    session, _ = user_db
+    with app.test_request_context(headers={'X-API-Key': 'key-1'}):
+        submit()
+
+    session.get(User, 'alice').api_key = 'key-2'
+    session.commit()
+
+    assert principal_cache.get('api_key', 'key-1') is None
@@ -0,0 +1,50 @@
+"""Tests for counter-to-rate derivation."""
+import numpy as np
+import pytest
+from metrics.rates import RateCalculator
+from analytics.anomaly_detection import detect_anomaly
+
+@pytest.mark.unit
+def test_first_sample_has_no_rate(mock_metrics):
+    """Test that a server's first sample only sets the baseline."""
+    calculator = RateCalculator()
+    metrics = calculator.apply('srv-1', 100.0, mock_metrics)
+
+    assert metrics['network']['bytes_sent'] == 1024
+    assert metrics['network']['bytes_sent_rate'] is None
+
+@pytest.mark.unit
+def test_rates_per_second():
+    """Test that deltas are divided by the elapsed time."""
+    calculator = RateCalculator()
+    calculator.update('srv-1', 100.0, [1000, 5000])
+    assert calculator.update('srv-1', 105.0, [6000, 5500]).tolist() == [1000.0, 100.0]
+
+@pytest.mark.unit
+def test_counter_reset():
+    """Test that a counter going backwards counts from zero."""
+    calculator = RateCalculator()
+    calculator.update('srv-1', 100.0, [10000, 10000])
+    assert calculator.update('srv-1', 102.0, [400, 10200]).tolist() == [200.0, 100.0]
+
+@pytest.mark.unit
+def test_batch_matches_single_updates():
+    """Test that the vectorized path agrees with sample-by-sample updates."""
+    timestamps = [0.0, 5.0, 10.0, 15.0]
+    values = np.array([[0, 0], [500, 100], [200, 300], [700, 800]], dtype=float)
+
+    single = RateCalculator()
+    expected = np.array([single.update('srv-1', t, v) for t, v in zip(timestamps, values)])
+    batched = RateCalculator().update_batch('srv-1', timestamps, values)
+
+    np.testing.assert_array_equal(np.isnan(batched), np.isnan(expected))
+    np.testing.assert_allclose(batched[1:], expected[1:])
+
+@pytest.mark.unit
+def test_anomalies_use_rates_not_totals():
+    """Test that large cumulative counters alone do not raise network anomalies."""
+    metrics = {'cpu': 10, 'network': {'bytes_sent': 10 ** 12, 'bytes_sent_rate': 10.0}}
+    assert detect_anomaly(metrics) == {}
+
+    metrics['network']['bytes_sent_rate'] = 5 * 10 ** 6
+    assert detect_anomaly(metrics) == {'network': {'bytes_sent_rate': 5 * 10 ** 6}}
@@ -0,0 +1,122 @@
+"""Tests for multi-resolution metric rollups."""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models.base import Base
+from models.server import Server
+from models.rollup import MetricRollup
+from models.metric import Metric
+from analytics.rollups import (
+    bucket_start,
+    update_rollups,
+    merge_rollups,
+    aggregate_rows,
+    choose_resolution,
+    query_series,
+    RAW_RESOLUTION
+)
+
+@pytest.fixture
+def test_db():
+    """Create a test database with one server."""
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    session.add(Server(server_id='srv-1', hostname='test-server', ip_address='10.0.0.1', os_info='Linux'))
+    session.commit()
+    return session
+
+def make_row(created_at, cpu, recv_rate=None):
+    """Build a metric row as inserted at ingest."""
+    return {
+        'server_id': 'srv-1',
+        'cpu_usage': cpu,
+        'memory_usage': 50.0,
+        'disk_usage': 70.0,
+        'network_stats': {'bytes_sent': 1, 'bytes_recv': 2, 'bytes_recv_rate': recv_rate},
+        'created_at': created_at
+    }
+
+@pytest.mark.unit
+def test_bucket_start():
+    """Test that timestamps are floored to their bucket."""
+    ts = datetime(2024, 1, 1, 12, 34, 56)
+    assert bucket_start(ts, 60) == datetime(2024, 1, 1, 12, 34)
+    assert bucket_start(ts, 300) == datetime(2024, 1, 1, 12, 30)
+    assert bucket_start(ts, 3600) == datetime(2024, 1, 1, 12, 0)
+
+@pytest.mark.unit
+def test_rollups_merge_incrementally(test_db):
+    """Test that successive batches fold into the same buckets."""
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    update_rollups(test_db, [make_row(start, 10.0, 100.0), make_row(start + timedelta(seconds=5), 30.0)])
+    update_rollups(test_db, [make_row(start + timedelta(seconds=10), 20.0, 300.0)])
+    test_db.commit()
+
+    cpu = test_db.query(MetricRollup).filter_by(resolution=60, metric='cpu_usage').one()
+    assert (cpu.count, cpu.min, cpu.max, cpu.avg) == (3, 10.0, 30.0, 20.0)
+    recv = test_db.query(MetricRollup).filter_by(resolution=3600, metric='bytes_recv_rate').one()
+    assert (recv.count, recv.avg) == (2, 200.0)
+
+@pytest.mark.unit
+def test_choose_resolution():
+    """Test that the finest resolution within the point budget is chosen."""
+    end = datetime(2024, 1, 8)
+    assert choose_resolution(end - timedelta(minutes=30), end, 500) == RAW_RESOLUTION
+    assert choose_resolution(end - timedelta(hours=6), end, 500) == 60
+    assert choose_resolution(end - timedelta(days=1), end, 500) == 300
+    assert choose_resolution(end - timedelta(days=7), end, 500) == 3600
+    assert choose_resolution(end - timedelta(days=365), end, 500) == 3600
+
+@pytest.mark.unit
+def test_query_series_reads_rollups(test_db):
+    """Test that long ranges are served from hourly buckets."""
+    start = datetime(2024, 1, 1)
+    update_rollups(test_db, [make_row(start + timedelta(hours=h), float(h)) for h in range(48)])
+    test_db.commit()
+
+    result = query_series(test_db, 'srv-1', start, start + timedelta(days=7), 500)
+    assert result['resolution'] == 3600
+    assert len(result['series']['cpu_usage']) == 48
+    assert result['series']['cpu_usage'][5]['avg'] == 5.0
+
+@pytest.mark.unit
+def test_dense_raw_rows_fall_back_to_rollups(test_db):
+    """Test that raw rows denser than expected never cut off the newest points."""
+    start = datetime(2024, 1, 1)
+    rows = [make_row(start + timedelta(seconds=s), float(s)) for s in range(300)]
+    test_db.bulk_insert_mappings(Metric, rows)
+    update_rollups(test_db, rows)
+    test_db.commit()
+    end = start + timedelta(minutes=5)
+
+    result = query_series(test_db, 'srv-1', start, end, 100)
+    assert result['resolution'] == 60
+    assert result['series']['cpu_usage'][-1]['max'] == 299.0
+
+    result = query_series(test_db, 'srv-1', start, end, 100, resolution=RAW_RESOLUTION)
+    cpu = [point['avg'] for point in result['series']['cpu_usage']]
+    assert cpu == [float(s) for s in range(200, 300)]
+
+@pytest.mark.unit
+def test_rollups_bucket_on_sample_time(test_db):
+    """Test that a late row lands in the bucket of its sample, not of its arrival."""
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    update_rollups(test_db, [{**make_row(start + timedelta(hours=2), 10.0), 'sampled_at': start}])
+    test_db.commit()
+
+    cpu = test_db.query(MetricRollup).filter_by(resolution=3600, metric='cpu_usage').one()
+    assert cpu.bucket_start == start
+
+@pytest.mark.unit
+def test_merge_without_upsert_matches_upsert(test_db):
+    """Test that the portable merge folds batches like the dialect upsert does."""
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    merge_rollups(test_db, aggregate_rows([make_row(start, 10.0), make_row(start + timedelta(seconds=5), 30.0)]))
+    merge_rollups(test_db, aggregate_rows([make_row(start + timedelta(seconds=10), 20.0)]))
+    test_db.commit()
+
+    cpu = test_db.query(MetricRollup).filter_by(resolution=60, metric='cpu_usage').one()
+    assert (cpu.count, cpu.min, cpu.max, cpu.avg) == (3, 10.0, 30.0, 20.0)
@@ -0,0 +1,93 @@
+"""Tests for the compiled alert rule engine."""
+import json
+from unittest.mock import MagicMock
+import pytest
+from metrics.history import HistoryStore, FIELDS
+from metrics.prometheus_metrics import registry
+from alerts.rules import RuleEngine, compile_rule, load_rules
+from alerts.alert_state import AlertStateManager
+
+NOW = 10_000.0
+
+def make_store(samples):
+    """Build a history from ``{server_id: [(seconds before NOW, metrics), ...]}``."""
+    store = HistoryStore(capacity=100)
+    for server_id, series in samples.items():
+        for age, metrics in series:
+            store.append(server_id, NOW - age, metrics)
+    return store
+
+def steady(cpu, minutes=5, step=5):
+    """Samples every ``step`` seconds over the last ``minutes``, cpu given per sample index."""
+    count = minutes * 60 // step
+    return [(step * (count - 1 - i), {'cpu': cpu(i) if callable(cpu) else cpu}) for i in range(count)]
+
+@pytest.mark.unit
+def test_compile_rule():
+    """Test that expressions are parsed into fields, operators, thresholds and durations."""
+    rule = compile_rule('cpu_high', 'cpu > 80 for 2m', FIELDS)
+    assert (rule.field, rule.rate, rule.op, rule.threshold, rule.duration) == ('cpu', False, '>', 80.0, 120.0)
+    rule = compile_rule('recv', 'rate(bytes_recv) >= 1e6', FIELDS)
+    assert (rule.field, rule.rate, rule.op, rule.threshold, rule.duration) == ('bytes_recv', True, '>=', 1e6, 0.0)
+
+    with pytest.raises(ValueError):
+        compile_rule('bad', 'cpu >> 80', FIELDS)
+    with pytest.raises(ValueError):
+        compile_rule('bad', 'gpu > 80', FIELDS)
+
+@pytest.mark.unit
+def test_for_requires_the_whole_duration():
+    """Test that a condition must hold on every sample of the duration."""
+    store = make_store({
+        'sustained': steady(90),
+        'blip': steady(lambda i: 90 if i % 10 else 50),
+        'young': steady(90, minutes=1)
+    })
+    engine = RuleEngine(store, [compile_rule('cpu_high', 'cpu > 80 for 2m', FIELDS)])
+
+    assert engine.evaluate(NOW) == {'sustained': {'cpu_high': 90.0}, 'blip': {}, 'young': {}}
+
+@pytest.mark.unit
+def test_rate_of_counters():
+    """Test that rates come from consecutive counter samples and resets are ignored."""
+    store = make_store({
+        'busy': [(10, {'network': {'bytes_recv': 0}}), (5, {'network': {'bytes_recv': 10_000_000}}),
+                 (0, {'network': {'bytes_recv': 30_000_000}})],
+        'reset': [(5, {'network': {'bytes_recv': 50_000_000}}), (0, {'network': {'bytes_recv': 0}})]
+    })
+    engine = RuleEngine(store, [compile_rule('recv_high', 'rate(bytes_recv) > 1000000', FIELDS)])
+
+    assert engine.evaluate(NOW) == {'busy': {'recv_high': 4_000_000.0}, 'reset': {}}
+
+@pytest.mark.unit
+def test_stale_servers_and_timing_export():
+    """Test that silent servers are not evaluated but reported clear, and per-rule timings are exported."""
+    store = make_store({'live': steady(95), 'gone': [(600, {'cpu': 99})]})
+    engine = RuleEngine(store, [compile_rule('timed_rule', 'cpu > 90', FIELDS)], stale_after=60)
+
+    assert engine.evaluate(NOW) == {'live': {'timed_rule': 95.0}, 'gone': {}}
+    assert registry.get_sample_value('alert_rule_evaluation_seconds_count', {'rule': 'timed_rule'}) == 1
+
+@pytest.mark.unit
+def test_rule_alerts_of_silent_servers_resolve():
+    """Test that a firing rule alert resolves once its server stops reporting."""
+    store = make_store({'srv-1': steady(95)})
+    engine = RuleEngine(store, [compile_rule('cpu_high', 'cpu > 90', FIELDS)], stale_after=60)
+    states = AlertStateManager(MagicMock(), fire_after=1, resolve_after=1, source='rule-test')
+
+    for server_id, breaches in engine.evaluate(NOW).items():
+        states.observe({'server_id': server_id}, NOW, breaches)
+    assert states.active_count() == 1
+    for server_id, breaches in engine.evaluate(NOW + 600).items():
+        states.observe({'server_id': server_id}, NOW + 600, breaches)
+    assert states.active_count() == 0
+
+@pytest.mark.unit
+def test_load_rules(tmp_path):
+    """Test that rules are compiled from a JSON file."""
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps([{'name': 'disk_full', 'expr': 'disk >= 95 for 5m'}]))
+
+    rules = load_rules(str(path), FIELDS)
+    assert [(rule.name, rule.duration) for rule in rules] == [('disk_full', 300.0)]
+    assert load_rules(None, FIELDS) == []
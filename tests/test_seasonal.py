@@ -0,0 +1,111 @@
+"""Tests for seasonal forecasts and background refits."""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models.base import Base
+from models.server import Server
+from models.rollup import MetricRollup
+from analytics.seasonal import (
+    fit_holt_winters,
+    forecast_model,
+    refit_changed,
+    load_models,
+    forget_models,
+    SIGNATURES_KEY
+)
+
+NOW = datetime(2024, 1, 29, 0, 30)
+
+class FakeRedis:
+    """Dictionary-backed stand-in for the Redis hash commands used by the models cache."""
+
+    def __init__(self):
+        self.hashes = {}
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def hscan_iter(self, key, match=None):
+        prefix = match.rstrip('*') if match else ''
+        return iter([item for item in self.hashes.get(key, {}).items() if item[0].startswith(prefix)])
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+    def delete(self, key):
+        self.hashes.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        return []
+
+def daily_cycle(hours, start=0):
+    """Hourly values with a slow trend and a daily cycle."""
+    t = np.arange(start, start + hours)
+    return 50 + 0.01 * t + 10 * np.sin(2 * np.pi * t / 24)
+
+@pytest.fixture
+def test_db():
+    """Create a test database with two weeks of hourly CPU rollups for one server."""
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Server(server_id='srv-1', hostname='test-server', ip_address='10.0.0.1', os_info='Linux'))
+    first = NOW.replace(minute=0) - timedelta(hours=24 * 14)
+    for i, value in enumerate(daily_cycle(24 * 14 + 1)):
+        session.add(MetricRollup(server_id='srv-1', resolution=3600, metric='cpu_usage',
+                                 bucket_start=first + timedelta(hours=i), count=1, sum=value, min=value, max=value))
+    session.commit()
+    return session
+
+@pytest.mark.unit
+def test_holt_winters_follows_the_cycle():
+    """Test that a fitted model extrapolates trend and season."""
+    rng = np.random.default_rng(0)
+    values = daily_cycle(24 * 14) + rng.normal(0, 0.5, 24 * 14)
+    model = fit_holt_winters(values, period=24)
+    model.update({'resolution': 3600, 'last_bucket': 0.0})
+
+    forecast = forecast_model(model, 36)
+    np.testing.assert_allclose([point['value'] for point in forecast], daily_cycle(36, start=24 * 14), atol=1.5)
+    assert forecast[0]['timestamp'] == 3600.0
+    assert fit_holt_winters(values[:40], period=24) is None
+
+@pytest.mark.unit
+def test_refit_only_changed_series(test_db):
+    """Test that models are fitted on complete buckets and refitted only after their data changes."""
+    client = FakeRedis()
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        assert refit_changed(test_db, executor, client=client, now=NOW) == 1
+        assert refit_changed(test_db, executor, client=client, now=NOW) == 0
+
+        # The bucket still filling at NOW is left out of the fit
+        model = load_models('srv-1', client=client)['cpu_usage']
+        assert datetime.utcfromtimestamp(model['last_bucket']) == NOW.replace(minute=0) - timedelta(hours=1)
+
+        # Late data for a complete bucket changes the series
+        late_bucket = NOW.replace(hour=0, minute=0) - timedelta(hours=5)
+        test_db.query(MetricRollup).filter(MetricRollup.bucket_start == late_bucket) \
+            .update({'count': 2, 'sum': 120.0})
+        test_db.commit()
+        assert refit_changed(test_db, executor, client=client, now=NOW) == 1
+
+@pytest.mark.unit
+def test_forget_models(test_db):
+    """Test that deleting a server drops its models and signatures."""
+    client = FakeRedis()
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        refit_changed(test_db, executor, client=client, now=NOW)
+    forget_models('srv-1', client=client)
+
+    assert load_models('srv-1', client=client) == {}
+    assert client.hgetall(SIGNATURES_KEY) == {}
@@ -0,0 +1,45 @@
+"""Tests for the binary metrics wire format."""
+import json
+import pytest
+from metrics.wire_format import encode_batch, decode_batch, decode_batch_arrays
+
+@pytest.mark.unit
+def test_round_trip(mock_server_info, mock_metrics):
+    """Test that a batch decodes back to the JSON batch shape."""
+    body = encode_batch(mock_server_info, [(1700000000.0, mock_metrics), (1700000005.0, mock_metrics)])
+    batch = decode_batch(body)
+
+    assert batch['server_info'] == mock_server_info
+    assert [s['timestamp'] for s in batch['samples']] == [1700000000.0, 1700000005.0]
+    metrics = batch['samples'][0]['metrics']
+    assert metrics['cpu'] == pytest.approx(mock_metrics['cpu'])
+    assert metrics['disk'] == pytest.approx(mock_metrics['disk'])
+    assert metrics['network'] == mock_metrics['network']
+
+@pytest.mark.unit
+def test_binary_is_smaller_than_json(mock_server_info, mock_metrics):
+    """Test that server info is sent once and samples are compact."""
+    samples = [(1700000000.0 + i, mock_metrics) for i in range(100)]
+    body = encode_batch(mock_server_info, samples)
+    as_json = json.dumps([{'timestamp': t, 'server_info': mock_server_info, 'metrics': m} for t, m in samples])
+
+    assert len(body) < len(as_json) / 5
+    _, records = decode_batch_arrays(body)
+    assert records['cpu'].shape == (100,)
+
+@pytest.mark.unit
+def test_rejects_malformed_batches(mock_server_info, mock_metrics):
+    """Test that truncated or foreign payloads are refused."""
+    body = encode_batch(mock_server_info, [(1700000000.0, mock_metrics)])
+    with pytest.raises(ValueError):
+        decode_batch(body[:-1])
+    with pytest.raises(ValueError):
+        decode_batch(b'{"server_info": {}}')
+
+@pytest.mark.unit
+def test_missing_counters_stay_missing(mock_server_info, mock_metrics):
+    """Test that an unreported counter decodes as absent instead of a reset to zero."""
+    metrics = {**mock_metrics, 'network': {'bytes_recv': 2048}}
+    batch = decode_batch(encode_batch(mock_server_info, [(1700000000.0, metrics)]))
+
+    assert batch['samples'][0]['metrics']['network'] == {'bytes_recv': 2048}